@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+"""
+This module tracks trends and flags unusual days in every stored metric.
+
+Each series, a stored count or a derived metric of the daily totals or of one
+editor, model or language of the breakdown, gets per day:
+    baseline   median of the same weekday over the previous `BASELINE_WEEKS` weeks,
+               so quieter weekends are compared with earlier weekends
+    trend      exponentially weighted moving average over about `TREND_SPAN` days
+    wow_delta  change against the same weekday one week earlier
+    zscore     robust z-score of the day against its baseline: the deviation divided
+               by the median absolute deviation of the previous `SCALE_WINDOW` days,
+               scaled by 1.4826 to estimate a standard deviation
+    anomaly    whether |zscore| is at least `Z_THRESHOLD`
+
+All series of a table are computed at once, as the columns of one day-by-series
+frame. On ingest, `AnomalyStore.update` recomputes only the month of the first
+new day and later ones, reading just the trailing history their windows reach
+back to and continuing each trend from the state kept for that month, so the
+result matches a full recomputation and its cost does not grow with the history.
+
+Usage:
+    python anomalies.py [--scope org_name] [--days 30] [--csv alerts.csv] [--rebuild]
+"""
+
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import argparse
+import logging
+import os
+import sys
+import threading
+import warnings
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from data_loader import COLUMN_NAMES
+from derived_metrics import BREAKDOWN_METRICS, DAILY_METRICS, ratio
+from metrics_store import (
+    BREAKDOWN_METRIC_COLUMNS, DIMENSION_COLUMNS, MetricsStore, atomic_replace, list_scopes,
+)
+from telemetry import increment, setup_logging
+
+# Past weeks whose same weekday makes up the baseline, and how many must be stored
+BASELINE_WEEKS = int(os.getenv("ANOMALY_BASELINE_WEEKS", "4"))
+MIN_BASELINE_WEEKS = 2
+# Days of deviations the robust scale is estimated from
+SCALE_WINDOW = 28
+TREND_SPAN = 7
+# Modified z-score above which a day is flagged (Iglewicz and Hoaglin)
+Z_THRESHOLD = float(os.getenv("ANOMALY_Z_THRESHOLD", "3.5"))
+# Turns a median absolute deviation into an estimate of the standard deviation
+MAD_SCALE = 1.4826
+
+# The daily totals, then each dimension of the breakdown
+DIMENSIONS = ["daily"] + DIMENSION_COLUMNS
+# History a recomputed day needs: the scale window over deviations from week-old baselines
+LOOKBACK_DAYS = SCALE_WINDOW + 7 * BASELINE_WEEKS
+
+STATE_FILE = "state.parquet"
+# Months whose starting trend state is kept, so days backfilled within them are updated incrementally
+STATE_MONTHS = 3
+
+ANOMALY_SCHEMA = pa.schema(
+    [pa.field("day", pa.timestamp("ns")), pa.field("group", pa.string()), pa.field("metric", pa.string())]
+    + [pa.field(name, pa.float64()) for name in ["value", "baseline", "trend", "wow_delta", "zscore"]]
+    + [pa.field("anomaly", pa.bool_())]
+)
+STATE_SCHEMA = pa.schema([
+    pa.field("month", pa.timestamp("ns")), pa.field("group", pa.string()), pa.field("metric", pa.string()),
+    pa.field("trend", pa.float64()),
+])
+
+
+def daily_values(daily: pd.DataFrame) -> pd.DataFrame:
+    """
+    Arrange the daily totals as one column per metric, under an empty group.
+
+    Args:
+        daily (pd.DataFrame): Stored metrics with a `day` column.
+
+    Returns:
+        pd.DataFrame: Counts and derived metrics indexed by day, with
+        (`group`, `metric`) columns and the dashboard's metric names.
+    """
+    counts = [c for c in COLUMN_NAMES if c != "day"]
+    df = daily.set_index("day")[counts].rename(columns=COLUMN_NAMES).astype("float64")
+    df = df.assign(**{m.name: ratio(df[m.numerator], df[m.denominator], m.scale) for m in DAILY_METRICS.values()})
+    df.columns = pd.MultiIndex.from_product([[""], df.columns], names=["group", "metric"])
+    return df
+
+
+def dimension_values(breakdown: pd.DataFrame, dimension: str) -> pd.DataFrame:
+    """
+    Sum the breakdown per day and value of `dimension`, one column per value and metric.
+
+    Rows without a value for the dimension, like chat rows for `language`, are
+    left out. A value missing on a day is NaN rather than zero, as the API
+    omits unused editors, models and languages.
+    """
+    breakdown = breakdown[breakdown[dimension].astype(str) != ""]
+    grouped = breakdown.groupby(["day", dimension], observed=True)[BREAKDOWN_METRIC_COLUMNS].sum().astype("float64")
+    grouped = grouped.assign(
+        **{m.name: ratio(grouped[m.numerator], grouped[m.denominator], m.scale) for m in BREAKDOWN_METRICS.values()}
+    )
+    wide = grouped.unstack(dimension)
+    wide.columns = pd.MultiIndex.from_arrays(
+        [wide.columns.get_level_values(1).astype(str), wide.columns.get_level_values(0)], names=["group", "metric"]
+    )
+    return wide.sort_index(axis=1)
+
+
+def _metric_names(dimension: str) -> set:
+    """Names of every metric analyzed for `dimension`"""
+    if dimension == "daily":
+        return {name for column, name in COLUMN_NAMES.items() if column != "day"} | set(DAILY_METRICS)
+    return set(BREAKDOWN_METRIC_COLUMNS) | set(BREAKDOWN_METRICS)
+
+
+def analyze(
+    values: pd.DataFrame,
+    start: Optional[pd.Timestamp] = None,
+    trend_seed: Optional[pd.Series] = None,
+) -> pd.DataFrame:
+    """
+    Compute the baseline, trend, week-over-week delta and robust z-score of every series.
+
+    Args:
+        values (pd.DataFrame): One row per day and one column per series, as
+            returned by `daily_values` or `dimension_values`.
+        start (Optional[pd.Timestamp]): First day to return; earlier rows are
+            only used as history. Defaults to the first row.
+        trend_seed (Optional[pd.Series]): Trend of each series before `start`,
+            indexed like the columns of `values`, to continue it from.
+
+    Returns:
+        pd.DataFrame: One row per day from `start` and series with a value, in the `ANOMALY_SCHEMA` layout.
+    """
+    days = pd.date_range(values.index.min(), values.index.max(), freq="D", name="day")
+    values = values.reindex(days)
+    x = values.to_numpy(dtype="float64")
+
+    # The same weekday of each previous week, stacked along a new first axis
+    past_weeks = np.stack([values.shift(7 * k).to_numpy(dtype="float64") for k in range(1, BASELINE_WEEKS + 1)])
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # days without any past week
+        baseline = np.nanmedian(past_weeks, axis=0)
+    baseline[(~np.isnan(past_weeks)).sum(axis=0) < MIN_BASELINE_WEEKS] = np.nan
+
+    # Scale by the deviations of the previous days only, so a spike does not mask itself
+    deviation = x - baseline
+    scale = (
+        pd.DataFrame(np.abs(deviation), index=days).shift(1)
+        .rolling(SCALE_WINDOW, min_periods=SCALE_WINDOW // 2).median().to_numpy()
+    ) * MAD_SCALE
+    zscore = np.full_like(x, np.nan)
+    np.divide(deviation, scale, out=zscore, where=scale > 0)
+    wow_delta = x - values.shift(7).to_numpy(dtype="float64")
+
+    first = 0 if start is None else int(days.searchsorted(start))
+    recent = values.iloc[first:]
+    if trend_seed is not None:
+        # Prepend the stored trend, which the recursion of an unadjusted EWMA continues exactly
+        seed = trend_seed.reindex(values.columns).to_frame().T
+        recent = pd.concat([seed, recent])
+    trend = recent.ewm(span=TREND_SPAN, adjust=False, ignore_na=True).mean().to_numpy()
+    if trend_seed is not None:
+        trend = trend[1:]
+
+    series = len(values.columns)
+    result = pd.DataFrame({
+        "day": np.repeat(days[first:].to_numpy(), series),
+        "group": np.tile(values.columns.get_level_values("group").to_numpy(), len(days) - first),
+        "metric": np.tile(values.columns.get_level_values("metric").to_numpy(), len(days) - first),
+        "value": x[first:].ravel(),
+        "baseline": baseline[first:].ravel(),
+        "trend": trend.ravel(),
+        "wow_delta": wow_delta[first:].ravel(),
+        "zscore": zscore[first:].ravel(),
+    })
+    result["anomaly"] = result["zscore"].abs() >= Z_THRESHOLD
+    return result[result["value"].notna()].reset_index(drop=True)
+
+
+def alerts(
+    anomalies: pd.DataFrame,
+    start_date: Optional[pd.Timestamp] = None,
+    end_date: Optional[pd.Timestamp] = None,
+) -> pd.DataFrame:
+    """
+    Keep the flagged days of a range as a compact table.
+
+    Returns:
+        pd.DataFrame: `day`, `group`, `metric`, `value`, `baseline`, `change` (%
+        against the baseline) and `zscore`, most recent and most unusual first.
+    """
+    df = anomalies[anomalies["anomaly"]]
+    if start_date is not None:
+        df = df[df["day"] >= start_date]
+    if end_date is not None:
+        df = df[df["day"] <= end_date]
+    df = df.assign(change=ratio(df["value"] - df["baseline"], df["baseline"], 100))
+    df = df[["day", "group", "metric", "value", "baseline", "change", "zscore"]].round(2)
+    order = np.lexsort((-df["zscore"].abs().to_numpy(), -df["day"].to_numpy().astype("int64")))
+    return df.iloc[order].reset_index(drop=True)
+
+
+class AnomalyStore:
+    """
+    Stores the analysis of each dimension as one Parquet file per month.
+
+    Next to the monthly files, `state.parquet` holds the trend of every series
+    at the start of the last `STATE_MONTHS` months and of the coming one, so an
+    update only rewrites the months from the first new day on and never reads
+    the earlier ones.
+    """
+    def __init__(self, data_dir: str = "data", scope: Optional[str] = None):
+        """
+        Initialize the analysis for `scope` rooted at `<data_dir>/anomalies`.
+        """
+        self.anomaly_dir = Path(data_dir) / "anomalies"
+        if scope:
+            self.anomaly_dir = self.anomaly_dir / scope
+
+    def dimension_dir(self, dimension: str) -> Path:
+        """
+        Return the directory holding the analysis of `dimension`.
+        """
+        return self.anomaly_dir / dimension
+
+    def state_path(self, dimension: str) -> Path:
+        """
+        Return the file holding the trend state of `dimension`, rewritten last by every update.
+        """
+        return self.dimension_dir(dimension) / STATE_FILE
+
+    def month_files(self, dimension: str) -> List[Path]:
+        """
+        Return the monthly analysis files of `dimension`, oldest first.
+        """
+        return sorted(self.dimension_dir(dimension).glob("????-??.parquet"))
+
+    def read(self, dimension: str) -> Optional[pd.DataFrame]:
+        """
+        Read a stored analysis, or None if it has not been built yet.
+        """
+        files = self.month_files(dimension)
+        if not files or not self.state_path(dimension).exists():
+            return None
+        return pa.concat_tables([pq.read_table(f, schema=ANOMALY_SCHEMA) for f in files]).to_pandas()
+
+    def read_state(self, dimension: str, month: pd.Timestamp) -> Optional[pd.Series]:
+        """
+        Read the trend of every series at the start of `month`.
+
+        Returns:
+            Optional[pd.Series]: Trends indexed by (`group`, `metric`), or None
+            if no state is kept for that month.
+        """
+        path = self.state_path(dimension)
+        if not path.exists():
+            return None
+        state = pq.read_table(path, schema=STATE_SCHEMA).to_pandas()
+        state = state[state["month"] == month]
+        # A metric that was renamed or removed since leaves a state to rebuild from scratch
+        if state.empty or not set(state["metric"]) <= _metric_names(dimension):
+            return None
+        return state.set_index(["group", "metric"])["trend"]
+
+    def version(self) -> Tuple:
+        """
+        Return the signatures of every dimension's state file, which changes with each update.
+        """
+        signatures = []
+        for dimension in DIMENSIONS:
+            path = self.state_path(dimension)
+            stat = path.stat() if path.exists() else None
+            signatures.append(stat and (stat.st_mtime_ns, stat.st_size))
+        return tuple(signatures)
+
+    def update(
+        self,
+        store: MetricsStore,
+        breakdown_store: MetricsStore,
+        since_day: Optional[pd.Timestamp] = None,
+    ) -> None:
+        """
+        Recompute the months from the one containing `since_day` on, for the daily totals and every dimension.
+
+        Only the trailing `LOOKBACK_DAYS` before that month are read from the
+        store, and each trend continues from the state kept for the month.
+        Earlier months are neither read nor rewritten. A dimension without a
+        state for the month, or a None `since_day`, is rebuilt from all stored days.
+        """
+        # Each table is read once, for the daily totals or for all three dimensions
+        frames = {}
+
+        def read(source: MetricsStore, start_date: Optional[pd.Timestamp] = None) -> Optional[pd.DataFrame]:
+            key = (source.table, start_date)
+            if key not in frames:
+                frames[key] = source.read(start_date=start_date)
+            return frames[key]
+
+        month = None if since_day is None else pd.Timestamp(since_day).to_period("M").start_time
+        for dimension in DIMENSIONS:
+            source = store if dimension == "daily" else breakdown_store
+            trend_seed = None if month is None else self.read_state(dimension, month)
+            if trend_seed is None:
+                frame = read(source)
+                if frame is None or frame.empty:
+                    continue
+                self._write(dimension, analyze(self._values(frame, dimension)))
+                logging.info(f"Rebuilt {dimension} anomalies in {self.anomaly_dir}")
+                continue
+
+            frame = read(source, month - pd.Timedelta(days=LOOKBACK_DAYS))
+            if frame is None or frame.empty or frame["day"].max() < month:
+                continue
+            self._write(dimension, analyze(self._values(frame, dimension), month, trend_seed), trend_seed)
+        if since_day is not None:
+            logging.info(f"Updated anomalies from {month.strftime('%Y-%m')}")
+
+    @staticmethod
+    def _values(frame: pd.DataFrame, dimension: str) -> pd.DataFrame:
+        return daily_values(frame) if dimension == "daily" else dimension_values(frame, dimension)
+
+    def _write(self, dimension: str, result: pd.DataFrame, trend_seed: Optional[pd.Series] = None) -> None:
+        """
+        Replace the months covered by `result`, then the trend state.
+
+        Args:
+            result (pd.DataFrame): Analysis from the start of a month on, as returned by `analyze`.
+            trend_seed (Optional[pd.Series]): Trend state at the start of that
+                month, or None if `result` starts with the first stored day.
+        """
+        directory = self.dimension_dir(dimension)
+        directory.mkdir(parents=True, exist_ok=True)
+        months = result["day"].dt.to_period("M")
+        rebuild = trend_seed is None
+        if rebuild:
+            # A rebuild starts with the first stored day; older months were dropped by retention
+            for path in directory.glob("????-??.parquet"):
+                if pd.Period(path.stem, freq="M") < months.min():
+                    path.unlink()
+        for period, rows in result.groupby(months):
+            path = directory / f"{period}.parquet"
+            tmp_path = path.with_suffix(".tmp")
+            pq.write_table(pa.Table.from_pandas(rows, schema=ANOMALY_SCHEMA, preserve_index=False), tmp_path)
+            atomic_replace(tmp_path, path)
+
+        # Trend of every series at the start of the recent months and the next one:
+        # its last trend before that day, else the trend it entered `result` with
+        first = months.min()
+        if trend_seed is None:
+            trend_seed = pd.Series(dtype="float64", index=pd.MultiIndex.from_arrays([[], []], names=["group", "metric"]))
+        states = []
+        for period in pd.period_range(max(first, months.max() - STATE_MONTHS + 1), months.max() + 1, freq="M"):
+            trend = (
+                result[result["day"] < period.start_time].groupby(["group", "metric"])["trend"].last()
+                .combine_first(trend_seed)
+            )
+            states.append(trend.rename("trend").reset_index().assign(month=period.start_time))
+        state = pd.concat(states, ignore_index=True)
+
+        # States of older months than `result` covers are carried over, unless rebuilding
+        path = self.state_path(dimension)
+        if path.exists() and not rebuild:
+            previous = pq.read_table(path, schema=STATE_SCHEMA).to_pandas()
+            oldest = (months.max() + 1 - STATE_MONTHS).start_time
+            previous = previous[(previous["month"] < first.start_time) & (previous["month"] >= oldest)]
+            state = pd.concat([previous, state], ignore_index=True)
+        tmp_path = path.with_suffix(".tmp")
+        pq.write_table(pa.Table.from_pandas(state[STATE_SCHEMA.names], schema=STATE_SCHEMA, preserve_index=False),
+                       tmp_path)
+        atomic_replace(tmp_path, path)
+
+
+_anomaly_cache: Dict[Path, Tuple[Tuple[int, int], pd.DataFrame]] = {}
+_anomaly_cache_lock = threading.Lock()
+
+
+def load_anomalies(data_dir: str = "data", scope: Optional[str] = None,
+                   dimension: str = "daily") -> Optional[pd.DataFrame]:
+    """
+    Return the stored analysis of a dimension, read again only after it was rewritten.
+    """
+    try:
+        # The state file is rewritten after the monthly files, so its signature versions them all
+        path = AnomalyStore(data_dir, scope).state_path(dimension).resolve()
+        if not path.exists():
+            return None
+        stat = path.stat()
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with _anomaly_cache_lock:
+            cached = _anomaly_cache.get(path)
+            if cached is None or cached[0] != signature:
+                increment("cache_misses")
+                cached = _anomaly_cache[path] = (signature, AnomalyStore(data_dir, scope).read(dimension))
+            else:
+                increment("cache_hits")
+        return cached[1].copy(deep=False)
+
+    except Exception as e:
+        logging.error(f"Error loading {dimension} anomalies: {str(e)}")
+        return None
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="List unusual days in the stored metrics.")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--scope", help="org, team or enterprise to check (default: every stored scope)")
+    parser.add_argument("--days", type=int, default=30, help="list alerts of this many recent days (default: %(default)s)")
+    parser.add_argument("--csv", type=Path, help="write the alerts to this file instead of printing them")
+    parser.add_argument("--rebuild", action="store_true", help="recompute the analysis from all stored days first")
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    scopes: List[Optional[str]] = [args.scope] if args.scope else list_scopes(args.data_dir)
+    tables = []
+    for scope in scopes:
+        if args.rebuild:
+            AnomalyStore(args.data_dir, scope).update(
+                MetricsStore(args.data_dir, scope=scope),
+                MetricsStore(args.data_dir, table="breakdown", scope=scope),
+            )
+        for dimension in DIMENSIONS:
+            df = load_anomalies(args.data_dir, scope, dimension)
+            if df is None or df.empty:
+                continue
+            table = alerts(df, df["day"].max() - pd.Timedelta(days=args.days - 1))
+            tables.append(table.assign(scope=scope or "", dimension=dimension))
+
+    if not tables:
+        print("No anomalies stored, run with --rebuild")
+        return 1
+    result = pd.concat(tables, ignore_index=True)
+    result = result[["scope", "dimension"] + [c for c in result.columns if c not in ("scope", "dimension")]]
+    if args.csv:
+        result.to_csv(args.csv, index=False)
+        print(f"Wrote {len(result)} alerts to {args.csv}")
+    else:
+        print(result.to_string(index=False) if not result.empty else "No anomalies")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+This module serves the dashboard's numbers over HTTP for scripts and other dashboards.
+
+It reads through the same helper functions as `app.py`, so every request is
+answered from the process-wide loader cache instead of re-reading `data/`.
+Responses carry an ETag derived from the request and the stored data version:
+a client that sends it back in `If-None-Match` gets a 304 without anything
+being recomputed, and repeated requests are answered from a bounded cache.
+Bodies are gzip-compressed for clients that accept it.
+
+Endpoints (all GET, dates as YYYY-MM-DD):
+    /scopes
+    /totals?scope=&start=&end=
+    /timeseries?granularity=daily|weekly|monthly|quarterly&scope=&start=&end=
+    /breakdown?by=language[,editor,...]&scope=&start=&end=&editor=vscode,...
+    /table?table=metrics|breakdown&page=1&page_size=100&sort=&desc=1&scope=&start=&end=
+    /export?table=metrics|breakdown&format=csv|parquet&sort=&desc=1&scope=&start=&end=
+    /alerts?dimension=daily[,editor,model,language]&scope=&start=&end=
+    /metrics  (Prometheus text of the server's own latencies)
+
+Usage:
+    python api.py [--host 127.0.0.1] [--port 8000]
+"""
+
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import chain
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import sys
+import threading
+
+import pandas as pd
+
+from anomalies import DIMENSIONS
+from data_loader import enable_copy_on_write
+from helper_functions import (
+    data_version, export_table, filter_date_range, key_statistics, load_alerts, load_breakdown, load_data,
+    load_scopes, load_table_page, load_timeseries, table_columns,
+)
+from metrics_store import DIMENSION_COLUMNS
+from rollups import GRANULARITIES
+from table_query import EXPORT_FORMATS
+from telemetry import increment, setup_logging, span, to_prometheus
+
+# Rendered responses kept per (request, data version)
+RESPONSE_CACHE_SIZE = 256
+# Smaller bodies are sent uncompressed
+GZIP_MIN_BYTES = 1024
+MAX_PAGE_SIZE = 1000
+
+
+class BadRequest(ValueError):
+    """Raised for invalid query parameters; answered with a 400"""
+
+
+class NotFound(LookupError):
+    """Raised for unknown paths or scopes; answered with a 404"""
+
+
+class ResponseCache:
+    """
+    Thread-safe LRU cache of rendered JSON bodies and their gzip encoding.
+    """
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[bytes, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, etag: str) -> Optional[Tuple[bytes, bytes]]:
+        with self._lock:
+            entry = self._entries.get(etag)
+            if entry is not None:
+                self._entries.move_to_end(etag)
+            return entry
+
+    def put(self, etag: str, body: bytes) -> Tuple[bytes, bytes]:
+        entry = (body, gzip.compress(body, compresslevel=6))
+        with self._lock:
+            self._entries[etag] = entry
+            self._entries.move_to_end(etag)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+
+_cache = ResponseCache()
+
+
+def _param(params: Dict[str, list], name: str, default: Optional[str] = None) -> Optional[str]:
+    values = params.get(name)
+    return values[-1] if values else default
+
+
+def _date(params: Dict[str, list], name: str) -> Optional[pd.Timestamp]:
+    value = _param(params, name)
+    if not value:
+        return None
+    try:
+        return pd.Timestamp(value)
+    except ValueError:
+        raise BadRequest(f"Invalid date for {name}: {value}")
+
+
+def _int(params: Dict[str, list], name: str, default: int) -> int:
+    value = _param(params, name)
+    try:
+        return int(value) if value else default
+    except ValueError:
+        raise BadRequest(f"Invalid integer for {name}: {value}")
+
+
+def _scope(params: Dict[str, list]) -> Optional[str]:
+    scope = _param(params, "scope") or None
+    if scope not in load_scopes():
+        raise NotFound(f"Unknown scope: {scope or 'default'}")
+    return scope
+
+
+def _table(params: Dict[str, list]) -> Tuple[str, Optional[str]]:
+    """Return the requested table and the column to sort it by, both validated"""
+    name = _param(params, "table", "metrics")
+    if name not in ("metrics", "breakdown"):
+        raise NotFound(f"Unknown table: {name}")
+    sort_by = _param(params, "sort")
+    if sort_by and sort_by not in table_columns(name):
+        raise BadRequest(f"Unknown column: {sort_by}")
+    return name, sort_by
+
+
+def _records(df: Optional[pd.DataFrame]) -> list:
+    """Convert a frame to JSON-ready records with dates as YYYY-MM-DD"""
+    if df is None:
+        return []
+    df = df.copy()
+    for column in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[column]):
+            df[column] = df[column].dt.strftime("%Y-%m-%d")
+        elif isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype(str)
+    return json.loads(df.to_json(orient="records"))
+
+
+def totals(params: Dict[str, list]) -> Dict:
+    scope = _scope(params)
+    df = load_data(scope)
+    if df is None:
+        raise NotFound("No metrics stored")
+    return key_statistics(filter_date_range(df, _date(params, "start"), _date(params, "end")))
+
+
+def timeseries(params: Dict[str, list]) -> Dict:
+    granularity = _param(params, "granularity", "daily")
+    if granularity != "daily" and granularity not in GRANULARITIES:
+        raise BadRequest(f"Unknown granularity: {granularity}")
+    df = load_timeseries(granularity, _date(params, "start"), _date(params, "end"), _scope(params))
+    return {"granularity": granularity, "data": _records(df)}
+
+
+def breakdown(params: Dict[str, list]) -> Dict:
+    by = [c for c in _param(params, "by", "language").split(",") if c]
+    unknown = [c for c in by if c not in DIMENSION_COLUMNS + ["day"]]
+    if unknown:
+        raise BadRequest(f"Cannot group by: {', '.join(unknown)}")
+    filters = {c: _param(params, c).split(",") for c in DIMENSION_COLUMNS if _param(params, c)}
+    df = load_breakdown(by, _date(params, "start"), _date(params, "end"), filters, _scope(params))
+    return {"by": by, "data": _records(df)}
+
+
+def table(params: Dict[str, list]) -> Dict:
+    name, sort_by = _table(params)
+    page_number = _int(params, "page", 1)
+    page_size = min(max(_int(params, "page_size", 100), 1), MAX_PAGE_SIZE)
+    filters = {c: _param(params, c).split(",") for c in DIMENSION_COLUMNS if _param(params, c)}
+    page_df, total = load_table_page(
+        name, _date(params, "start"), _date(params, "end"), page_number, page_size,
+        filters, sort_by, _param(params, "desc") != "1", _scope(params),
+    )
+    return {"total": total, "page": page_number, "page_size": page_size, "data": _records(page_df)}
+
+
+def alerts(params: Dict[str, list]) -> Dict:
+    dimensions = [c for c in _param(params, "dimension", ",".join(DIMENSIONS)).split(",") if c]
+    unknown = [c for c in dimensions if c not in DIMENSIONS]
+    if unknown:
+        raise BadRequest(f"Unknown dimension: {', '.join(unknown)}")
+    df = load_alerts(_date(params, "start"), _date(params, "end"), _scope(params), dimensions)
+    return {"dimensions": dimensions, "data": _records(df)}
+
+
+ENDPOINTS = {
+    "/scopes": lambda params: {"scopes": load_scopes()},
+    "/totals": totals,
+    "/timeseries": timeseries,
+    "/breakdown": breakdown,
+    "/table": table,
+    "/alerts": alerts,
+}
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    """
+    Answers GET requests for the endpoints listed in the module docstring.
+    """
+    protocol_version = "HTTP/1.1"
+    server_version = "CopilotMetricsAPI"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        increment("api_requests")
+        with span(f"api:{url.path}"):
+            try:
+                if url.path == "/metrics":
+                    self._send(200, to_prometheus().encode(), "text/plain; version=0.0.4")
+                elif url.path == "/export":
+                    self._export(params)
+                elif url.path in ENDPOINTS:
+                    self._json(url.path, params)
+                else:
+                    raise NotFound(f"Unknown path: {url.path}")
+            except BadRequest as e:
+                self._error(400, str(e))
+            except NotFound as e:
+                self._error(404, str(e))
+            except Exception as e:
+                logging.error(f"Error answering {self.path}: {str(e)}")
+                self._error(500, "Internal server error")
+
+    def _json(self, path: str, params: Dict[str, list]) -> None:
+        """Send a cached or freshly rendered JSON response, or a 304 if the client has it"""
+        scope = _param(params, "scope") or None
+        query = sorted((k, v) for k, values in params.items() for v in values)
+        version = load_scopes() if path == "/scopes" else data_version(scope)
+        key = json.dumps([path, query, version], default=str)
+        etag = f'"{hashlib.sha1(key.encode()).hexdigest()}"'
+        if etag in [tag.strip() for tag in self.headers.get("If-None-Match", "").split(",")]:
+            increment("api_not_modified")
+            self._send(304, b"", etag=etag)
+            return
+
+        entry = _cache.get(etag)
+        if entry is None:
+            body = json.dumps(ENDPOINTS[path](params)).encode()
+            entry = _cache.put(etag, body)
+        else:
+            increment("api_cache_hits")
+        self._send(200, *self._encode(entry), etag=etag)
+
+    def _export(self, params: Dict[str, list]) -> None:
+        """Stream a table export with chunked transfer encoding"""
+        name, sort_by = _table(params)
+        fmt = _param(params, "format", "csv")
+        if fmt not in EXPORT_FORMATS:
+            raise BadRequest(f"Unknown format: {fmt}")
+        filters = {c: _param(params, c).split(",") for c in DIMENSION_COLUMNS if _param(params, c)}
+        chunks = export_table(name, _date(params, "start"), _date(params, "end"), fmt, filters,
+                              sort_by, _param(params, "desc") != "1", _scope(params))
+        # Loading and the first batch fail before anything is sent, with a regular error response
+        first = next(chunks, b"")
+
+        self.send_response(200)
+        self.send_header("Content-Type", EXPORT_FORMATS[fmt])
+        self.send_header("Content-Disposition", f'attachment; filename="{name}.{fmt}"')
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for chunk in chain([first], chunks):
+                if chunk:
+                    self.wfile.write(f"{len(chunk):X}\r\n".encode() + chunk + b"\r\n")
+        except Exception as e:
+            # The status is already sent: close without the final chunk, so the client sees a truncated body
+            logging.error(f"Export of {name} failed after the response started: {str(e)}")
+            self.close_connection = True
+            return
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _encode(self, entry: Tuple[bytes, bytes]) -> Tuple[bytes, str, Optional[str]]:
+        body, compressed = entry
+        if len(body) >= GZIP_MIN_BYTES and "gzip" in self.headers.get("Accept-Encoding", ""):
+            return compressed, "application/json", "gzip"
+        return body, "application/json", None
+
+    def _error(self, status: int, message: str) -> None:
+        self._send(status, json.dumps({"error": message}).encode(), "application/json")
+
+    def _send(self, status: int, body: bytes, content_type: Optional[str] = None,
+              encoding: Optional[str] = None, etag: Optional[str] = None) -> None:
+        self.send_response(status)
+        if content_type:
+            self.send_header("Content-Type", content_type)
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        self.send_header("Vary", "Accept-Encoding")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.getLogger("MetricsAPI").info(format % args)
+
+
+def serve(host: str = "127.0.0.1", port: int = 8000) -> ThreadingHTTPServer:
+    """
+    Create the API server; call `serve_forever` on the result to start answering requests.
+    """
+    enable_copy_on_write()
+    return ThreadingHTTPServer((host, port), MetricsRequestHandler)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Serve Copilot metrics from data/ over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    server = serve(args.host, args.port)
+    logging.info(f"Serving metrics on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,58 +1,157 @@
 # app.py
+import os
 import streamlit as st
 import pandas as pd  
-import plotly.express as px
-from helper_functions import load_data, aggregate_weekly
-from data_downloader import data_downloader
+from data_loader import enable_copy_on_write
+from derived_metrics import DAILY_METRICS
+from helper_functions import (
+    data_version, describe_sql_tables, export_table, filter_date_range, key_statistics, load_alerts,
+    load_anomalies, load_breakdown, load_data, load_dimension_values, load_idle_seats, load_scopes,
+    load_summary, load_table_page, load_timeseries, run_sql, table_columns,
+)
+from refresh_worker import last_refreshed_at, start_background_refresh
+from sql_engine import SQL_AVAILABLE
+from table_query import EXPORT_FORMATS
+from telemetry import increment, snapshot, span, to_json, to_prometheus
 
 st.set_page_config(page_title="Metrics Dashboard", layout="wide")
+enable_copy_on_write()
+
+
+@st.cache_resource
+def start_refresh_worker():
+    """Start one background refresh thread per server process"""
+    return start_background_refresh()
+
+
+@st.cache_resource(max_entries=64)
+def cached_timeseries_figure(scope, start_date, end_date, time_period, version):
+    """Build the metrics-over-time figure for one selection; `version` invalidates it when data changes"""
+    # Plotly is only imported once the first figure is built, after the key statistics are shown
+    from charts import timeseries_figure
+    increment("figure_cache_misses")
+    # Anomalies are flagged per day, so they are only marked on the daily chart
+    anomalies = load_anomalies("daily", start_date, end_date, scope) if time_period == "Daily" else None
+    return timeseries_figure(load_timeseries(time_period.lower(), start_date, end_date, scope), time_period,
+                             anomalies)
+
+
+@st.cache_resource(max_entries=64)
+def cached_breakdown_figure(scope, start_date, end_date, dimension, version):
+    """Build the breakdown figure for one selection, or None if there is no breakdown data"""
+    from charts import breakdown_figure
+    increment("figure_cache_misses")
+    breakdown_df = load_breakdown([dimension.lower()], start_date, end_date, scope=scope)
+    if breakdown_df is None or breakdown_df.empty:
+        return None
+    return breakdown_figure(breakdown_df, dimension)
+
+
+@st.cache_resource(max_entries=64)
+def cached_active_users_figure(scope, start_date, end_date, version):
+    """Build the daily active users figure for one selection"""
+    from charts import active_users_figure
+    increment("figure_cache_misses")
+    return active_users_figure(filter_date_range(load_data(scope), start_date, end_date),
+                               load_anomalies("daily", start_date, end_date, scope))
 
 
 def main():
     st.title("Metrics Dashboard")
     
-    # Download data with streamlit spinner with cache
-    with st.spinner("Downloading data..."):
-        data_downloader()
-    
-    # Load data
-    df = load_data()
-    if df is None:
-        st.error("Failed to load metrics data")
-        return
+    # Data is refreshed in the background; page loads only read what is stored
+    if os.getenv("REFRESH_IN_PROCESS", "1") == "1":
+        start_refresh_worker()
+    refreshed_at = last_refreshed_at()
+    if refreshed_at:
+        st.caption(f"Last refreshed at {refreshed_at.astimezone():%Y-%m-%d %H:%M %Z}")
+    else:
+        st.caption("Waiting for the first data refresh")
     
+    # Scope selector, shown when several orgs, teams or enterprises are downloaded
+    scopes = load_scopes()
+    scope = None
+    if len(scopes) > 1:
+        scope = st.selectbox("Scope", scopes, format_func=lambda s: s or "Default")
+    elif scopes:
+        scope = scopes[0]
+
+    # The summary written at ingest time is enough for the key statistics;
+    # without one, fall back to loading the full frame up front
+    with span("load_summary"):
+        summary = load_summary(scope)
+    if summary is None:
+        with span("load_data"):
+            df = load_data(scope)
+        if df is None:
+            if refreshed_at:
+                st.error("Failed to load metrics data")
+            else:
+                st.info("No metrics downloaded yet, reload the page once the first refresh finishes")
+            return
+
+    dashboard_tab, seats_tab, sql_tab = st.tabs(["Dashboard", "Seats", "SQL"])
+    with dashboard_tab:
+        dashboard(scope, summary)
+    with seats_tab:
+        idle_seats_view(scope)
+    with sql_tab:
+        sql_console()
+
+def dashboard(scope, summary):
+    """Show the statistics and charts of one scope for a selected date range"""
+    if summary is None:
+        df = load_data(scope)
+        first_day, latest_day = df['date'].min(), df['date'].max()
+    else:
+        first_day, latest_day = summary['first_day'], summary['latest_day']
+
     # Date range selector
     col1, col2 = st.columns(2)
     with col1:
         start_date = st.date_input(
             "Start Date",
-            df['date'].min()
+            first_day
         )
     with col2:
         end_date = st.date_input(
             "End Date",
-            df['date'].max()
+            latest_day
         )
     
     # Filter data
     start_date = pd.to_datetime(start_date)
     end_date = pd.to_datetime(end_date)
-    filtered_df = df[(df['date'] >= start_date) & (df['date'] <= end_date)]
+    if summary is not None and start_date <= first_day and end_date >= latest_day:
+        # The whole history is selected, so the summary already has the statistics
+        stats = summary['statistics']
+    else:
+        with span("load_data"):
+            df = load_data(scope)
+        with span("filter"):
+            stats = key_statistics(filter_date_range(df, start_date, end_date))
     
     # Key metrics
     st.subheader("Key Statistics")
     metrics_col1, metrics_col2, metrics_col3, metrics_col4 = st.columns(4)
     with metrics_col1:
-        st.metric("Total Suggestions", filtered_df['suggestions'].sum())
+        st.metric("Total Suggestions", stats['suggestions'])
     with metrics_col2:
-        st.metric("Average Daily Active Users", 
-                 int(filtered_df['active_users'].mean()))
+        st.metric("Average Daily Active Users", stats['active_users'])
     with metrics_col3:
-        st.metric("Total Lines Accepted", filtered_df['lines_accepted'].sum())
+        st.metric("Total Lines Accepted", stats['lines_accepted'])
     with metrics_col4:
-        acceptance_rate = (filtered_df['lines_accepted'].sum() / filtered_df['suggestions'].sum() * 100).round()
-        st.metric("Acceptance Rate", f"{acceptance_rate}%")
+        st.metric("Acceptance Rate", DAILY_METRICS['acceptance_rate'].format(stats['acceptance_rate']))
+
+    # Every other derived metric from the registry, including chat engagement
+    derived = [metric for name, metric in DAILY_METRICS.items() if name != 'acceptance_rate']
+    for col, metric in zip(st.columns(len(derived)), derived):
+        with col:
+            st.metric(metric.label, metric.format(stats[metric.name]))
     
+    # Charts and the raw data table are drawn after the key statistics
+    version = data_version(scope)
+
     # Time series plot
     st.subheader("Metrics Over Time")
     
@@ -61,76 +160,178 @@ def main():
         col1, col2, col3 = st.columns([1, 6, 1])  # Creates side margins
         with col2:
             # Add time period selector
-            time_period = st.radio("Select Time Period", ["Daily", "Weekly"])
-            
-            # Calculate metrics and create plot
-            plot_df = filtered_df.copy()
-            if time_period == "Weekly":
-                plot_df = aggregate_weekly(filtered_df)
-            else:
-                plot_df['acceptance_rate'] = (plot_df['lines_accepted'] / plot_df['suggestions'] * 100).round()
-            
-            # Create and display chart
-            fig = px.bar(plot_df, 
-                        x='date',
-                        y=['suggestions', 'lines_accepted'],
-                        title=f'{time_period} Suggestions vs Accepted Lines',
-                        barmode='group',
-                        labels={'date': 'Date'})  # Add this line to change x-axis label
-            
-            fig.add_scatter(x=plot_df['date'], 
-                        y=plot_df['acceptance_rate'],
-                        name='Acceptance Rate',
-                        yaxis='y2',
-                        line=dict(color='red'))
-            
-            fig.update_layout(
-                yaxis2=dict(
-                    title='  Rate (%)',
-                    overlaying='y',
-                    side='right',
-                    range=[0, 100]
-                ),
-                yaxis_title=f'{time_period} Count',
-                legend_title='Metrics',
-                legend=dict(
-                    orientation="h",    # horizontal orientation
-                    yanchor="bottom",   # anchor point
-                    y=-0.3,            # position below plot
-                    xanchor="center",   # center horizontally
-                    x=0.5              # center position
-                )
-            )
+            time_period = st.radio("Select Time Period", ["Daily", "Weekly", "Monthly", "Quarterly"], horizontal=True)
             
+            # Figures are cached per selection and rebuilt only when the data changes
+            with span("figure:timeseries"):
+                fig = cached_timeseries_figure(scope, start_date, end_date, time_period, version)
+
             st.plotly_chart(fig, use_container_width=True)
     
+    # Editor / model / language breakdown
+    st.subheader("Breakdown")
+    dimension = st.radio("Break down by", ["Language", "Editor", "Model"], horizontal=True)
+    with span("figure:breakdown"):
+        fig = cached_breakdown_figure(scope, start_date, end_date, dimension, version)
+    if fig is None:
+        st.info("No breakdown data available for the selected range")
+    else:
+        st.plotly_chart(fig, use_container_width=True)
+
+    # Days whose metrics moved far from the same weekday of previous weeks
+    st.subheader("Alerts")
+    alerts_table(scope, start_date, end_date)
+
     # Create two columns for layout
     col1, col2 = st.columns([1, 1])
 
     with col1:
         # Data table
         st.subheader("Raw Data")
-        st.dataframe(filtered_df)
+        raw_data_table(scope, start_date, end_date)
 
     with col2:
         # Daily user count plot
         st.subheader("Daily Active Users")
-        daily_users = filtered_df.groupby('date')['active_users'].mean()
-        
-        fig = px.bar(
-            x=daily_users.index,
-            y=daily_users.values,
-            labels={'x': 'Date', 'y': 'Number of Users'}
-        )
-        
-        fig.update_layout(
-            xaxis_title='Date',
-            yaxis_title='Active Users',
-            showlegend=False,
-            bargap=0.2  # Add some gap between bars
-        )
-        
+        with span("figure:active_users"):
+            fig = cached_active_users_figure(scope, start_date, end_date, version)
+
         st.plotly_chart(fig, use_container_width=True)
 
+def alerts_table(scope, start_date, end_date):
+    """List the unusual days of the selected range, overall and per editor, model and language"""
+    with span("load_alerts"):
+        alerts = load_alerts(start_date, end_date, scope)
+    if alerts is None:
+        st.info("No anomalies computed yet, they are updated whenever new data is stored")
+        return
+    if alerts.empty:
+        st.caption("No unusual days in the selected range")
+        return
+    st.dataframe(alerts, hide_index=True)
+    st.download_button("Download alerts", alerts.to_csv(index=False), "alerts.csv", "text/csv", key="alerts_csv")
+
+def idle_seats_view(scope):
+    """List the seats without recent activity, to reclaim unused licenses"""
+    idle_days = st.number_input("Idle for at least (days)", 1, 365, 30, key="seats_idle_days")
+    with span("load_idle_seats"):
+        idle, total = load_idle_seats(idle_days, scope)
+    if idle is None:
+        st.info("No seats downloaded yet. Set `DOWNLOAD_SEATS=1` and use a token with the `manage_billing:copilot` scope.")
+        return
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Seats", total)
+    with col2:
+        st.metric(f"Idle for {idle_days}+ days", len(idle))
+    with col3:
+        st.metric("Never active", int(idle['last_activity_at'].isna().sum()))
+    st.dataframe(
+        idle[['login', 'assigning_team', 'last_activity_at', 'last_activity_editor', 'created_at', 'pending_cancellation_date']],
+        hide_index=True,
+    )
+
+SQL_EXAMPLE = """SELECT language,
+       sum(code_suggestions) AS suggestions,
+       round(100.0 * sum(code_acceptances) / nullif(sum(code_suggestions), 0)) AS suggestion_acceptance_rate
+FROM breakdown
+WHERE day >= current_date - INTERVAL 90 DAY AND language <> ''
+GROUP BY language
+ORDER BY suggestion_acceptance_rate DESC"""
+
+def sql_console():
+    """Run read-only SQL over the stored metrics of every scope"""
+    if not SQL_AVAILABLE:
+        st.info("Install DuckDB (`pip install duckdb`) to query the metrics with SQL")
+        return
+    with st.expander("Tables"):
+        for view, columns in describe_sql_tables().items():
+            st.markdown(f"**{view}**: {', '.join(columns)}")
+    sql = st.text_area("Query", SQL_EXAMPLE, height=180, key="sql_query")
+    if not st.button("Run", key="sql_run"):
+        return
+    try:
+        with span("sql"):
+            result, truncated = run_sql(sql)
+    except Exception as e:
+        st.error(str(e))
+        return
+    st.dataframe(result, hide_index=True)
+    st.caption(f"First {len(result)} rows" if truncated else f"{len(result)} rows")
+
+def raw_data_table(scope, start_date, end_date):
+    """Show one page of stored rows; sorting, filtering and paging run on the server"""
+    table = st.radio("Table", ["Daily totals", "Breakdown"], horizontal=True, key="raw_table")
+    table = "breakdown" if table == "Breakdown" else "metrics"
+    columns = table_columns(table)
+    date_column = columns[0]
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        sort_by = st.selectbox("Sort by", columns, key=f"raw_sort_{table}")
+    with col2:
+        page_size = st.selectbox("Rows per page", [25, 100, 500], index=1, key="raw_page_size")
+    with col3:
+        descending = st.checkbox("Descending", value=sort_by == date_column, key=f"raw_desc_{table}")
+
+    filters = {}
+    if table == "breakdown":
+        dimension_cols = st.columns(3)
+        for col, (column, values) in zip(dimension_cols, load_dimension_values(scope).items()):
+            with col:
+                filters[column] = st.multiselect(column.capitalize(), values, key=f"raw_filter_{column}")
+
+    # Clamp the page number before its widget is drawn, as filters may have shrunk the table
+    page_key = f"raw_page_{table}"
+    with span("load_table_page"):
+        page_df, total = load_table_page(
+            table, start_date, end_date, st.session_state.get(page_key, 1), page_size,
+            filters, sort_by, not descending, scope,
+        )
+    if page_df is None:
+        st.info("No data stored for this table")
+        return
+    pages = max(1, -(-total // page_size))
+    st.session_state[page_key] = min(st.session_state.get(page_key, 1), pages)
+
+    st.dataframe(page_df, hide_index=True)
+    col1, col2 = st.columns(2)
+    with col1:
+        page_number = st.number_input(f"Page (of {pages})", 1, pages, key=page_key)
+    with col2:
+        first = (page_number - 1) * page_size
+        st.caption(f"Rows {min(first + 1, total)}-{min(first + page_size, total)} of {total}")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        fmt = st.selectbox("Export format", list(EXPORT_FORMATS), key="raw_export_format")
+    with col2:
+        # The export is only built on request, never on ordinary reruns
+        if st.button("Prepare export", key="raw_export"):
+            with span("export"):
+                data = b"".join(export_table(table, start_date, end_date, fmt, filters, sort_by,
+                                             not descending, scope))
+            st.download_button(f"Download {fmt.upper()}", data, f"{table}.{fmt}", EXPORT_FORMATS[fmt])
+
+def performance_panel():
+    """Show recorded stage latencies and counters, only when asked for with ?perf=1 or SHOW_PERFORMANCE=1"""
+    if st.query_params.get("perf") != "1" and os.getenv("SHOW_PERFORMANCE") != "1":
+        return
+    with st.expander("Performance"):
+        data = snapshot()
+        spans_df = pd.DataFrame.from_dict(data["spans"], orient="index")
+        if not spans_df.empty:
+            columns = ["mean", "p50", "p95", "max", "last", "total"]
+            spans_df[columns] = (spans_df[columns] * 1000).round(1)
+            st.dataframe(spans_df.rename(columns={c: f"{c} (ms)" for c in columns}))
+        st.dataframe(pd.Series(data["counters"], name="value", dtype="float64"))
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button("Download JSON", to_json(), "performance.json", "application/json")
+        with col2:
+            st.download_button("Download Prometheus", to_prometheus(), "performance.prom", "text/plain")
+
 if __name__ == "__main__":
-    main()
+    with span("page"):
+        main()
+    performance_panel()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Benchmark how cold-load time of MetricsDataLoader scales with the number of partitions.
+
+Usage:
+    python benchmarks/bench_cold_load.py [--files 10 100 500] [--workers 1 2 4]
+"""
+
+from pathlib import Path
+import argparse
+import logging
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import data_loader  # noqa: E402
+from data_loader import MetricsDataLoader, enable_copy_on_write, invalidate_cache  # noqa: E402
+from metrics_store import METRIC_COLUMNS, MetricsStore  # noqa: E402
+
+
+def write_partitions(data_dir: Path, files: int, days_per_file: int = 1) -> None:
+    """Write `files` consecutive daily partitions of random metrics"""
+    store = MetricsStore(data_dir)
+    rng = np.random.default_rng(0)
+    start = pd.Timestamp("2020-01-01")
+    for i in range(files):
+        days = pd.date_range(start + pd.Timedelta(days=i * days_per_file), periods=days_per_file)
+        df = pd.DataFrame({c: rng.integers(0, 10_000, days_per_file) for c in METRIC_COLUMNS})
+        df.insert(0, "day", days)
+        store.write_partition(df)
+
+
+def time_cold_load(data_dir: Path, workers: int, repeat: int = 3) -> float:
+    """Return the best of `repeat` cold loads in seconds"""
+    loader = MetricsDataLoader(data_dir=str(data_dir), max_workers=workers)
+    best = float("inf")
+    for _ in range(repeat):
+        invalidate_cache()
+        start = time.perf_counter()
+        df = loader.load_metrics_to_dataframe()
+        best = min(best, time.perf_counter() - start)
+    assert df is not None
+    return best
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, nargs="+", default=[10, 100, 500, 1000])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args(argv)
+    logging.disable(logging.INFO)
+    enable_copy_on_write()
+    # Use the pool at every size, to show from how many partitions it pays off
+    data_loader.LOADER_POOL_MIN_FILES = 0
+
+    print(f"{'files':>6} " + " ".join(f"{f'workers={w}':>11}" for w in args.workers))
+    for files in args.files:
+        with tempfile.TemporaryDirectory() as tmp:
+            write_partitions(Path(tmp), files)
+            # Warm the process pool so its start-up is not counted as load time
+            for workers in args.workers:
+                time_cold_load(Path(tmp), workers, repeat=1)
+            timings = [time_cold_load(Path(tmp), workers) for workers in args.workers]
+        print(f"{files:>6} " + " ".join(f"{t * 1000:>9.1f}ms" for t in timings))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Benchmark every stage of the metrics pipeline on synthetic data.
+
+Each stage is timed (best of `--repeat` runs) and run once more under
+tracemalloc to record its peak Python heap allocation, which includes NumPy
+buffers but not Arrow's own memory pool. Results can be saved with `--json`
+and compared against an earlier run with `--baseline`.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--days 28 280 2800] [--orgs 1] [--json out.json]
+"""
+
+from contextlib import contextmanager
+from datetime import date
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from data_loader import enable_copy_on_write, invalidate_cache  # noqa: E402
+from data_manager import DataManager  # noqa: E402
+from github_client import GithubClient  # noqa: E402
+from github_metrics_downloader import GithubMetricsDownloader, Scope  # noqa: E402
+from helper_functions import aggregate_weekly, filter_date_range, load_breakdown, load_data  # noqa: E402
+from synthetic import generate_orgs  # noqa: E402
+
+# Days per simulated download; each becomes one partition like a daily refresh
+INGEST_WINDOW = 28
+END_DAY = date(2024, 12, 31)
+
+
+@contextmanager
+def working_directory(path: Path):
+    """Run the pipeline against `path/data`, as the dashboard does from its cwd"""
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def measure(fn: Callable[[], object], repeat: int, setup: Optional[Callable[[], None]] = None) -> Tuple[float, int]:
+    """
+    Time `fn` and record its peak traced allocation.
+
+    Args:
+        fn (Callable): The stage to run.
+        repeat (int): Timed runs; the fastest is reported.
+        setup (Optional[Callable]): Called untimed before every run, e.g. to clear caches.
+
+    Returns:
+        Tuple[float, int]: Best wall time in seconds and peak allocated bytes.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+
+    if setup:
+        setup()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def run_scale(days: int, orgs: int, repeat: int, workdir: Path) -> Dict[str, Tuple[float, int]]:
+    """
+    Run all stages for one data size.
+
+    Returns:
+        Dict[str, Tuple[float, int]]: Seconds and peak bytes per stage, summed over organizations.
+    """
+    payloads = generate_orgs(orgs, days=days, end=END_DAY, editors=4, models=3, languages=10)
+    client = GithubClient("benchmark")
+    results: Dict[str, Tuple[float, int]] = {}
+
+    def record(stage: str, timing: Tuple[float, int]) -> None:
+        seconds, peak = results.get(stage, (0.0, 0))
+        results[stage] = (seconds + timing[0], max(peak, timing[1]))
+
+    with working_directory(workdir):
+        for org, payload in payloads.items():
+            scope = Scope("org", org)
+            downloader = GithubMetricsDownloader(scope, client)
+            record("process_data", measure(lambda: downloader.process_data(payload), repeat))
+
+            output_file = Path("data") / f"bench_{scope.name}.json"
+            record("save_entries", measure(lambda: downloader.save_entries(iter(payload), output_file), repeat))
+
+            # Ingest in download-sized windows into a fresh store every run
+            windows = []
+            for i in range(0, days, INGEST_WINDOW):
+                window_file = Path("data") / f"window_{scope.name}_{i}.json"
+                downloader.save_entries(iter(payload[i:i + INGEST_WINDOW]), window_file)
+                windows.append(window_file.resolve())
+            run = iter(range(repeat + 1))
+
+            def ingest():
+                manager = DataManager(f"runs/{next(run)}/data", scope=scope.name)
+                for window_file in windows:
+                    manager.process_new_data(window_file)
+            record("process_new_data", measure(ingest, repeat))
+
+        # Read the store written by the last ingest run, as the dashboard does
+        with working_directory(workdir / "runs" / str(repeat)):
+            for org in payloads:
+                scope_name = Scope("org", org).name
+                record("load_cold", measure(lambda: load_data(scope_name), repeat, setup=invalidate_cache))
+                df = load_data(scope_name)
+                record("load_warm", measure(lambda: load_data(scope_name), repeat))
+                record("aggregate_weekly", measure(lambda: aggregate_weekly(df), repeat))
+
+                start_date = df["date"].max() - pd.Timedelta(days=90)
+                end_date = df["date"].max()
+
+                def filter_path():
+                    filtered = filter_date_range(df, start_date, end_date)
+                    filtered["suggestions"].sum()
+                    filtered["active_users"].mean()
+                    filtered["lines_accepted"].sum()
+                record("filter_date_range", measure(filter_path, repeat))
+                record("load_breakdown", measure(
+                    lambda: load_breakdown(["language"], start_date, end_date, scope=scope_name),
+                    repeat, setup=invalidate_cache,
+                ))
+    client.close()
+    return results
+
+
+def format_delta(value: float, baseline: Optional[float]) -> str:
+    if not baseline:
+        return ""
+    return f"{(value - baseline) / baseline * 100:+7.1f}%"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--days", type=int, nargs="+", default=[28, 280, 2800])
+    parser.add_argument("--orgs", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", type=Path, help="write the results to this file")
+    parser.add_argument("--baseline", type=Path, help="compare against results written with --json")
+    args = parser.parse_args(argv)
+    logging.disable(logging.WARNING)
+    enable_copy_on_write()
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline else {}
+    report: Dict[str, Dict[str, Dict[str, float]]] = {}
+    print(f"{'days':>6} {'stage':<18} {'time':>10} {'peak':>10} {'Δtime':>8} {'Δpeak':>8}")
+    for days in args.days:
+        with tempfile.TemporaryDirectory() as tmp:
+            results = run_scale(days, args.orgs, args.repeat, Path(tmp))
+        key = f"{days}d x {args.orgs} orgs"
+        report[key] = {}
+        for stage, (seconds, peak) in results.items():
+            report[key][stage] = {"seconds": seconds, "peak_bytes": peak}
+            base = baseline.get(key, {}).get(stage, {})
+            print(f"{days:>6} {stage:<18} {seconds * 1000:>8.1f}ms {peak / 2**20:>8.1f}MB "
+                  f"{format_delta(seconds, base.get('seconds')):>8} "
+                  f"{format_delta(peak, base.get('peak_bytes')):>8}")
+
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Benchmark how long a freshly started dashboard process takes to show its first results.
+
+Every run starts a new interpreter against a store ingested from synthetic
+data, as a restarted container would, and records the time since interpreter
+start at which each step of the first page render finished: importing the app,
+computing the key statistics, loading the full frame and building the first
+figure. Key statistics are measured both from the summary written at ingest
+time and from a cold load of every partition. The median of `--repeat` runs
+is reported.
+
+Usage:
+    python benchmarks/bench_startup.py [--days 28 280 2800] [--repeat 5]
+"""
+
+from datetime import date
+from pathlib import Path
+from typing import Dict, List
+import argparse
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from data_manager import DataManager  # noqa: E402
+from github_client import GithubClient  # noqa: E402
+from github_metrics_downloader import GithubMetricsDownloader, Scope  # noqa: E402
+from synthetic import generate_payload  # noqa: E402
+
+SRC_DIR = Path(__file__).resolve().parent.parent
+INGEST_WINDOW = 28
+END_DAY = date(2024, 12, 31)
+
+# Run in a fresh interpreter from the benchmark's data directory; prints one
+# JSON object with the seconds since interpreter start at which each step ended
+CHILD = """
+import json, logging, sys, time
+logging.disable(logging.WARNING)
+mode = sys.argv[1]
+timings = {}
+def mark(step):
+    timings[step] = time.time() - START
+import app
+mark("import")
+from helper_functions import key_statistics, load_data, load_summary, load_timeseries
+if mode == "summary":
+    stats = load_summary()["statistics"]
+    mark("key_statistics")
+    df = load_data()
+else:
+    df = load_data()
+    stats = key_statistics(df)
+    mark("key_statistics")
+mark("full_frame")
+app.cached_timeseries_figure(None, df["date"].min(), df["date"].max(), "Weekly", 0)
+mark("first_figure")
+print(json.dumps(timings))
+"""
+
+
+def ingest(data_dir: Path, days: int) -> None:
+    """Store `days` days of synthetic metrics the way daily refreshes would"""
+    payload = generate_payload(days=days, end=END_DAY, editors=4, models=3, languages=10)
+    downloader = GithubMetricsDownloader(Scope("org", "benchmark"), GithubClient("benchmark"))
+    data_dir.mkdir(parents=True, exist_ok=True)
+    manager = DataManager(str(data_dir))
+    for i in range(0, days, INGEST_WINDOW):
+        window_file = (data_dir / f"window_{i}.json").resolve()
+        downloader.save_entries(iter(payload[i:i + INGEST_WINDOW]), window_file)
+        manager.process_new_data(window_file)
+
+
+def run_child(workdir: Path, mode: str) -> Dict[str, float]:
+    """Start one dashboard process and return the time at which each step finished"""
+    env = dict(os.environ, PYTHONPATH=str(SRC_DIR), REFRESH_IN_PROCESS="0")
+    # The child measures from this timestamp, so interpreter start-up is included
+    code = f"START = {time.time()!r}\n" + CHILD
+    result = subprocess.run(
+        [sys.executable, "-c", code, mode], cwd=workdir, env=env,
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def run_scale(days: int, repeat: int) -> Dict[str, Dict[str, float]]:
+    """
+    Time the start-up of both modes for one data size.
+
+    Returns:
+        Dict[str, Dict[str, float]]: Median seconds per step, per mode.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        ingest(Path(tmp) / "data", days)
+        # Warm the OS page cache, so that every mode reads the files from memory
+        run_child(Path(tmp), "full")
+        for mode in ("summary", "full"):
+            runs: List[Dict[str, float]] = [run_child(Path(tmp), mode) for _ in range(repeat)]
+            results[mode] = {step: statistics.median(r[step] for r in runs) for step in runs[0]}
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--days", type=int, nargs="+", default=[28, 280, 2800])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+    logging.disable(logging.INFO)
+
+    steps = ["import", "key_statistics", "full_frame", "first_figure"]
+    print(f"{'days':>6} {'mode':>8} " + " ".join(f"{step:>15}" for step in steps))
+    for days in args.days:
+        for mode, timings in run_scale(days, args.repeat).items():
+            print(f"{days:>6} {mode:>8} " + " ".join(f"{timings[s] * 1000:>13.1f}ms" for s in steps))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+"""
+This module generates synthetic Copilot metrics API payloads for benchmarks.
+
+The payloads follow the nested shape returned by `/orgs/{org}/copilot/metrics`:
+one entry per day with `copilot_ide_code_completions` broken down by editor,
+model and language, and `copilot_ide_chat` broken down by editor and model.
+Usage follows a slow growth trend with quieter weekends, and every count is
+derived from a seeded generator so runs are reproducible.
+"""
+
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+import json
+import random
+
+EDITORS = ["vscode", "jetbrains", "neovim", "visualstudio", "xcode", "vim"]
+MODELS = ["default", "custom-model-a", "custom-model-b", "custom-model-c"]
+LANGUAGES = [
+    "python", "typescript", "javascript", "go", "java", "rust", "ruby", "csharp",
+    "cpp", "kotlin", "swift", "php", "scala", "shell", "sql", "markdown",
+    "yaml", "html", "css", "terraform",
+]
+
+
+def _language_weight(index: int) -> float:
+    """A few languages account for most of the usage"""
+    return 1.0 / (index + 1)
+
+
+def generate_payload(
+    days: int = 28,
+    end: Optional[date] = None,
+    editors: int = 3,
+    models: int = 2,
+    languages: int = 8,
+    users: int = 200,
+    seed: int = 0,
+) -> List[dict]:
+    """
+    Generate the metrics of one organization.
+
+    Args:
+        days (int): Number of consecutive days, ending with `end`.
+        end (Optional[date]): Last day of the payload. Defaults to yesterday.
+        editors (int): Editors reported per day, at most `len(EDITORS)`.
+        models (int): Models reported per editor, at most `len(MODELS)`.
+        languages (int): Languages reported per model, at most `len(LANGUAGES)`.
+        users (int): Seats in the organization; roughly 60% are active on a weekday.
+        seed (int): Seed of the random generator.
+
+    Returns:
+        List[dict]: One API entry per day, oldest first.
+    """
+    rng = random.Random(seed)
+    end = end or date.today() - timedelta(days=1)
+    start = end - timedelta(days=days - 1)
+    editor_names = EDITORS[:editors]
+    model_names = MODELS[:models]
+    language_names = LANGUAGES[:languages]
+    weights = [_language_weight(i) for i in range(len(language_names))]
+    weight_total = sum(weights) * len(editor_names) * len(model_names)
+
+    payload = []
+    for i in range(days):
+        day = start + timedelta(days=i)
+        growth = 0.5 + 0.5 * (i + 1) / days
+        activity = 0.2 if day.weekday() >= 5 else 0.6
+        active_users = max(1, int(users * activity * growth * rng.uniform(0.9, 1.1)))
+        engaged_users = max(1, int(active_users * rng.uniform(0.8, 0.95)))
+
+        completion_editors = []
+        chat_editors = []
+        for editor in editor_names:
+            completion_models = []
+            chat_models = []
+            for model in model_names:
+                completion_languages = []
+                for language, weight in zip(language_names, weights):
+                    share = weight / weight_total
+                    suggestions = int(engaged_users * 25 * share * rng.uniform(0.7, 1.3))
+                    acceptances = int(suggestions * rng.uniform(0.2, 0.35))
+                    lines_suggested = int(suggestions * rng.uniform(1.2, 2.0))
+                    completion_languages.append({
+                        "name": language,
+                        "total_engaged_users": max(1, int(engaged_users * share * len(language_names))),
+                        "total_code_suggestions": suggestions,
+                        "total_code_acceptances": acceptances,
+                        "total_code_lines_suggested": lines_suggested,
+                        "total_code_lines_accepted": int(lines_suggested * rng.uniform(0.2, 0.35)),
+                    })
+                completion_models.append({
+                    "name": model,
+                    "is_custom_model": model != "default",
+                    "total_engaged_users": engaged_users // len(model_names),
+                    "languages": completion_languages,
+                })
+
+                chats = int(engaged_users * 4 / (len(editor_names) * len(model_names)) * rng.uniform(0.6, 1.4))
+                chat_models.append({
+                    "name": model,
+                    "is_custom_model": model != "default",
+                    "total_engaged_users": engaged_users // (2 * len(editor_names) * len(model_names)),
+                    "total_chats": chats,
+                    "total_chat_insertion_events": int(chats * rng.uniform(0.05, 0.15)),
+                    "total_chat_copy_events": int(chats * rng.uniform(0.1, 0.2)),
+                })
+            completion_editors.append({
+                "name": editor,
+                "total_engaged_users": engaged_users // len(editor_names),
+                "models": completion_models,
+            })
+            chat_editors.append({
+                "name": editor,
+                "total_engaged_users": engaged_users // (2 * len(editor_names)),
+                "models": chat_models,
+            })
+
+        payload.append({
+            "date": day.isoformat(),
+            "total_active_users": active_users,
+            "total_engaged_users": engaged_users,
+            "copilot_ide_code_completions": {
+                "total_engaged_users": engaged_users,
+                "languages": [
+                    {"name": language, "total_engaged_users": engaged_users}
+                    for language in language_names
+                ],
+                "editors": completion_editors,
+            },
+            "copilot_ide_chat": {
+                "total_engaged_users": engaged_users // 2,
+                "editors": chat_editors,
+            },
+        })
+    return payload
+
+
+def generate_orgs(orgs: int = 1, seed: int = 0, **kwargs) -> Dict[str, List[dict]]:
+    """
+    Generate payloads for several organizations of different sizes.
+
+    Args:
+        orgs (int): Number of organizations, named `org-0`, `org-1`, ...
+        seed (int): Base seed; each organization uses `seed + index`.
+        **kwargs: Passed on to `generate_payload`.
+
+    Returns:
+        Dict[str, List[dict]]: Payload per organization name.
+    """
+    users = kwargs.pop("users", 200)
+    return {
+        f"org-{i}": generate_payload(users=users * (i + 1), seed=seed + i, **kwargs)
+        for i in range(orgs)
+    }
+
+
+def write_payload(payload: Sequence[dict], path: Path) -> Path:
+    """
+    Write a payload as the JSON document the API would return.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(list(payload), f)
+    return path
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Write a synthetic Copilot metrics payload.")
+    parser.add_argument("output", type=Path)
+    parser.add_argument("--days", type=int, default=28)
+    parser.add_argument("--editors", type=int, default=3)
+    parser.add_argument("--models", type=int, default=2)
+    parser.add_argument("--languages", type=int, default=8)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    write_payload(generate_payload(args.days, editors=args.editors, models=args.models,
+                                   languages=args.languages, users=args.users, seed=args.seed),
+                  args.output)
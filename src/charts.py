@@ -0,0 +1,213 @@
+"""
+This module builds the dashboard's Plotly figures and keeps long series small.
+
+Daily series longer than `MAX_CHART_POINTS` are downsampled with
+Largest-Triangle-Three-Buckets (LTTB), which keeps the points that shape the
+curve (peaks, dips and both ends) instead of every n-th day, so the figure
+JSON sent to the browser stays bounded however long the selected range is.
+"""
+
+from typing import List, Optional
+import os
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+# Most points drawn per series; longer ranges are downsampled
+MAX_CHART_POINTS = int(os.getenv("CHART_MAX_POINTS", "500"))
+
+_LEGEND = dict(
+    orientation="h",    # horizontal orientation
+    yanchor="bottom",   # anchor point
+    y=-0.3,            # position below plot
+    xanchor="center",   # center horizontally
+    x=0.5              # center position
+)
+_RATE_AXIS = dict(
+    title='  Rate (%)',
+    overlaying='y',
+    side='right',
+    range=[0, 100]
+)
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Select the points to keep with Largest-Triangle-Three-Buckets.
+
+    The first and last points are always kept. The points in between are
+    split into `threshold - 2` equal buckets, and each bucket keeps the point
+    forming the largest triangle with the previously kept point and the
+    average of the next bucket.
+
+    Args:
+        x (np.ndarray): Increasing x values, e.g. datetime64 or int64.
+        y (np.ndarray): Values to preserve the shape of.
+        threshold (int): Number of points to keep.
+
+    Returns:
+        np.ndarray: Sorted positions of the kept points.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x).astype("int64").astype("float64")
+    y = np.asarray(y, dtype="float64")
+    every = (n - 2) / (threshold - 2)
+    kept = np.empty(threshold, dtype="int64")
+    kept[0] = a = 0
+
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        if end < next_end:
+            avg_x, avg_y = x[end:next_end].mean(), y[end:next_end].mean()
+        else:
+            avg_x, avg_y = x[n - 1], y[n - 1]
+
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(area.argmax())
+        kept[i + 1] = a
+
+    kept[-1] = n - 1
+    return kept
+
+
+def downsample(df: pd.DataFrame, y: str, max_points: int = MAX_CHART_POINTS,
+               x: str = 'date') -> pd.DataFrame:
+    """
+    Keep at most `max_points` rows of a date-sorted frame, chosen by LTTB on column `y`.
+
+    All columns of a kept row are kept together, so every series drawn from
+    the result still shows real days.
+    """
+    if len(df) <= max_points:
+        return df
+    values = df[y].fillna(0).to_numpy()
+    return df.iloc[lttb(df[x].to_numpy(), values, max_points)]
+
+
+def _title(title: str, shown: int, total: int) -> str:
+    """Mention downsampling in the chart title"""
+    if shown == total:
+        return title
+    note = f"{shown} of {total} days shown"
+    return f"{title} ({note})" if title else note
+
+
+def _mark_anomalies(fig: go.Figure, anomalies: Optional[pd.DataFrame], metrics: List[str],
+                    yaxis: str = 'y') -> None:
+    """
+    Mark the days flagged in `anomalies` for the given metrics, with their baseline and z-score on hover.
+
+    Flagged days are few, so they are all drawn even where the series itself is downsampled.
+    """
+    if anomalies is None:
+        return
+    flagged = anomalies[anomalies['anomaly'] & anomalies['metric'].isin(metrics) & (anomalies['group'] == '')]
+    if flagged.empty:
+        return
+    fig.add_scatter(x=flagged['day'],
+                    y=flagged['value'],
+                    name='Anomaly',
+                    mode='markers',
+                    yaxis=yaxis,
+                    marker=dict(symbol='x', size=10, color='black'),
+                    customdata=flagged[['metric', 'baseline', 'zscore']],
+                    hovertemplate='%{x|%Y-%m-%d} %{customdata[0]}: %{y:.4~g}<br>'
+                                  'baseline %{customdata[1]:.4~g}, z-score %{customdata[2]:.1f}<extra></extra>',
+                    legendgroup='anomaly',
+                    showlegend=yaxis == 'y')
+
+
+def timeseries_figure(plot_df: pd.DataFrame, time_period: str,
+                      anomalies: Optional[pd.DataFrame] = None) -> go.Figure:
+    """
+    Bar chart of suggestions and accepted lines with the acceptance rate on a second axis.
+
+    Days flagged in `anomalies` (see `anomalies.analyze`) are marked on both axes.
+    """
+    total = len(plot_df)
+    plot_df = downsample(plot_df, 'suggestions')
+    fig = px.bar(plot_df,
+                 x='date',
+                 y=['suggestions', 'lines_accepted'],
+                 title=_title(f'{time_period} Suggestions vs Accepted Lines', len(plot_df), total),
+                 barmode='group',
+                 labels={'date': 'Date'})
+
+    fig.add_scatter(x=plot_df['date'],
+                    y=plot_df['acceptance_rate'],
+                    name='Acceptance Rate',
+                    yaxis='y2',
+                    line=dict(color='red'))
+    _mark_anomalies(fig, anomalies, ['suggestions', 'lines_accepted'])
+    _mark_anomalies(fig, anomalies, ['acceptance_rate'], yaxis='y2')
+
+    fig.update_layout(
+        yaxis2=_RATE_AXIS,
+        yaxis_title=f'{time_period} Count',
+        legend_title='Metrics',
+        legend=_LEGEND
+    )
+    return fig
+
+
+def breakdown_figure(breakdown_df: pd.DataFrame, dimension: str, top: int = 15) -> go.Figure:
+    """
+    Bar chart of the `top` values of a dimension by suggestions, with their suggestion acceptance rate.
+    """
+    column = dimension.lower()
+    breakdown_df = breakdown_df.sort_values('code_suggestions', ascending=False).head(top)
+    fig = px.bar(breakdown_df,
+                 x=column,
+                 y=['code_suggestions', 'code_acceptances'],
+                 title=f'Suggestions vs Acceptances by {dimension}',
+                 barmode='group',
+                 labels={column: dimension})
+
+    fig.add_scatter(x=breakdown_df[column],
+                    y=breakdown_df['suggestion_acceptance_rate'],
+                    name='Suggestion Acceptance Rate',
+                    mode='markers',
+                    yaxis='y2',
+                    marker=dict(color='red'))
+
+    fig.update_layout(
+        yaxis2=_RATE_AXIS,
+        yaxis_title='Count',
+        legend_title='Metrics',
+        legend=_LEGEND
+    )
+    return fig
+
+
+def active_users_figure(df: pd.DataFrame, anomalies: Optional[pd.DataFrame] = None) -> go.Figure:
+    """
+    Bar chart of daily active users, with the days flagged in `anomalies` marked.
+    """
+    total = len(df)
+    df = downsample(df, 'active_users')
+    # The store holds one row per day, so no grouping is needed
+    fig = px.bar(
+        x=df['date'],
+        y=df['active_users'],
+        title=_title('', len(df), total) or None,
+        labels={'x': 'Date', 'y': 'Number of Users'}
+    )
+    _mark_anomalies(fig, anomalies, ['active_users'])
+
+    fig.update_layout(
+        xaxis_title='Date',
+        yaxis_title='Active Users',
+        showlegend=False,
+        bargap=0.2  # Add some gap between bars
+    )
+    return fig
+
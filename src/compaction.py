@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+This module merges small daily partitions into monthly and yearly archives.
+
+Every refresh appends one partition per scope and table, so without compaction
+the number of files, and with it the cold load time, grows forever. Days older
+than `keep_daily_days` are merged into one `month_YYYY-MM` file per month, and
+the months of years that ended more than `keep_monthly_days` ago into one
+`year_YYYY` file. Archives stay in the store and its manifest, so they are
+read, pruned by date and verified like any other partition.
+
+An optional retention period drops files whose days are all older than it;
+by default the whole history is kept.
+
+Usage:
+    python compaction.py [--dry-run] [--keep-daily-days 62] [--keep-monthly-days 730] [--retention-days N]
+"""
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+import argparse
+import logging
+import os
+import sys
+
+import pandas as pd
+
+from anomalies import AnomalyStore
+from metrics_store import MetricsStore, TABLE_SCHEMAS, list_scopes, read_partitions
+from rollups import RollupStore
+from telemetry import setup_logging, span
+
+KEEP_DAILY_DAYS = int(os.getenv("COMPACT_KEEP_DAILY_DAYS", "62"))
+KEEP_MONTHLY_DAYS = int(os.getenv("COMPACT_KEEP_MONTHLY_DAYS", "730"))
+RETENTION_DAYS = int(os.getenv("RETENTION_DAYS")) if os.getenv("RETENTION_DAYS") else None
+
+
+@dataclass
+class CompactionStats:
+    """
+    What compacting one store did, or would do in a dry run.
+    """
+    store_dir: Path
+    files_before: int = 0
+    bytes_before: int = 0
+    files_after: int = 0
+    bytes_after: Optional[int] = None
+    # Archive name prefix, e.g. `month_2024-03`, mapped to the partitions merged into it
+    merged: Dict[str, List[str]] = field(default_factory=dict)
+    dropped: List[str] = field(default_factory=list)
+    # New retention cutoff to record; days before it are not ingested again
+    retained_from: Optional[str] = None
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.merged or self.dropped or self.retained_from)
+
+    def summary(self) -> str:
+        """One line describing the store before and after"""
+        after = "?" if self.bytes_after is None else _format_size(self.bytes_after)
+        sources = len({name for names in self.merged.values() for name in names})
+        return (
+            f"{self.store_dir}: {self.files_before} files ({_format_size(self.bytes_before)}) -> "
+            f"{self.files_after} files ({after}); merged {sources} files into "
+            f"{len(self.merged)} archives, dropped {len(self.dropped)}"
+        )
+
+
+def _format_size(size: int) -> str:
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def _archive_prefix(name: str) -> Optional[str]:
+    """Return `month_YYYY-MM` or `year_YYYY` for an archive file, None for a daily partition"""
+    if name.startswith(("month_", "year_")):
+        return name.rsplit("_", 1)[0]
+    return None
+
+
+def _listed_size(store: MetricsStore, names) -> int:
+    return sum((store.store_dir / name).stat().st_size for name in names if (store.store_dir / name).exists())
+
+
+def plan(
+    store: MetricsStore,
+    keep_daily_days: int = KEEP_DAILY_DAYS,
+    keep_monthly_days: int = KEEP_MONTHLY_DAYS,
+    retention_days: Optional[int] = RETENTION_DAYS,
+) -> CompactionStats:
+    """
+    Decide which partitions to merge or drop, without changing anything.
+
+    Ages are measured back from the latest stored day rather than today, so
+    a store that stopped receiving data is not compacted any further.
+
+    Returns:
+        CompactionStats: The planned merges and drops, with the file counts before and after.
+    """
+    manifest = store.manifest()
+    partitions = manifest["partitions"]
+    stats = CompactionStats(store.store_dir, len(partitions), _listed_size(store, partitions))
+    stats.files_after = stats.files_before
+    if not manifest["latest_day"]:
+        return stats
+
+    latest = pd.Timestamp(manifest["latest_day"])
+    if retention_days is not None:
+        cutoff = (latest - pd.Timedelta(days=retention_days)).strftime("%Y-%m-%d")
+        stats.dropped = sorted(name for name, entry in partitions.items() if entry["max_day"] < cutoff)
+        if cutoff > (manifest.get("retained_from") or ""):
+            stats.retained_from = cutoff
+
+    month_cutoff = (latest - pd.Timedelta(days=keep_daily_days)).to_period("M").start_time
+    year_cutoff = min((latest - pd.Timedelta(days=keep_monthly_days)).to_period("Y").start_time, month_cutoff)
+
+    def target(day: pd.Timestamp) -> Optional[str]:
+        if day < year_cutoff:
+            return f"year_{day.year}"
+        if day < month_cutoff:
+            return f"month_{day:%Y-%m}"
+        return None
+
+    for name, entry in sorted(partitions.items()):
+        if name in stats.dropped:
+            continue
+        targets = {target(day) for day in pd.date_range(entry["min_day"], entry["max_day"])}
+        # Partitions with days still kept daily wait until all of them are old enough
+        if None in targets or targets == {_archive_prefix(name)}:
+            continue
+        for prefix in targets:
+            stats.merged.setdefault(prefix, []).append(name)
+
+    # Late days for an already archived period are merged into its archive
+    for name in sorted(partitions):
+        prefix = _archive_prefix(name)
+        if prefix in stats.merged and name not in stats.merged[prefix] and name not in stats.dropped:
+            stats.merged[prefix].append(name)
+
+    sources = {name for names in stats.merged.values() for name in names}
+    stats.files_after = stats.files_before - len(sources | set(stats.dropped)) + len(stats.merged)
+    if not stats.changed:
+        stats.bytes_after = stats.bytes_before
+    return stats
+
+
+def compact(
+    store: MetricsStore,
+    keep_daily_days: int = KEEP_DAILY_DAYS,
+    keep_monthly_days: int = KEEP_MONTHLY_DAYS,
+    retention_days: Optional[int] = RETENTION_DAYS,
+    dry_run: bool = False,
+) -> CompactionStats:
+    """
+    Merge and drop partitions of one store as decided by `plan`.
+
+    All archives are written before the manifest is swapped in one atomic
+    replace, and the merged files are only deleted afterwards, so readers
+    and crashes never see a day twice or lose one.
+
+    Returns:
+        CompactionStats: What was done, or would be done if `dry_run` is set.
+    """
+    stats = plan(store, keep_daily_days, keep_monthly_days, retention_days)
+    if dry_run or not stats.changed:
+        return stats
+
+    with span("compact"):
+        added = {}
+        for prefix, names in sorted(stats.merged.items()):
+            kind, label = prefix.split("_", 1)
+            period = pd.Period(label, freq="M" if kind == "month" else "Y")
+            df = read_partitions([store.store_dir / name for name in names], schema=store.schema,
+                                 start_date=period.start_time, end_date=period.end_time)
+            path, entry = store.write_archive(df, prefix)
+            added[path.name] = entry
+
+        removed = sorted({name for names in stats.merged.values() for name in names} | set(stats.dropped))
+        store.replace_partitions(removed, added, stats.retained_from)
+
+    partitions = store.manifest()["partitions"]
+    stats.files_after = len(partitions)
+    stats.bytes_after = _listed_size(store, partitions)
+    logging.info(stats.summary())
+    return stats
+
+
+def compact_all(data_dir: str = "data", dry_run: bool = False, **policy) -> List[CompactionStats]:
+    """
+    Compact every table of every scope stored under `data_dir`.
+
+    Args:
+        data_dir (str): Root of the metrics store.
+        dry_run (bool): Only plan, without writing anything.
+        **policy: `keep_daily_days`, `keep_monthly_days` and `retention_days`, passed to `compact`.
+
+    Returns:
+        List[CompactionStats]: One entry per store.
+    """
+    results = []
+    pruned = set()
+    for table in TABLE_SCHEMAS:
+        for scope in list_scopes(data_dir, table):
+            store = MetricsStore(data_dir, table=table, scope=scope)
+            try:
+                rollups = RollupStore(data_dir, scope=scope)
+                summary = rollups.read_summary(store) if table == "metrics" else None
+                stats = compact(store, dry_run=dry_run, **policy)
+                results.append(stats)
+                if stats.dropped and not dry_run:
+                    pruned.add(scope)
+                if table == "metrics" and not dry_run:
+                    # Merging keeps the stored days, and with them the summary. Only days
+                    # dropped by retention, or a store ingested before summaries
+                    # existed, need every day summed again.
+                    if stats.dropped or summary is None:
+                        rollups.update_summary(store)
+            except Exception as e:
+                logging.error(f"Error compacting {store.store_dir}: {str(e)}")
+
+    # Periods and baselines that included days dropped by retention are rebuilt from the days kept
+    for scope in sorted(pruned, key=str):
+        store = MetricsStore(data_dir, scope=scope)
+        try:
+            RollupStore(data_dir, scope=scope).update(store)
+            AnomalyStore(data_dir, scope=scope).update(store, MetricsStore(data_dir, table="breakdown", scope=scope))
+        except Exception as e:
+            logging.error(f"Error rebuilding rollups and anomalies of {store.store_dir}: {str(e)}")
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Merge old daily partitions into monthly and yearly archives.")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--dry-run", action="store_true", help="show what would change without writing")
+    parser.add_argument("--keep-daily-days", type=int, default=KEEP_DAILY_DAYS,
+                        help="keep daily partitions for this many recent days (default: %(default)s)")
+    parser.add_argument("--keep-monthly-days", type=int, default=KEEP_MONTHLY_DAYS,
+                        help="keep monthly archives for years that ended within this many days (default: %(default)s)")
+    parser.add_argument("--retention-days", type=int, default=RETENTION_DAYS,
+                        help="drop data older than this many days (default: keep everything)")
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    # Share the refresh lock so compaction never races an ingest
+    from refresh_worker import LOCK_FILE, FileLock
+    lock = FileLock(Path(args.data_dir) / LOCK_FILE)
+    if not args.dry_run and not lock.acquire():
+        print("A refresh is running, try again later")
+        return 1
+    try:
+        results = compact_all(
+            args.data_dir, dry_run=args.dry_run, keep_daily_days=args.keep_daily_days,
+            keep_monthly_days=args.keep_monthly_days, retention_days=args.retention_days,
+        )
+    finally:
+        lock.release()
+
+    for stats in results:
+        print(("[dry run] " if args.dry_run else "") + stats.summary())
+        if args.dry_run:
+            for prefix, names in sorted(stats.merged.items()):
+                print(f"  {prefix}: {len(names)} files")
+            for name in stats.dropped:
+                print(f"  drop {name}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
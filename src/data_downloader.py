@@ -1,57 +1,140 @@
 #!/usr/bin/env python3
 import logging
-import sys
 import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
 import streamlit as st
 
-from github_metrics_downloader import GithubMetricsDownloader
+from github_client import GithubClient, RateBudget
+from github_metrics_downloader import GithubMetricsDownloader, Scope, configured_scopes, create_client
 from data_manager import DataManager
+from data_loader import invalidate_cache
+from metrics_store import breakdown_file_for
+from refresh_worker import DATA_DIR, LOCK_FILE, FileLock
+from seats import download_seats, seats_path
+from telemetry import setup_logging, span
 
 
-def setup_logging():
-    """Setup logging to console"""
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[logging.StreamHandler(sys.stdout)]
-    )
+# Seats need a token with the manage_billing:copilot scope, so they are opt-in
+DOWNLOAD_SEATS = os.getenv("DOWNLOAD_SEATS", "0") == "1"
 
-@st.cache_data(ttl=43200)  # Cache expires after 12 hours (43200 seconds)
-def data_downloader():
-    setup_logging()
+# Outcome of refreshing one scope
+DOWNLOAD_OK = "ok"
+DOWNLOAD_UNCHANGED = "unchanged"
+DOWNLOAD_FAILED = "failed"
+
+
+def download_scope(scope: Optional[Scope] = None, client: Optional[GithubClient] = None) -> str:
+    """
+    Download, store and clean up the metrics, and optionally the seats, of one scope.
+
+    Returns:
+        str: `DOWNLOAD_OK` if new days were stored, `DOWNLOAD_UNCHANGED` if
+        there were none, or `DOWNLOAD_FAILED` if the metrics or the seats
+        could not be downloaded.
+    """
+    with span("download_scope"):
+        result = _download_scope(scope, client)
+    # Teams have no seats endpoint of their own; their organization's seats cover them
+    has_seats = scope is None or seats_path(scope) is not None
+    if DOWNLOAD_SEATS and has_seats and not _download_seats(scope, client):
+        return DOWNLOAD_FAILED
+    return result
+
+def _download_seats(scope: Optional[Scope], client: Optional[GithubClient]) -> bool:
+    """Download the seats of one scope, so that a failure affects only this scope"""
+    label = scope.name if scope else "default scope"
+    try:
+        if download_seats(scope, client) is None:
+            logging.getLogger('DataDownloader').error(f"Failed to download seats for {label}.")
+            return False
+        return True
+    except Exception as e:
+        logging.getLogger('DataDownloader').error(f"Unexpected error downloading seats for {label}: {str(e)}")
+        return False
+
+def _download_scope(scope: Optional[Scope], client: Optional[GithubClient]) -> str:
     logger = logging.getLogger('DataDownloader')
-    
+    label = scope.name if scope else "default scope"
+
+    downloaded_file = None
     try:
         # Download latest metrics
-        logger.info("Starting download of GitHub metrics...")
-        downloader = GithubMetricsDownloader()
+        logger.info(f"Starting download of GitHub metrics for {label}...")
+        downloader = GithubMetricsDownloader(scope, client)
         downloaded_file = downloader.download()
-        logger.info(f"Downloaded file: {downloaded_file.name}")
-        
+
+        if downloader.not_modified:
+            logger.info(f"No new data to save for {label}.")
+            return DOWNLOAD_UNCHANGED
         if not downloaded_file:
-            logger.error("Failed to download metrics. Check GitHub API token and Storage permissions.")
-            return 1
-            
+            logger.error(f"Failed to download metrics for {label}. Check GitHub API token and Storage permissions.")
+            return DOWNLOAD_FAILED
+        logger.info(f"Downloaded file: {downloaded_file.name}")
+
         # Process and save data
         logger.info(f"Processing downloaded file: {downloaded_file}")
-        manager = DataManager()
+        manager = DataManager(scope=scope.name if scope else None)
         result = manager.process_new_data(downloaded_file.name)
-        
+
         if result:
             logger.info(f"Successfully processed and saved data to: {result}")
-        else:
-            logger.info("No new data to save.")
-            return 1
-            
+            invalidate_cache(manager.store.store_dir / result)
+            # Only now may the next refresh be answered with 304 Not Modified
+            downloader.save_etag()
+            return DOWNLOAD_OK
+        if manager.no_new_data:
+            logger.info(f"No new data to save for {label}.")
+            downloader.save_etag()
+            return DOWNLOAD_UNCHANGED
+        logger.error(f"Failed to store metrics for {label}.")
+        return DOWNLOAD_FAILED
+
     except Exception as e:
-        logger.error(f"Unexpected error: {str(e)}")
-        return 1
-    
+        logger.error(f"Unexpected error for {label}: {str(e)}")
+        return DOWNLOAD_FAILED
+
     finally:
         # Ensure the temporary file is deleted
         if downloaded_file:
             os.remove(str(downloaded_file))
             logger.info(f"Deleted temporary file: {str(downloaded_file)}")
+            breakdown_file = breakdown_file_for(downloaded_file)
+            if breakdown_file.exists():
+                os.remove(str(breakdown_file))
+                logger.info(f"Deleted temporary file: {str(breakdown_file)}")
+
+def download_scopes(scopes: List[Optional[Scope]], max_workers: int = 4):
+    """
+    Download several scopes concurrently.
+
+    All workers share one connection pool and one rate-limit budget, and each
+    scope is written to its own partition of the metrics store.
+
+    Returns:
+        List[str]: The outcome of each scope, see `download_scope`.
+    """
+    client = create_client(rate_budget=RateBudget())
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(scopes)))) as executor:
+            return list(executor.map(lambda scope: download_scope(scope, client), scopes))
+    finally:
+        client.close()
+
+@st.cache_data(ttl=43200)  # Cache expires after 12 hours (43200 seconds)
+def data_downloader():
+    setup_logging()
+    # Share the refresh lock, so this never ingests while the worker or compaction runs
+    lock = FileLock(DATA_DIR / LOCK_FILE)
+    if not lock.acquire():
+        logging.getLogger('DataDownloader').info("A refresh is already running, skipping")
+        return 1
+    try:
+        max_workers = int(os.getenv("GITHUB_MAX_WORKERS", "4"))
+        results = download_scopes(configured_scopes(), max_workers)
+    finally:
+        lock.release()
+    return 1 if DOWNLOAD_FAILED in results else None
 
 if __name__ == "__main__":
     data_downloader()
\ No newline at end of file
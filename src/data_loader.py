@@ -1,49 +1,438 @@
 import pandas as pd
-from typing import Optional
+import pyarrow as pa
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import atexit
 import logging
+import multiprocessing
+import os
+import threading
 from reader import MetricsReader
+from rollups import GRANULARITIES, RollupStore
+from telemetry import increment, span
+from derived_metrics import BREAKDOWN_METRICS, DAILY_METRICS, DerivedMetric, derive
+from metrics_store import BREAKDOWN_METRIC_COLUMNS, DIMENSION_COLUMNS, MetricsStore, read_partitions
+
+# Store columns exposed to the dashboard, keyed by their stored name
+COLUMN_NAMES = {
+    'day': 'date',
+    'total_suggestions_count': 'suggestions',
+    'total_active_users': 'active_users',
+    'total_lines_accepted': 'lines_accepted',
+    'total_acceptances_count': 'acceptances',
+    'total_lines_suggested': 'lines_suggested',
+    'total_chat_turns': 'chat_turns',
+    'total_chat_acceptances': 'chat_acceptances',
+    'total_active_chat_users': 'chat_users',
+}
+
+
+def enable_copy_on_write() -> None:
+    """
+    Turn on pandas copy-on-write for this process.
+
+    Every session is handed a view of the same cached frames. With
+    copy-on-write, a session that modifies its view gets a private copy of
+    just the changed columns, and the shared data stays read-only without
+    being copied up front. Entry points that serve the cached frames call this
+    at start-up, so importing the loader does not change pandas options.
+    """
+    pd.set_option("mode.copy_on_write", True)
+
+
+class _LoadCache:
+    """Partitions already loaded from one store directory, and the frame built from them"""
+    def __init__(self):
+        # Signature of the manifest the frame was built from
+        self.version: Optional[Tuple[int, int]] = None
+        self.signatures: Dict[Path, Tuple[int, int]] = {}
+        self.chunks: Dict[Path, pd.DataFrame] = {}
+        self.frame: Optional[pd.DataFrame] = None
+        # Held by the one thread rebuilding the frame; others keep reading the previous one
+        self.build_lock = threading.Lock()
+
+
+# Shared by all loader instances and sessions so the data is held once per process
+_caches: Dict[Path, _LoadCache] = {}
+_rollup_cache: Dict[Path, Tuple[Tuple[int, int], pd.DataFrame]] = {}
+
+# Default number of processes decoding partitions on a cold load; 1 reads serially
+LOADER_WORKERS = int(os.getenv("LOADER_WORKERS", "1"))
+# Fewer partitions are read serially even with workers: decoding one takes a
+# few milliseconds, less than handing it to a process and back
+LOADER_POOL_MIN_FILES = int(os.getenv("LOADER_POOL_MIN_FILES", "500"))
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+# Held while the pool is created, resized or given work, so no thread submits to a pool another one shut down
+_pool_lock = threading.Lock()
+_cache_lock = threading.Lock()
+
+
+def _signature(path: Path) -> Tuple[int, int]:
+    stat = path.stat()
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _manifest_version(store: MetricsStore) -> Optional[Tuple[int, int]]:
+    """Return the signature of a store's manifest, which is rewritten whenever partitions change"""
+    try:
+        return _signature(store.manifest_path)
+    except FileNotFoundError:
+        return None
+
+
+def invalidate_cache(path: Optional[Path] = None) -> None:
+    """
+    Force the next load to re-check stored partitions.
+
+    Pass the path of a partition that was just written to re-read only that
+    file, or no path to drop every cached frame. Sessions keep reading the
+    previous frame of a store until the next load has rebuilt it.
+    """
+    with _cache_lock:
+        if path is None:
+            _caches.clear()
+            _rollup_cache.clear()
+            return
+        path = Path(path).resolve()
+        cache = _caches.get(path.parent)
+        if cache is not None:
+            cache.version = None
+            cache.signatures.pop(path, None)
+
+
+def slice_date_range(
+    df: pd.DataFrame,
+    start_date: Optional[pd.Timestamp] = None,
+    end_date: Optional[pd.Timestamp] = None,
+    column: str = 'date',
+) -> pd.DataFrame:
+    """
+    Select the rows of a frame sorted by `column` that fall within a date range.
+
+    Both bounds are found by binary search and the result is a positional
+    slice, so no boolean masks are allocated.
+    """
+    dates = df[column].values
+    lo = 0 if start_date is None else dates.searchsorted(pd.Timestamp(start_date).to_datetime64(), side='left')
+    hi = len(dates) if end_date is None else dates.searchsorted(pd.Timestamp(end_date).to_datetime64(), side='right')
+    return df.iloc[lo:hi]
+
+
+def _read_chunk(path: Path, columns: Optional[List[str]], schema: pa.Schema,
+                rename: Dict[str, str]) -> pd.DataFrame:
+    """Decode one partition; runs in a worker process for parallel loads"""
+    return read_partitions([path], columns, schema).rename(columns=rename)
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    """Return the process pool shared by all loaders, resized if needed; call with `_pool_lock` held"""
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != workers:
+        if _pool is not None:
+            _pool.shutdown()
+        # Spawned workers are safe to start from Streamlit's threaded server
+        _pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+        _pool_workers = workers
+    return _pool
+
+
+@atexit.register
+def _shutdown_pool() -> None:
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+
+
+def _concat_chunks(chunks: List[pd.DataFrame], sort_key: str) -> pd.DataFrame:
+    """Concatenate per-partition frames, keeping dimension columns categorical"""
+    frame = pd.concat(chunks, ignore_index=True).sort_values(sort_key, kind='stable', ignore_index=True)
+    for column in DIMENSION_COLUMNS:
+        if column in frame.columns:
+            frame[column] = frame[column].astype('category')
+    return frame
+
 
 class MetricsDataLoader:
-    def __init__(self, data_dir: str = None):
+    def __init__(self, data_dir: str = None, scope: Optional[str] = None,
+                 max_workers: int = LOADER_WORKERS):
         self.logger = logging.getLogger(__name__)
+        self.max_workers = max_workers
         self.logger.info(f"Data directory: {data_dir}")
         self.reader = MetricsReader(data_dir)
-        
+        self.store = MetricsStore(data_dir, scope=scope)
+        self.breakdown_store = MetricsStore(data_dir, table="breakdown", scope=scope)
+        self.rollups = RollupStore(data_dir, scope=scope)
 
     def load_metrics_to_dataframe(self) -> Optional[pd.DataFrame]:
-        """Load all metrics files into a pandas DataFrame"""
+        """Load all stored metrics into a pandas DataFrame"""
         try:
-            # Get all JSON files sorted by name
-            data_files = sorted(self.reader.data_dir.glob("*.json"))
-            if not data_files:
-                self.logger.warning("No JSON files found in directory")
+            df = self._load_cached(self.store, list(COLUMN_NAMES), COLUMN_NAMES, DAILY_METRICS)
+            # Convert legacy JSON files on first use
+            if df is None and not self.store.partition_files() and self.store.migrate_json():
+                df = self._load_cached(self.store, list(COLUMN_NAMES), COLUMN_NAMES, DAILY_METRICS)
+            if df is None or df.empty:
+                self.logger.warning("No metrics partitions found in directory")
                 return None
 
-            # Load all metrics data
-        
-            all_metrics = []
-            for file in data_files:
-                self.logger.info(f"Processing file: {file}")
-                metrics = self.reader.get_metrics_from_file(file.name)
-                if metrics:
-                    all_metrics.extend(metrics)
+            return df.copy(deep=False)
+
+        except Exception as e:
+            self.logger.error(f"Error loading metrics data: {str(e)}")
+            return None
+
+    def load_range(
+        self,
+        start_date: Optional[pd.Timestamp] = None,
+        end_date: Optional[pd.Timestamp] = None,
+        columns: Optional[List[str]] = None,
+    ) -> Optional[pd.DataFrame]:
+        """
+        Load the days within a range, optionally projected to some columns.
+
+        Args:
+            start_date: First day to include.
+            end_date: Last day to include.
+            columns: Columns to return besides `date`. Defaults to all columns.
+
+        Returns:
+            A slice of the cached frame sorted by date, or None if no metrics are stored.
+        """
+        df = self.load_metrics_to_dataframe()
+        if df is None:
+            return None
+        df = slice_date_range(df, start_date, end_date)
+        if columns is not None:
+            df = df[['date'] + [c for c in columns if c != 'date']]
+        return df
 
-            if not all_metrics:
+    def load_rollup(self, granularity: str) -> Optional[pd.DataFrame]:
+        """Load a precomputed weekly, monthly or quarterly rollup, building it on first use"""
+        try:
+            path = self.rollups.path(granularity).resolve()
+            with _cache_lock:
+                if not path.exists():
+                    self.rollups.update(self.store)
+                if not path.exists():
+                    self.logger.warning("No metrics partitions to build rollups from")
+                    return None
+
+                signature = _signature(path)
+                cached = _rollup_cache.get(path)
+                if cached is None or cached[0] != signature:
+                    increment("cache_misses")
+                    df = self.rollups.read(granularity)
+                    df = derive(df[list(COLUMN_NAMES)].rename(columns=COLUMN_NAMES), DAILY_METRICS)
+                    cached = _rollup_cache[path] = (signature, df)
+                else:
+                    increment("cache_hits")
+            return cached[1].copy(deep=False)
+
+        except Exception as e:
+            self.logger.error(f"Error loading {granularity} rollup: {str(e)}")
+            return None
+
+    def load_summary(self) -> Optional[Dict]:
+        """
+        Read the totals of the whole history precomputed at ingest time, without loading any partition.
+
+        Returns:
+            A dict with the `first_day` and `latest_day` as timestamps, the number
+            of stored `days` and the `totals` per column, or None if no up-to-date
+            summary is stored.
+        """
+        try:
+            summary = self.rollups.read_summary(self.store)
+            if summary is None:
                 return None
+            return {
+                'first_day': pd.Timestamp(summary['first_day']),
+                'latest_day': pd.Timestamp(summary['latest_day']),
+                'days': summary['days'],
+                'totals': {COLUMN_NAMES[c]: v for c, v in summary['totals'].items() if c in COLUMN_NAMES},
+            }
+
+        except Exception as e:
+            self.logger.error(f"Error loading summary: {str(e)}")
+            return None
+
+    def data_version(self) -> Tuple:
+        """
+        Return a value that changes whenever stored metrics, breakdown or rollups change.
 
-            # Convert to DataFrame
-            data = [{
-                'date': m.day,
-                'suggestions': m.total_suggestions_count,
-                'active_users': m.total_active_users,
-                'lines_accepted': m.total_lines_accepted  
-            } for m in all_metrics]
+        Appends rewrite the manifests and rollup files, so their signatures are
+        enough to key caches of anything derived from the data.
+        """
+        paths = [self.store.manifest_path, self.breakdown_store.manifest_path]
+        paths += [self.rollups.path(g) for g in GRANULARITIES]
+        return tuple(_signature(p) if p.exists() else None for p in paths)
 
-            return pd.DataFrame(data)
+    def load_breakdown_to_dataframe(self) -> Optional[pd.DataFrame]:
+        """Load the long-format editor/model/language breakdown into a pandas DataFrame"""
+        try:
+            df = self._load_cached(self.breakdown_store)
+            if df is None or df.empty:
+                self.logger.warning("No breakdown partitions found in directory")
+                return None
+
+            return df.copy(deep=False)
 
         except Exception as e:
-            self.logger.error(f"Error loading metrics data: {str(e)}")
+            self.logger.error(f"Error loading breakdown data: {str(e)}")
+            return None
+
+    def load_table(
+        self,
+        table: str = "metrics",
+        start_date: Optional[pd.Timestamp] = None,
+        end_date: Optional[pd.Timestamp] = None,
+    ) -> Optional[pd.DataFrame]:
+        """
+        Load the rows of a stored table within a date range.
+
+        Args:
+            table: `metrics` for the daily totals or `breakdown` for the
+                per editor, model and language rows.
+            start_date: First day to include.
+            end_date: Last day to include.
+
+        Returns:
+            A date-sorted slice of the cached table, or None if nothing is stored.
+        """
+        if table == "breakdown":
+            df = self.load_breakdown_to_dataframe()
+            return None if df is None else slice_date_range(df, start_date, end_date, column='day')
+        return self.load_range(start_date, end_date)
+
+    def load_breakdown(
+        self,
+        by: List[str],
+        start_date: Optional[pd.Timestamp] = None,
+        end_date: Optional[pd.Timestamp] = None,
+        filters: Optional[Dict[str, List[str]]] = None,
+    ) -> Optional[pd.DataFrame]:
+        """
+        Sum the breakdown metrics over the given dimensions.
+
+        Args:
+            by: Columns to group by, any of `day`, `editor`, `model` and `language`.
+            start_date: First day to include.
+            end_date: Last day to include.
+            filters: Allowed values per dimension, e.g. `{"editor": ["vscode"]}`.
+
+        Returns:
+            A frame with one row per group, the summed metrics and the
+            `BREAKDOWN_METRICS` rates, or None if no breakdown is stored.
+        """
+        df = self.load_breakdown_to_dataframe()
+        if df is None:
+            return None
+
+        df = slice_date_range(df, start_date, end_date, column='day')
+        mask = pd.Series(True, index=df.index)
+        for column, values in (filters or {}).items():
+            mask &= df[column].isin(values)
+        # Chat rows have no language, so leave them out of per-language groups
+        if 'language' in by:
+            mask &= df['language'] != ''
+
+        grouped = (
+            df[mask]
+            .groupby(by, observed=True)[BREAKDOWN_METRIC_COLUMNS]
+            .sum()
+            .reset_index()
+        )
+        return derive(grouped, BREAKDOWN_METRICS)
+
+    def _load_cached(
+        self,
+        store: MetricsStore,
+        columns: Optional[List[str]] = None,
+        rename: Optional[Dict[str, str]] = None,
+        metrics: Optional[Dict[str, DerivedMetric]] = None,
+    ) -> Optional[pd.DataFrame]:
+        """
+        Return the shared frame for `store`, reading only new or changed partitions.
+
+        The frame is versioned by the store's manifest. When it changes, one
+        thread rebuilds the frame and swaps it in with a single assignment,
+        while concurrent callers keep getting the previous version instead of
+        waiting. The derived `metrics` are added once per rebuild.
+        """
+        rename = rename or {}
+        store_dir = store.store_dir.resolve()
+        if not store_dir.exists():
             return None
+        with _cache_lock:
+            cache = _caches.setdefault(store_dir, _LoadCache())
+
+        frame = cache.frame
+        if frame is not None and cache.version == _manifest_version(store):
+            increment("cache_hits")
+            return frame
+
+        # Only the first load has to wait for a frame to be built
+        if not cache.build_lock.acquire(blocking=frame is None):
+            increment("stale_reads")
+            return frame
+        try:
+            version = _manifest_version(store)
+            if cache.frame is not None and cache.version == version:
+                # Built by the thread this one waited for
+                increment("cache_hits")
+                return cache.frame
+
+            files = [f.resolve() for f in store.partition_files()]
+            signatures = {f: _signature(f) for f in files}
+            changed = [f for f in files if cache.signatures.get(f) != signatures[f]]
+            removed = [f for f in cache.chunks if f not in signatures]
+
+            frame = cache.frame
+            if changed or removed or frame is None:
+                increment("cache_misses")
+                increment("partitions_read", len(changed))
+                increment("bytes_read", sum(signatures[f][1] for f in changed))
+                for f in removed:
+                    del cache.chunks[f]
+                with span(f"read_partitions:{store.table}"):
+                    for f, chunk in zip(changed, self._read_chunks(changed, store.schema, columns, rename)):
+                        cache.chunks[f] = chunk
+                        increment("rows_loaded", len(chunk))
+                with span(f"concat:{store.table}"):
+                    chunks = [cache.chunks[f] for f in files]
+                    frame = _concat_chunks(chunks, rename.get('day', 'day')) if chunks else None
+                if frame is not None and metrics:
+                    with span(f"derive:{store.table}"):
+                        frame = derive(frame, metrics)
+            else:
+                increment("cache_hits")
+
+            with _cache_lock:
+                cache.signatures = signatures
+                cache.version = version
+                cache.frame = frame
+            return frame
+        finally:
+            cache.build_lock.release()
+
+    def _read_chunks(self, files: List[Path], schema: pa.Schema, columns: Optional[List[str]],
+                     rename: Dict[str, str]) -> List[pd.DataFrame]:
+        """Decode partitions serially or across the process pool, keeping file order"""
+        self.logger.info(f"Processing {len(files)} files")
+        if self.max_workers <= 1 or len(files) < max(LOADER_POOL_MIN_FILES, 2):
+            return [_read_chunk(f, columns, schema, rename) for f in files]
+
+        n = len(files)
+        # map() submits every task before returning, so the lock is not held while they run;
+        # a resize waits for them in shutdown(). Results come in submission order.
+        with _pool_lock:
+            results = _get_pool(self.max_workers).map(
+                _read_chunk, files, [columns] * n, [schema] * n, [rename] * n,
+                chunksize=max(1, n // (self.max_workers * 4)),
+            )
+        return list(results)
 
 if __name__ == "__main__":
     # Example usage
@@ -1,111 +1,100 @@
 from pathlib import Path
-import json
 import logging
-from datetime import datetime
-from typing import Optional, List
-import re
-from reader import MetricsReader, DailyMetrics
+from typing import Optional
+from anomalies import AnomalyStore
+from reader import MetricsReader
+from rollups import RollupStore
+from metrics_store import MetricsStore, breakdown_file_for, read_partitions
+from telemetry import setup_logging, span
 
 class DataManager:
-    def __init__(self, data_dir: str = "data"):
+    def __init__(self, data_dir: str = "data", scope: Optional[str] = None):
         self.data_dir = Path(data_dir)
         self.reader = MetricsReader(data_dir)
-        self._setup_logging()
+        self.store = MetricsStore(data_dir, scope=scope)
+        self.breakdown_store = MetricsStore(data_dir, table="breakdown", scope=scope)
+        self.rollups = RollupStore(data_dir, scope=scope)
+        self.anomalies = AnomalyStore(data_dir, scope=scope)
+        # Set when the last processed file held only days that were already stored
+        self.no_new_data = False
+        setup_logging()
+        if self.store.migrate_json():
+            self.rollups.update_summary(self.store)
 
-    def _setup_logging(self):
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s'
-        )
-
-    def _find_latest_data_file(self) -> Optional[Path]:
-        data_files = list(self.data_dir.glob("data_*.json"))
-        if not data_files:
-            return None
-        
-        # Extract dates from filenames and find latest
-        date_pattern = re.compile(r'data_(\d{4}-\d{2}-\d{2})\.json')
-        dated_files = []
-        for file in data_files:
-            match = date_pattern.match(file.name)
-            if match:
-                date_str = match.group(1)
-                dated_files.append((datetime.strptime(date_str, "%Y-%m-%d"), file))
-        
-        return max(dated_files, key=lambda x: x[0])[1] if dated_files else None
-
-    def _get_existing_dates(self, file_path: Path) -> set:
-        try:
-            metrics = self.reader.read_metrics_file(file_path.name)
-            if metrics:
-                return {m.day for m in metrics}
-            return set()
-        except Exception:
-            return set()
-
-    def _save_metrics(self, metrics: List[DailyMetrics], output_path: Path) -> None:
-        metrics_json = [
-            {
-                "day": m.day.strftime("%Y-%m-%d"),
-                "total_suggestions_count": m.total_suggestions_count,
-                "total_acceptances_count": m.total_acceptances_count,
-                "total_lines_suggested": m.total_lines_suggested,
-                "total_lines_accepted": m.total_lines_accepted,
-                "total_active_users": m.total_active_users,
-                "total_chat_acceptances": m.total_chat_acceptances,
-                "total_chat_turns": m.total_chat_turns,
-                "total_active_chat_users": m.total_active_chat_users
-            }
-            for m in metrics
-        ]
-
-        with open(output_path, 'w') as f:
-            json.dump(metrics_json, f, indent=2)
-
-        logging.info(f"Saved {len(metrics)} new metrics to {output_path.name}")
 
     def process_new_data(self, input_file: str) -> Optional[str]:
+        with span("process_new_data"):
+            return self._process_new_data(input_file)
+
+    def _process_new_data(self, input_file: str) -> Optional[str]:
+        self.no_new_data = False
         try:
-            # Read new data
-            new_metrics = self.reader.read_metrics_file(input_file)
-            if not new_metrics:
+            # Read new data as a columnar batch
+            new_batch = self.reader.read_metrics_batch(input_file)
+            if not new_batch:
                 logging.error("No data found in input file")
                 return None
+            new_metrics = new_batch.to_frame()
 
-            # Find latest existing data file
-            latest_file = self._find_latest_data_file()
-            latest_day = None
-            if latest_file:
-                logging.info(f"Latest data file found: {latest_file.name}")
-                existing_dates = self._get_existing_dates(latest_file)
-                if existing_dates:
-                    latest_day = max(existing_dates)
-                    logging.info(f"Latest day in existing data: {latest_day.strftime('%Y-%m-%d')}")
+            self._process_breakdown(input_file)
 
-            # Filter out dates before or on the latest day
+            # Keep days after the latest stored one and backfill known gaps
+            latest_day = self.store.latest_day()
             if latest_day:
-                unique_metrics = [m for m in new_metrics if m.day > latest_day]
-            else:
-                unique_metrics = new_metrics
+                logging.info(f"Latest day in existing data: {latest_day.strftime('%Y-%m-%d')}")
+            unique_metrics = new_metrics[self.store.new_days_mask(new_metrics["day"])]
 
-            if not unique_metrics:
+            if unique_metrics.empty:
                 logging.info("No new metrics to save")
+                self.no_new_data = True
+                self._report_gaps(unique_metrics, new_metrics["day"].min(), latest_day)
                 return None
 
-            # Find last day for filename
-            last_day = max(m.day for m in unique_metrics)
-            logging.info(f"Last day in new metrics: {last_day.strftime('%Y-%m-%d')}")
-            output_filename = f"data_{last_day.strftime('%Y-%m-%d')}.json"
-            output_path = self.data_dir / output_filename
+            # Read before the manifest changes, so the new days can be folded into it
+            summary = self.rollups.read_summary(self.store)
+
+            # Save new data as a partition named after its last day
+            output_path = self.store.write_partition(unique_metrics)
+            logging.info(f"Last day in new metrics: {unique_metrics['day'].max().strftime('%Y-%m-%d')}")
+            self._report_gaps(unique_metrics, new_metrics["day"].min(), latest_day)
 
-            # Save new data
-            self._save_metrics(unique_metrics, output_path)
-            return output_filename
+            # Refresh only the rollup periods touched by the new days
+            with span("rollup_update"):
+                self.rollups.update(self.store, unique_metrics['day'].min())
+                # Lets the dashboard show key statistics before loading the partitions
+                self.rollups.update_summary(self.store, summary, unique_metrics)
+            # Baselines and z-scores of the new days, from the trailing history only
+            with span("anomaly_update"):
+                self.anomalies.update(self.store, self.breakdown_store, unique_metrics['day'].min())
+            return output_path.name
 
         except Exception as e:
             logging.error(f"Error processing new data: {str(e)}")
             return None
 
+    def _process_breakdown(self, input_file: str) -> Optional[Path]:
+        """Append the editor/model/language breakdown downloaded with `input_file`"""
+        breakdown_file = breakdown_file_for(self.data_dir / input_file)
+        if not breakdown_file.exists():
+            return None
+
+        breakdown = read_partitions([breakdown_file], schema=self.breakdown_store.schema)
+        breakdown = breakdown[self.breakdown_store.new_days_mask(breakdown["day"])]
+        return self.breakdown_store.write_partition(breakdown)
+
+    def _report_gaps(self, unique_metrics, window_start, latest_day) -> None:
+        """Log backfilled days and gaps the API window has already moved past"""
+        if latest_day is not None:
+            backfilled = unique_metrics["day"][unique_metrics["day"] <= latest_day]
+            if not backfilled.empty:
+                logging.info(f"Backfilling {backfilled.nunique()} missing days")
+        lost = [day for day in self.store.gaps() if day < window_start]
+        if lost:
+            logging.warning(
+                f"{len(lost)} days are missing and no longer in the API window, "
+                f"e.g. {lost[0].strftime('%Y-%m-%d')}"
+            )
+
 if __name__ == "__main__":
     manager = DataManager()
     # Example usage with a downloaded metrics file
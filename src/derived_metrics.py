@@ -0,0 +1,106 @@
+"""
+This module defines the metrics derived from the stored counts, such as rates and per-user averages.
+
+Each metric is a ratio of two columns, declared once in a registry and
+evaluated as a vectorized column expression over a whole frame. Days, periods
+or groups whose denominator is zero get NaN instead of an error or infinity.
+The loader adds the daily metrics to its cached frame, so they are computed
+once per stored dataset version rather than on every page view.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+
+@dataclass(frozen=True)
+class DerivedMetric:
+    """
+    A metric computed as `numerator / denominator * scale`, rounded to `decimals`.
+    """
+    name: str
+    label: str
+    numerator: str
+    denominator: str
+    scale: float = 1.0
+    decimals: int = 1
+    unit: str = ""
+
+    def value(self, x) -> Optional[float]:
+        """Convert one evaluated value to a plain number, None where undefined"""
+        if x is None or pd.isna(x):
+            return None
+        return int(x) if self.decimals == 0 else float(x)
+
+    def format(self, x) -> str:
+        """Render one evaluated value for display"""
+        x = self.value(x)
+        return "n/a" if x is None else f"{x:.{self.decimals}f}{self.unit}"
+
+
+def _registry(*metrics: DerivedMetric) -> Dict[str, DerivedMetric]:
+    return {metric.name: metric for metric in metrics}
+
+
+# Over the daily totals returned by `MetricsDataLoader`, and the rollups
+DAILY_METRICS = _registry(
+    # The dashboard's original rate: lines accepted per suggestion shown
+    DerivedMetric("acceptance_rate", "Acceptance Rate", "lines_accepted", "suggestions", 100, 0, "%"),
+    DerivedMetric("suggestion_acceptance_rate", "Suggestion Acceptance Rate", "acceptances", "suggestions", 100, 0, "%"),
+    DerivedMetric("line_acceptance_rate", "Line Acceptance Rate", "lines_accepted", "lines_suggested", 100, 0, "%"),
+    DerivedMetric("lines_per_active_user", "Lines Accepted per Active User", "lines_accepted", "active_users"),
+    DerivedMetric("chat_turns_per_user", "Chat Turns per Chat User", "chat_turns", "chat_users"),
+    DerivedMetric("chat_acceptance_rate", "Chat Acceptance Rate", "chat_acceptances", "chat_turns", 100, 0, "%"),
+)
+
+# Over the summed editor/model/language breakdown
+BREAKDOWN_METRICS = _registry(
+    DerivedMetric("suggestion_acceptance_rate", "Suggestion Acceptance Rate", "code_acceptances", "code_suggestions", 100, 0, "%"),
+    DerivedMetric("line_acceptance_rate", "Line Acceptance Rate", "code_lines_accepted", "code_lines_suggested", 100, 0, "%"),
+    DerivedMetric("chat_acceptance_rate", "Chat Acceptance Rate", "chat_acceptances", "chat_turns", 100, 0, "%"),
+)
+
+
+def ratio(numerator, denominator, scale: float = 1.0) -> np.ndarray:
+    """
+    Divide two columns element-wise, with NaN wherever the denominator is not positive.
+    """
+    numerator = np.asarray(numerator, dtype="float64")
+    denominator = np.asarray(denominator, dtype="float64")
+    out = np.full(np.broadcast(numerator, denominator).shape, np.nan)
+    np.divide(numerator, denominator, out=out, where=denominator > 0)
+    return out * scale
+
+
+def derive(
+    df: pd.DataFrame,
+    metrics: Dict[str, DerivedMetric] = DAILY_METRICS,
+    names: Optional[Iterable[str]] = None,
+) -> pd.DataFrame:
+    """
+    Add derived metric columns to a frame.
+
+    Args:
+        df (pd.DataFrame): Frame holding the input columns.
+        metrics (Dict[str, DerivedMetric]): Registry to evaluate.
+        names (Optional[Iterable[str]]): Metrics to add. Defaults to every
+            metric of the registry whose input columns are present.
+
+    Returns:
+        pd.DataFrame: A new frame with one column per derived metric; `df` is not modified.
+
+    Raises:
+        KeyError: If a metric named in `names` is unknown or its inputs are missing.
+    """
+    if names is None:
+        selected = [m for m in metrics.values() if m.numerator in df.columns and m.denominator in df.columns]
+    else:
+        selected = [metrics[name] for name in names]
+
+    columns = {
+        m.name: np.round(ratio(df[m.numerator], df[m.denominator], m.scale), m.decimals)
+        for m in selected
+    }
+    return df.assign(**columns)
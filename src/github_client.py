@@ -0,0 +1,288 @@
+"""
+This module provides a pooled, retrying HTTP client for the GitHub REST API.
+"""
+
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+import json
+import logging
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_API_URL = "https://api.github.com"
+
+# Responses worth another attempt; 403 is only retried when rate limited
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class RateBudgetExceeded(requests.RequestException):
+    """Raised when the shared rate-limit budget cannot be met in time"""
+
+
+class RateBudget:
+    """
+    Token bucket shared by every request of one or more clients.
+
+    Requests are spread evenly over the hour instead of bursting, and all
+    requests pause once GitHub reports that fewer than `reserve` calls remain
+    until the limit resets.
+    """
+    def __init__(self, requests_per_hour: float = 5000, burst: int = 10, reserve: int = 50):
+        self.rate = requests_per_hour / 3600
+        self.burst = burst
+        self.reserve = reserve
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        Take one request from the budget.
+
+        Returns:
+            float: Seconds to wait before sending the request.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._blocked_until - time.time())
+
+    def release(self) -> None:
+        """
+        Return a request taken with `acquire` that was never sent.
+        """
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + 1)
+
+    def update(self, response: requests.Response) -> None:
+        """
+        Pause the budget until the reset time when a response shows it is nearly used up.
+        """
+        remaining = response.headers.get("X-RateLimit-Remaining", "")
+        reset = response.headers.get("X-RateLimit-Reset", "")
+        if remaining.isdigit() and reset.isdigit() and int(remaining) <= self.reserve:
+            with self._lock:
+                self._blocked_until = max(self._blocked_until, int(reset) + 1)
+
+
+class GithubClient:
+    """
+    Sends GitHub API requests over a shared connection pool.
+
+    Transient failures (connection errors, timeouts, 429 and 5xx responses and
+    rate-limited 403s) are retried with exponential backoff that honors the
+    `Retry-After` and `X-RateLimit-Reset` headers. Conditional requests reuse
+    the last stored ETag so unchanged resources come back as a 304.
+    """
+    def __init__(
+        self,
+        api_key: str,
+        api_version: str = "2022-11-28",
+        base_url: str = DEFAULT_API_URL,
+        timeout: Tuple[float, float] = (5, 60),
+        max_retries: int = 5,
+        backoff_factor: float = 1.0,
+        max_backoff: float = 300.0,
+        pool_size: int = 10,
+        etag_file: Optional[Path] = None,
+        rate_budget: Optional[RateBudget] = None,
+    ):
+        """
+        Initialize the client.
+
+        Args:
+            api_key (str): Token sent as a bearer token.
+            api_version (str): Value of the `X-GitHub-Api-Version` header.
+            base_url (str): API root, e.g. a GitHub Enterprise Server URL or a local stub.
+            timeout (Tuple[float, float]): Connect and read timeouts in seconds.
+            max_retries (int): Attempts after the first before giving up.
+            backoff_factor (float): Base delay in seconds, doubled on every retry.
+            max_backoff (float): Longest single wait; longer rate-limit resets fail fast.
+            pool_size (int): Connections kept alive per host.
+            etag_file (Optional[Path]): JSON file persisting ETags between runs.
+            rate_budget (Optional[RateBudget]): Budget shared with other clients or threads.
+        """
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.etag_file = Path(etag_file) if etag_file else None
+        self.rate_budget = rate_budget
+        self._etags: Optional[Dict[str, str]] = None
+        self._etag_lock = threading.Lock()
+        self._sleep = time.sleep
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Accept": "application/vnd.github+json",
+            "Authorization": f"Bearer {api_key}",
+            "X-GitHub-Api-Version": api_version,
+        })
+
+    def url(self, path: str) -> str:
+        """
+        Return the absolute URL for an API path.
+        """
+        if path.startswith(("http://", "https://")):
+            return path
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def get(self, path: str, stream: bool = False, conditional: bool = False, **kwargs) -> requests.Response:
+        """
+        Send a GET request, retrying transient failures.
+
+        Args:
+            path (str): API path or absolute URL.
+            stream (bool): Leave the body unread so it can be iterated.
+            conditional (bool): Send `If-None-Match` with the stored ETag.
+            **kwargs: Passed on to `requests.Session.get`.
+
+        Returns:
+            requests.Response: The final response, which may be a 304 for
+            conditional requests or a non-retryable error status.
+
+        Raises:
+            requests.RequestException: If the last attempt failed to connect or timed out.
+        """
+        url = self.url(path)
+        headers = dict(kwargs.pop("headers", None) or {})
+        if conditional:
+            etag = self.etag(url)
+            if etag:
+                headers["If-None-Match"] = etag
+
+        attempt = 0
+        while True:
+            self._wait_for_budget()
+            try:
+                response = self.session.get(
+                    url, headers=headers, stream=stream, timeout=self.timeout, **kwargs
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                logging.warning(f"Request to {url} failed ({e}), retrying in {delay:.1f}s")
+            else:
+                if self.rate_budget:
+                    self.rate_budget.update(response)
+                delay = self._retry_delay(response, attempt)
+                if delay is None:
+                    return response
+                response.close()
+                logging.warning(f"Request to {url} returned {response.status_code}, retrying in {delay:.1f}s")
+
+            self._sleep(delay)
+            attempt += 1
+
+    def _wait_for_budget(self) -> None:
+        """Block until the shared rate budget allows another request"""
+        if not self.rate_budget:
+            return
+        wait = self.rate_budget.acquire()
+        if wait > self.max_backoff:
+            self.rate_budget.release()
+            raise RateBudgetExceeded(f"Rate limit budget exhausted for the next {wait:.0f}s")
+        if wait > 0:
+            self._sleep(wait)
+
+    def _backoff(self, attempt: int) -> float:
+        """Exponential backoff with full jitter"""
+        return min(self.max_backoff, self.backoff_factor * (2 ** attempt) * random.uniform(0.5, 1.0))
+
+    def _retry_delay(self, response: requests.Response, attempt: int) -> Optional[float]:
+        """Return how long to wait before retrying `response`, or None to stop"""
+        rate_limited = response.headers.get("X-RateLimit-Remaining") == "0"
+        retryable = response.status_code in RETRY_STATUSES or (
+            response.status_code == 403 and (rate_limited or "Retry-After" in response.headers)
+        )
+        if not retryable or attempt >= self.max_retries:
+            return None
+
+        delay = _retry_after(response)
+        if delay is None and rate_limited:
+            reset = response.headers.get("X-RateLimit-Reset")
+            if reset and reset.isdigit():
+                delay = max(0.0, int(reset) - time.time()) + 1
+        if delay is None:
+            return self._backoff(attempt)
+        if delay > self.max_backoff:
+            logging.error(f"Rate limited for {delay:.0f}s, longer than the {self.max_backoff:.0f}s limit")
+            return None
+        return delay
+
+    def etag(self, url: str) -> Optional[str]:
+        """
+        Return the stored ETag for `url`.
+        """
+        with self._etag_lock:
+            return self._load_etags().get(self.url(url))
+
+    def save_etag(self, url: str, response: requests.Response) -> None:
+        """
+        Remember the ETag of a response whose body has been fully processed.
+
+        Call this only after the data has been stored, otherwise a failed run
+        would be answered with 304 and never see that data again.
+
+        Args:
+            url (str): API path or absolute URL the request was sent to. The
+                ETag is stored under it rather than under `response.url`, which
+                differs after a redirect, so that `get` finds it again.
+            response (requests.Response): The response carrying the ETag.
+        """
+        etag = response.headers.get("ETag")
+        if not etag or response.status_code != 200:
+            return
+        with self._etag_lock:
+            etags = self._load_etags()
+            etags[self.url(url)] = etag
+            if self.etag_file:
+                self.etag_file.parent.mkdir(parents=True, exist_ok=True)
+                tmp_file = self.etag_file.with_suffix(".tmp")
+                with open(tmp_file, "w") as f:
+                    json.dump(etags, f, indent=2)
+                tmp_file.replace(self.etag_file)
+
+    def _load_etags(self) -> Dict[str, str]:
+        if self._etags is None:
+            self._etags = {}
+            if self.etag_file and self.etag_file.exists():
+                try:
+                    with open(self.etag_file) as f:
+                        self._etags = json.load(f)
+                except Exception as e:
+                    logging.error(f"Error reading ETags from {self.etag_file}: {str(e)}")
+        return self._etags
+
+    def close(self) -> None:
+        """
+        Close pooled connections.
+        """
+        self.session.close()
+
+
+def _retry_after(response: requests.Response) -> Optional[float]:
+    """Parse a Retry-After header given in seconds or as an HTTP date"""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
@@ -2,96 +2,282 @@ import os
 import json
 import logging
 import requests
+import pandas as pd
+import pyarrow.parquet as pq
+from dataclasses import dataclass
 from pathlib import Path
 from datetime import datetime
+from typing import List, Optional
 from dotenv import load_dotenv
+from github_client import DEFAULT_API_URL, GithubClient, RateBudget
+from json_stream import iter_json_array
+from metrics_store import BREAKDOWN_METRIC_COLUMNS, BREAKDOWN_SCHEMA, breakdown_file_for, to_table
+from telemetry import increment, setup_logging, span
 
 load_dotenv('.env')
 
+# Bytes read from the response per iteration
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# Breakdown rows buffered before they are flushed to Parquet
+BREAKDOWN_BATCH_ROWS = 10_000
+
+@dataclass(frozen=True)
+class Scope:
+    """
+    An organization, team or enterprise whose metrics are downloaded.
+    """
+    kind: str
+    owner: str
+    team: Optional[str] = None
+
+    @classmethod
+    def parse(cls, value: str) -> "Scope":
+        """
+        Parse `org`, `org/team-slug` or `enterprise:slug`.
+        """
+        value = value.strip()
+        if value.startswith("enterprise:"):
+            return cls("enterprise", value[len("enterprise:"):])
+        if "/" in value:
+            owner, team = value.split("/", 1)
+            return cls("team", owner, team)
+        return cls("org", value)
+
+    @property
+    def name(self) -> str:
+        """Partition name used by the metrics store"""
+        parts = [self.kind, self.owner] + ([self.team] if self.team else [])
+        return "-".join(parts)
+
+    @property
+    def path(self) -> str:
+        """Metrics API path for this scope"""
+        if self.kind == "enterprise":
+            return f"/enterprises/{self.owner}/copilot/metrics"
+        if self.kind == "team":
+            return f"/orgs/{self.owner}/team/{self.team}/copilot/metrics"
+        return f"/orgs/{self.owner}/copilot/metrics"
+
+
+def configured_scopes() -> List[Optional[Scope]]:
+    """
+    Return the scopes listed in `GITHUB_SCOPES`.
+
+    Without it, only `GITHUB_ORG_NAME` is downloaded into the default (None) scope.
+    """
+    value = os.getenv("GITHUB_SCOPES", "")
+    scopes = [Scope.parse(item) for item in value.split(",") if item.strip()]
+    return scopes or [None]
+
+
+def create_client(data_dir: Path = Path("data"), rate_budget: Optional[RateBudget] = None) -> GithubClient:
+    """
+    Create a GitHub client configured from the environment.
+    """
+    return GithubClient(
+        str(os.getenv("GITHUB_API_KEY")),
+        str(os.getenv("GITHUB_API_VERSION", "2022-11-28")),
+        base_url=str(os.getenv("GITHUB_API_URL", DEFAULT_API_URL)),
+        etag_file=data_dir / "etags.json",
+        rate_budget=rate_budget,
+    )
+
+
 class GithubMetricsDownloader:
-    def __init__(self):
+    def __init__(self, scope: Optional[Scope] = None, client: Optional[GithubClient] = None):
         self.api_key = str(os.getenv("GITHUB_API_KEY"))
         self.org = str(os.getenv("GITHUB_ORG_NAME"))
         self.api_version = str(os.getenv("GITHUB_API_VERSION", "2022-11-28"))
-        self.endpoint = f"https://api.github.com/orgs/{self.org}/copilot/metrics"
-        self.headers = {
-            "Accept": "application/vnd.github+json",
-            "Authorization": f"Bearer {self.api_key}",
-            "X-GitHub-Api-Version": self.api_version
-        }
+        self.api_url = str(os.getenv("GITHUB_API_URL", DEFAULT_API_URL))
+        self.scope = scope
         self.data_dir = Path("data")
         self.data_dir.mkdir(exist_ok=True)
-        self._setup_logging()
-    
-    def _setup_logging(self):
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s'
-        )
+        self.client = client or create_client(self.data_dir)
+        api_scope = scope or Scope("org", self.org)
+        self.endpoint = self.client.url(api_scope.path)
+        self.not_modified = False
+        # Response of the last download, whose ETag is saved once its data is stored
+        self.response = None
+        setup_logging()
     
+    def process_entry(self, entry):
+        """Sum one day's editor/model/language tree into org-wide totals"""
+        if "date" not in entry:
+            logging.error(f"Skipping entry without a date: {entry}")
+            return None
+        processed_entry = {
+            "day": entry["date"],
+            "total_suggestions_count": 0,
+            "total_acceptances_count": 0,
+            "total_lines_suggested": 0,
+            "total_lines_accepted": 0,
+            "total_active_users": entry.get("total_active_users", 0),
+            "total_chat_acceptances": 0,
+            "total_chat_turns": 0,
+            "total_active_chat_users": 0
+        }
+
+        if "copilot_ide_code_completions" in entry:
+            for editor in entry["copilot_ide_code_completions"].get("editors", []):
+                for model in editor.get("models", []):
+                    for language in model.get("languages", []):
+                        processed_entry["total_suggestions_count"] += language.get("total_code_suggestions", 0)
+                        processed_entry["total_acceptances_count"] += language.get("total_code_acceptances", 0)
+                        processed_entry["total_lines_suggested"] += language.get("total_code_lines_suggested", 0)
+                        processed_entry["total_lines_accepted"] += language.get("total_code_lines_accepted", 0)
+
+        if "copilot_ide_chat" in entry:
+            for editor in entry["copilot_ide_chat"].get("editors", []):
+                for model in editor.get("models", []):
+                    processed_entry["total_chat_turns"] += model.get("total_chats", 0)
+                    processed_entry["total_chat_acceptances"] += model.get("total_chat_insertion_events", 0) + model.get("total_chat_copy_events", 0)
+                    processed_entry["total_active_chat_users"] += model.get("total_engaged_users", 0)
+
+        return processed_entry
+
     def process_data(self, raw_data):
         processed_data = []
         for entry in raw_data:
-            try:
-                x = entry["date"]
-            except Exception:
-                print("Error: ", entry)
-                continue
-            processed_entry = {
-                "day": entry["date"],
-                "total_suggestions_count": 0,
-                "total_acceptances_count": 0,
-                "total_lines_suggested": 0,
-                "total_lines_accepted": 0,
-                "total_active_users": entry.get("total_active_users", 0),
-                "total_chat_acceptances": 0,
-                "total_chat_turns": 0,
-                "total_active_chat_users": 0
-            }
-            
-            if "copilot_ide_code_completions" in entry:
-                for editor in entry["copilot_ide_code_completions"].get("editors", []):
-                    for model in editor.get("models", []):
-                        for language in model.get("languages", []):
-                            processed_entry["total_suggestions_count"] += language.get("total_code_suggestions", 0)
-                            processed_entry["total_acceptances_count"] += language.get("total_code_acceptances", 0)
-                            processed_entry["total_lines_suggested"] += language.get("total_code_lines_suggested", 0)
-                            processed_entry["total_lines_accepted"] += language.get("total_code_lines_accepted", 0)
-            
-            if "copilot_ide_chat" in entry:
-                for editor in entry["copilot_ide_chat"].get("editors", []):
-                    for model in editor.get("models", []):
-                        processed_entry["total_chat_turns"] += model.get("total_chats", 0)
-                        processed_entry["total_chat_acceptances"] += model.get("total_chat_insertion_events", 0) + model.get("total_chat_copy_events", 0)
-                        processed_entry["total_active_chat_users"] += model.get("total_engaged_users", 0)
-            
-            processed_data.append(processed_entry)
-        
+            processed_entry = self.process_entry(entry)
+            if processed_entry is not None:
+                processed_data.append(processed_entry)
         return processed_data
-    
+
+    def breakdown_rows(self, entry):
+        """Flatten one day's editor/model/language tree into long-format rows"""
+        rows = []
+        day = entry.get("date")
+        if day is None:
+            return rows
+
+        for editor in entry.get("copilot_ide_code_completions", {}).get("editors", []):
+            for model in editor.get("models", []):
+                for language in model.get("languages", []):
+                    rows.append({
+                        "day": day,
+                        "editor": editor.get("name", ""),
+                        "model": model.get("name", ""),
+                        "language": language.get("name", ""),
+                        "code_suggestions": language.get("total_code_suggestions", 0),
+                        "code_acceptances": language.get("total_code_acceptances", 0),
+                        "code_lines_suggested": language.get("total_code_lines_suggested", 0),
+                        "code_lines_accepted": language.get("total_code_lines_accepted", 0),
+                        "code_engaged_users": language.get("total_engaged_users", 0),
+                    })
+
+        for editor in entry.get("copilot_ide_chat", {}).get("editors", []):
+            for model in editor.get("models", []):
+                rows.append({
+                    "day": day,
+                    "editor": editor.get("name", ""),
+                    "model": model.get("name", ""),
+                    "language": "",
+                    "chat_turns": model.get("total_chats", 0),
+                    "chat_acceptances": model.get("total_chat_insertion_events", 0) + model.get("total_chat_copy_events", 0),
+                    "chat_engaged_users": model.get("total_engaged_users", 0),
+                })
+
+        return rows
+
+    def process_breakdown(self, raw_data):
+        """Flatten each day's editor/model/language tree into long-format rows"""
+        rows = [row for entry in raw_data for row in self.breakdown_rows(entry)]
+        return _breakdown_frame(rows)
+
+    def save_entries(self, entries, output_file):
+        """
+        Aggregate and store per-day API entries one at a time.
+
+        Daily totals are appended to `output_file` as a JSON array and the
+        breakdown rows are flushed to its sibling Parquet file in batches, so
+        only the current entry and one batch of rows are held in memory.
+
+        Returns:
+            int: The number of days written.
+        """
+        days = 0
+        breakdown_rows = []
+        with open(output_file, 'w') as f, \
+                pq.ParquetWriter(breakdown_file_for(output_file), BREAKDOWN_SCHEMA) as writer:
+            f.write("[")
+            for entry in entries:
+                processed_entry = self.process_entry(entry)
+                if processed_entry is None:
+                    continue
+                if days:
+                    f.write(",\n")
+                json.dump(processed_entry, f)
+                days += 1
+
+                breakdown_rows.extend(self.breakdown_rows(entry))
+                if len(breakdown_rows) >= BREAKDOWN_BATCH_ROWS:
+                    writer.write_table(to_table(_breakdown_frame(breakdown_rows), BREAKDOWN_SCHEMA))
+                    breakdown_rows = []
+            f.write("]")
+            writer.write_table(to_table(_breakdown_frame(breakdown_rows), BREAKDOWN_SCHEMA))
+        return days
+
     def download(self):
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        prefix = f"metrics_{self.scope.name}" if self.scope else "metrics"
+        output_file = self.data_dir / f"{prefix}_{timestamp}.json"
+        self.not_modified = False
+        self.response = None
+        complete = False
         try:
-            response = requests.get(self.endpoint, headers=self.headers)
-            
-            if response.status_code != 200:
-                logging.error(f"Failed to fetch data: {response.status_code} - {response.text}")
-                return None
-            
-            raw_data = response.json()
-            processed_data = self.process_data(raw_data)
-            
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            output_file = self.data_dir / f"metrics_{timestamp}.json"
-            
-            with open(output_file, 'w') as f:
-                json.dump(processed_data, f, indent=2)
-            
-            logging.info(f"Data saved to {output_file}")
+            with self.client.get(self.endpoint, stream=True, conditional=True) as response:
+                if response.status_code == 304:
+                    logging.info("Metrics unchanged since the last download")
+                    self.not_modified = True
+                    return None
+                if response.status_code != 200:
+                    logging.error(f"Failed to fetch data: {response.status_code} - {response.text}")
+                    return None
+
+                # Decode the response body one day at a time as it arrives
+                with span("download"):
+                    entries = iter_json_array(_counted(response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE)))
+                    days = self.save_entries(entries, output_file)
+                self.response = response
+
+            increment("days_downloaded", days)
+            logging.info(f"Data for {days} days saved to {output_file}")
+            complete = True
             return output_file
-        
-        except requests.RequestException as e:
+
+        except (requests.RequestException, ValueError) as e:
             logging.error(f"Error fetching data: {e}")
             return None
+        finally:
+            # Also on errors that propagate, e.g. a full disk, so no partial file is left in data/
+            if not complete:
+                for path in (output_file, breakdown_file_for(output_file)):
+                    if path.exists():
+                        path.unlink()
+
+
+    def save_etag(self):
+        """
+        Remember the ETag of the last download, so the next one is skipped while the metrics are unchanged.
+
+        Call this only after `DataManager.process_new_data` stored the
+        downloaded file; a run that fails before must download it again.
+        """
+        if self.response is not None:
+            self.client.save_etag(self.endpoint, self.response)
+
+
+def _counted(chunks):
+    """Pass response chunks through, counting the bytes downloaded"""
+    for chunk in chunks:
+        increment("bytes_downloaded", len(chunk))
+        yield chunk
+
+
+def _breakdown_frame(rows):
+    df = pd.DataFrame(rows, columns=BREAKDOWN_SCHEMA.names)
+    df[BREAKDOWN_METRIC_COLUMNS] = df[BREAKDOWN_METRIC_COLUMNS].fillna(0).astype("int64")
+    return df
 
 if __name__ == "__main__":
     downloader = GithubMetricsDownloader()
@@ -1,18 +1,326 @@
-from data_loader import MetricsDataLoader
+import pandas as pd
+from anomalies import DIMENSIONS, AnomalyStore, alerts, load_anomalies as read_anomalies
+from data_loader import COLUMN_NAMES, MetricsDataLoader, slice_date_range
+from derived_metrics import DAILY_METRICS, derive
+from metrics_store import BREAKDOWN_SCHEMA, DIMENSION_COLUMNS, list_scopes
+from rollups import GRANULARITIES
+from table_query import iter_export, page, query
 
-def load_data():
+def load_scopes():
+    """
+    Return the scopes with downloaded metrics, with None for the default scope.
+    """
+    return list_scopes("./data")
+
+def load_data(scope=None):
     """
     Load metrics data from the specified directory and return it as a DataFrame.
 
     This function initializes a MetricsDataLoader with the data directory set to "./data",
     and then loads the metrics data into a pandas DataFrame.
 
+    Args:
+        scope (str, optional): Org, team or enterprise partition to read. Defaults to the default scope.
+
     Returns:
         pandas.DataFrame: A DataFrame containing the loaded metrics data.
     """
-    loader = MetricsDataLoader(data_dir="./data")
+    loader = MetricsDataLoader(data_dir="./data", scope=scope)
     return loader.load_metrics_to_dataframe()
 
+def data_version(scope=None):
+    """
+    Return a value that changes whenever the stored data of a scope changes.
+
+    Args:
+        scope (str, optional): Org, team or enterprise partition to check.
+
+    Returns:
+        tuple: File signatures of the scope's manifests, rollups and anomalies, for use in cache keys.
+    """
+    loader = MetricsDataLoader(data_dir="./data", scope=scope)
+    return loader.data_version() + AnomalyStore("./data", scope).version()
+
+def filter_date_range(df, start_date=None, end_date=None):
+    """
+    Select the rows of a date-sorted metrics DataFrame within a date range.
+
+    Args:
+        df (pandas.DataFrame): Frame returned by `load_data`.
+        start_date (pandas.Timestamp, optional): First day to include.
+        end_date (pandas.Timestamp, optional): Last day to include.
+
+    Returns:
+        pandas.DataFrame: A positional slice of `df`, found by binary search.
+    """
+    return slice_date_range(df, start_date, end_date)
+
+def load_breakdown(by, start_date=None, end_date=None, filters=None, scope=None):
+    """
+    Load the editor/model/language breakdown summed over the given dimensions.
+
+    Args:
+        by (list): Dimensions to group by, any of "day", "editor", "model" and "language".
+        start_date (pandas.Timestamp, optional): First day to include.
+        end_date (pandas.Timestamp, optional): Last day to include.
+        filters (dict, optional): Allowed values per dimension.
+        scope (str, optional): Org, team or enterprise partition to read.
+
+    Returns:
+        pandas.DataFrame: One row per group with summed metrics and the `BREAKDOWN_METRICS` rates,
+        or None if no breakdown has been downloaded yet.
+    """
+    loader = MetricsDataLoader(data_dir="./data", scope=scope)
+    return loader.load_breakdown(by, start_date, end_date, filters)
+
+def table_columns(table="metrics"):
+    """Return the columns of a table returned by `load_table_page`"""
+    if table == "breakdown":
+        return list(BREAKDOWN_SCHEMA.names)
+    return list(COLUMN_NAMES.values()) + list(DAILY_METRICS)
+
+def load_dimension_values(scope=None):
+    """
+    Return the editors, models and languages present in the stored breakdown.
+
+    Returns:
+        dict: Sorted values per dimension column, empty if no breakdown is stored.
+    """
+    loader = MetricsDataLoader(data_dir="./data", scope=scope)
+    df = loader.load_breakdown_to_dataframe()
+    if df is None:
+        return {}
+    return {c: sorted(v for v in df[c].cat.categories if v) for c in DIMENSION_COLUMNS}
+
+def load_table_page(table="metrics", start_date=None, end_date=None, page_number=1, page_size=100,
+                    filters=None, sort_by=None, ascending=True, scope=None):
+    """
+    Load one page of a stored table, filtered and sorted on the server.
+
+    Args:
+        table (str): "metrics" for daily totals or "breakdown" for per editor, model and language rows.
+        start_date (pandas.Timestamp, optional): First day to include.
+        end_date (pandas.Timestamp, optional): Last day to include.
+        page_number (int): 1-based page to return.
+        page_size (int): Rows per page.
+        filters (dict, optional): Allowed values, or a (low, high) range, per column.
+        sort_by (str, optional): Column to sort by.
+        ascending (bool): Sort direction.
+        scope (str, optional): Org, team or enterprise partition to read.
+
+    Returns:
+        tuple: The page as a pandas.DataFrame and the number of matching rows,
+        or (None, 0) if the table is not stored.
+    """
+    loader = MetricsDataLoader(data_dir="./data", scope=scope)
+    df = loader.load_table(table, start_date, end_date)
+    if df is None:
+        return None, 0
+    return page(df, page_number, page_size, filters, sort_by, ascending)
+
+def export_table(table="metrics", start_date=None, end_date=None, fmt="csv", filters=None,
+                 sort_by=None, ascending=True, scope=None):
+    """
+    Stream a filtered and sorted table as CSV or Parquet.
+
+    Takes the same selection as `load_table_page`, without paging.
+
+    Returns:
+        iterator: Consecutive bytes of the exported file, empty if the table is not stored.
+    """
+    loader = MetricsDataLoader(data_dir="./data", scope=scope)
+    df = loader.load_table(table, start_date, end_date)
+    if df is None:
+        return iter(())
+    return iter_export(query(df, filters, sort_by, ascending), fmt)
+
+def load_idle_seats(idle_days=30, scope=None):
+    """
+    Return the Copilot seats without activity in the last `idle_days` days.
+
+    Args:
+        idle_days (int): Days without activity after which a seat counts as idle.
+        scope (str, optional): Org or enterprise partition to read.
+
+    Returns:
+        tuple: The idle seats as a pandas.DataFrame, least recently active first and
+        never active last, and the total number of seats; or (None, 0) if no seats are stored.
+    """
+    # The seats module pulls in the GitHub download stack, so it is imported on first use
+    from seats import idle_seats, load_current_seats
+    seats = load_current_seats("./data", scope)
+    if seats is None:
+        return None, 0
+    since = pd.Timestamp.now(tz="UTC").normalize() - pd.Timedelta(days=idle_days)
+    return idle_seats(seats, since), len(seats)
+
+def run_sql(sql, max_rows=None):
+    """
+    Run a read-only SQL query over the stored `metrics` and `breakdown` of every scope.
+
+    Results are cached by query text and dataset version. Needs DuckDB.
+
+    Args:
+        sql (str): A single SELECT statement.
+        max_rows (int, optional): Rows returned at most. Defaults to `sql_engine.SQL_MAX_ROWS`.
+
+    Returns:
+        tuple: The result as a pandas.DataFrame and whether it was truncated.
+    """
+    from sql_engine import SQL_MAX_ROWS, get_engine
+    return get_engine("./data").query(sql, max_rows or SQL_MAX_ROWS)
+
+def describe_sql_tables():
+    """Return the columns of each table that `run_sql` can query"""
+    from sql_engine import get_engine
+    return get_engine("./data").describe()
+
+def load_rollup(granularity, start_date=None, end_date=None, scope=None):
+    """
+    Load a precomputed rollup limited to the periods overlapping a date range.
+
+    Args:
+        granularity (str): One of "weekly", "monthly" or "quarterly".
+        start_date (pandas.Timestamp, optional): First day of the range.
+        end_date (pandas.Timestamp, optional): Last day of the range.
+        scope (str, optional): Org, team or enterprise partition to read.
+
+    Returns:
+        pandas.DataFrame: One row per period labelled by its last day, or None if no data is stored.
+    """
+    loader = MetricsDataLoader(data_dir="./data", scope=scope)
+    df = loader.load_rollup(granularity)
+    if df is None:
+        return None
+    if start_date is not None:
+        df = df[df['date'] >= start_date]
+    if end_date is not None:
+        _, period_freq = GRANULARITIES[granularity]
+        df = df[df['date'].dt.to_period(period_freq).dt.start_time <= end_date]
+    return df.reset_index(drop=True)
+
+def load_timeseries(granularity="daily", start_date=None, end_date=None, scope=None):
+    """
+    Load the daily totals and derived metrics per day or per period.
+
+    Args:
+        granularity (str): "daily", "weekly", "monthly" or "quarterly".
+        start_date (pandas.Timestamp, optional): First day of the range.
+        end_date (pandas.Timestamp, optional): Last day of the range.
+        scope (str, optional): Org, team or enterprise partition to read.
+
+    Returns:
+        pandas.DataFrame: One row per day or period with the same columns at
+        every granularity, or None if no data is stored.
+    """
+    if granularity != "daily":
+        return load_rollup(granularity, start_date, end_date, scope)
+    df = load_data(scope)
+    if df is None:
+        return None
+    return filter_date_range(df, start_date, end_date)
+
+def key_statistics(df):
+    """
+    Summarize a filtered metrics DataFrame into the dashboard's key statistics.
+
+    Args:
+        df (pandas.DataFrame): Frame returned by `filter_date_range`.
+
+    Returns:
+        dict: Total suggestions, average daily active users, total lines accepted,
+        and every metric of `DAILY_METRICS` over the whole range, None where undefined.
+        Rates and per-user averages are taken over the summed days, so per-user
+        values are per user and day.
+    """
+    counts = [c for c in COLUMN_NAMES.values() if c != 'date']
+    return _statistics(df[counts].sum(), len(df))
+
+def _statistics(totals, days):
+    """Key statistics from per-column totals over `days` days"""
+    totals = derive(pd.DataFrame([totals])).iloc[0]
+    stats = {
+        'suggestions': int(totals['suggestions']),
+        'active_users': int(totals['active_users'] / days) if days else 0,
+        'lines_accepted': int(totals['lines_accepted']),
+    }
+    stats.update({name: metric.value(totals[name]) for name, metric in DAILY_METRICS.items()})
+    return stats
+
+def load_summary(scope=None):
+    """
+    Return the key statistics of the whole history without loading any partition.
+
+    The summary is precomputed at ingest time, so the dashboard can show it
+    while the full frame is still loading.
+
+    Args:
+        scope (str, optional): Org, team or enterprise partition to read.
+
+    Returns:
+        dict: The `first_day` and `latest_day` stored and the `statistics`
+        returned by `key_statistics` for that range, or None if no up-to-date
+        summary is stored.
+    """
+    loader = MetricsDataLoader(data_dir="./data", scope=scope)
+    summary = loader.load_summary()
+    if summary is None:
+        return None
+    return {
+        'first_day': summary['first_day'],
+        'latest_day': summary['latest_day'],
+        'statistics': _statistics(pd.Series(summary['totals']), summary['days']),
+    }
+
+def load_anomalies(dimension="daily", start_date=None, end_date=None, scope=None):
+    """
+    Load the baseline, trend, week-over-week delta and z-score of every series of a dimension.
+
+    Args:
+        dimension (str): "daily" for the daily totals, or "editor", "model" or "language".
+        start_date (pandas.Timestamp, optional): First day to include.
+        end_date (pandas.Timestamp, optional): Last day to include.
+        scope (str, optional): Org, team or enterprise partition to read.
+
+    Returns:
+        pandas.DataFrame: One row per day and series, with the editor, model or
+        language in `group` and the metric name in `metric`, or None if nothing
+        has been analyzed yet.
+    """
+    df = read_anomalies("./data", scope, dimension)
+    if df is None:
+        return None
+    if start_date is not None:
+        df = df[df['day'] >= start_date]
+    if end_date is not None:
+        df = df[df['day'] <= end_date]
+    return df.reset_index(drop=True)
+
+def load_alerts(start_date=None, end_date=None, scope=None, dimensions=DIMENSIONS):
+    """
+    List the days flagged as unusual in a date range.
+
+    Args:
+        start_date (pandas.Timestamp, optional): First day to include.
+        end_date (pandas.Timestamp, optional): Last day to include.
+        scope (str, optional): Org, team or enterprise partition to read.
+        dimensions (list, optional): "daily" and the breakdown dimensions to include.
+
+    Returns:
+        pandas.DataFrame: One row per flagged day and series with its `dimension`,
+        `group`, `metric`, `value`, `baseline`, `change` (%) and `zscore`,
+        most recent first, or None if nothing has been analyzed yet.
+    """
+    tables = []
+    for dimension in dimensions:
+        df = read_anomalies("./data", scope, dimension)
+        if df is not None:
+            tables.append(alerts(df, start_date, end_date).assign(dimension=dimension))
+    if not tables:
+        return None
+    df = pd.concat(tables, ignore_index=True).sort_values('day', ascending=False, kind='stable')
+    return df[['day', 'dimension'] + [c for c in df.columns if c not in ('day', 'dimension')]].reset_index(drop=True)
+
 def aggregate_weekly(df):
     """Aggregate data by week"""
     weekly_df = df.resample('W', on='date').agg({
@@ -20,5 +328,4 @@ def aggregate_weekly(df):
         'lines_accepted': 'sum',
         'active_users': 'mean'
     }).reset_index()
-    weekly_df['acceptance_rate'] = (weekly_df['lines_accepted'] / weekly_df['suggestions'] * 100).round()
-    return weekly_df
+    return derive(weekly_df, names=['acceptance_rate'])
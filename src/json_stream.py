@@ -0,0 +1,93 @@
+"""
+This module provides incremental decoding of top-level JSON arrays.
+"""
+
+from itertools import chain
+from typing import Any, Iterable, Iterator
+import codecs
+import json
+
+_WHITESPACE = " \t\n\r"
+
+# What the decoder expects next: the array, its first element or its end, an
+# element after a comma, or a comma or the end after an element
+_ARRAY, _FIRST, _ELEMENT, _SEPARATOR = range(4)
+
+
+def iter_json_array(chunks: Iterable[bytes]) -> Iterator[Any]:
+    """
+    Yield the elements of a JSON array as its bytes arrive.
+
+    Only the element currently being decoded is buffered, so memory is bounded
+    by the largest element rather than the whole document. A failed decode of
+    an incomplete element is retried once the buffer has doubled, which keeps
+    the total decoding work linear in the input size.
+
+    Args:
+        chunks (Iterable[bytes]): UTF-8 encoded pieces of the document, e.g.
+            from `requests.Response.iter_content`.
+
+    Yields:
+        Any: Each decoded array element, in order.
+
+    Raises:
+        ValueError: If the document is not a well-formed JSON array.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    expect = _ARRAY
+    retry_at = 0
+
+    for chunk in chain(chunks, [None]):
+        final = chunk is None
+        buffer += text_decoder.decode(b"" if final else chunk, final=final)
+        pos = 0
+
+        while True:
+            while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                pos += 1
+            if pos >= len(buffer):
+                break
+
+            char = buffer[pos]
+            if expect == _ARRAY:
+                if char != "[":
+                    raise ValueError("Expected a JSON array")
+                expect = _FIRST
+                pos += 1
+                continue
+            if char == "]" and expect != _ELEMENT:
+                return
+            if expect == _SEPARATOR:
+                if char != ",":
+                    raise ValueError("Expected ',' or ']' after an array element")
+                expect = _ELEMENT
+                pos += 1
+                continue
+            if char in ",]":
+                raise ValueError("Expected an array element")
+
+            if not final and len(buffer) < retry_at:
+                break
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if final:
+                    raise
+                retry_at = pos + 2 * (len(buffer) - pos)
+                break
+            # A value running up to the end of the buffer may still be growing
+            if end == len(buffer) and not final:
+                retry_at = len(buffer) + 1
+                break
+
+            yield value
+            pos = end
+            expect = _SEPARATOR
+            retry_at = 0
+
+        buffer = buffer[pos:]
+        retry_at = max(retry_at - pos, 0)
+
+    raise ValueError("Unterminated JSON array")
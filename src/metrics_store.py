@@ -0,0 +1,547 @@
+"""
+This module provides a partitioned Parquet store for daily metrics.
+"""
+
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pyarrow import fs
+
+from reader import MetricsReader
+from telemetry import setup_logging
+
+METRIC_COLUMNS = [
+    "total_suggestions_count",
+    "total_acceptances_count",
+    "total_lines_suggested",
+    "total_lines_accepted",
+    "total_active_users",
+    "total_chat_acceptances",
+    "total_chat_turns",
+    "total_active_chat_users",
+]
+
+SCHEMA = pa.schema(
+    [pa.field("day", pa.timestamp("ns"))]
+    + [pa.field(name, pa.int64()) for name in METRIC_COLUMNS]
+)
+
+DIMENSION_COLUMNS = ["editor", "model", "language"]
+
+BREAKDOWN_METRIC_COLUMNS = [
+    "code_suggestions",
+    "code_acceptances",
+    "code_lines_suggested",
+    "code_lines_accepted",
+    "code_engaged_users",
+    "chat_turns",
+    "chat_acceptances",
+    "chat_engaged_users",
+]
+
+# Long-format fact table, one row per day x editor x model x language.
+# Chat rows have no language and carry an empty string instead.
+BREAKDOWN_SCHEMA = pa.schema(
+    [pa.field("day", pa.timestamp("ns"))]
+    + [pa.field(name, pa.dictionary(pa.int32(), pa.string())) for name in DIMENSION_COLUMNS]
+    + [pa.field(name, pa.int64()) for name in BREAKDOWN_METRIC_COLUMNS]
+)
+
+TABLE_SCHEMAS = {
+    "metrics": SCHEMA,
+    "breakdown": BREAKDOWN_SCHEMA,
+}
+
+# Daily partitions, and the monthly and yearly archives `compaction` merges them into.
+# Archive names end in a checksum prefix so a rewrite never overwrites a listed file.
+PARTITION_PATTERN = re.compile(
+    r'(?:data_\d{4}-\d{2}-\d{2}|month_\d{4}-\d{2}_[0-9a-f]{8}|year_\d{4}_[0-9a-f]{8})\.parquet'
+)
+
+
+class MetricsStore:
+    """
+    Stores daily metrics as a partitioned Parquet dataset.
+
+    Each call to `write_partition` produces one `data_YYYY-MM-DD.parquet` file
+    named after the last day it contains, mirroring the legacy JSON layout,
+    and records it in the store's `manifest.json`. Older days are later merged
+    into `month_*` and `year_*` archive files by `compaction`.
+    """
+    def __init__(self, data_dir: str = "data", table: str = "metrics", scope: Optional[str] = None):
+        """
+        Initialize the store for `table` rooted at `<data_dir>/<table>`.
+
+        Named scopes (an org, team or enterprise) keep their partitions in a
+        `<scope>` subdirectory; the default scope uses the table root.
+        """
+        self.data_dir = Path(data_dir)
+        self.table = table
+        self.scope = scope
+        self.schema = TABLE_SCHEMAS[table]
+        self.store_dir = self.data_dir / table
+        if scope:
+            self.store_dir = self.store_dir / scope
+        self.manifest_path = self.store_dir / "manifest.json"
+        setup_logging()
+
+    def partition_files(self) -> List[Path]:
+        """
+        Return the partitions recorded in the manifest, sorted by the day in their name.
+
+        Files that were renamed into place but never recorded, e.g. because
+        of a crash, are ignored until the same days are ingested again.
+        """
+        if not self.store_dir.exists():
+            return []
+        return [self.store_dir / name for name in sorted(self.manifest()["partitions"])]
+
+    def _glob_partitions(self) -> List[Path]:
+        """Return every partition file on disk"""
+        return sorted(
+            f for f in self.store_dir.glob("*.parquet")
+            if PARTITION_PATTERN.fullmatch(f.name)
+        )
+
+    def partitions_in_range(
+        self,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+    ) -> List[Path]:
+        """
+        Return only the partitions whose day span overlaps the range.
+
+        Spans come from the manifest, so no partition file is opened.
+        """
+        start = None if start_date is None else pd.Timestamp(start_date).strftime("%Y-%m-%d")
+        end = None if end_date is None else pd.Timestamp(end_date).strftime("%Y-%m-%d")
+        partitions = self.manifest()["partitions"]
+        return [
+            self.store_dir / name
+            for name, entry in sorted(partitions.items())
+            if (start is None or entry["max_day"] >= start) and (end is None or entry["min_day"] <= end)
+        ]
+
+    def range(
+        self,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        columns: Optional[List[str]] = None,
+    ) -> Optional[pd.DataFrame]:
+        """
+        Read the days within a range, opening only the partitions that overlap it.
+
+        Args:
+            start_date (Optional[datetime]): First day to read.
+            end_date (Optional[datetime]): Last day to read.
+            columns (Optional[List[str]]): Columns to read. Defaults to all columns.
+
+        Returns:
+            Optional[pd.DataFrame]: The matching days sorted by day, or None if no partition overlaps the range.
+        """
+        files = self.partitions_in_range(start_date, end_date)
+        if not files:
+            return None
+        return read_partitions(files, columns, self.schema, start_date, end_date)
+
+    def manifest(self) -> Dict:
+        """
+        Return the store manifest, building it from the partitions if it is missing.
+
+        The manifest records the first and latest ingested day, the days known
+        to be missing in between, and the day span, row count and SHA-256
+        checksum of every partition.
+        """
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            pass
+        except ValueError as e:
+            logging.error(f"Rebuilding unreadable manifest {self.manifest_path}: {str(e)}")
+
+        manifest = _empty_manifest()
+        files = self._glob_partitions() if self.store_dir.exists() else []
+        if not files:
+            return manifest
+        all_days = set()
+        for f in files:
+            try:
+                days = pd.DatetimeIndex(pq.read_table(f, columns=["day"], memory_map=True)["day"].to_pandas()).unique()
+            except Exception as e:
+                logging.error(f"Skipping unreadable partition {f.name}: {str(e)}")
+                f.replace(f.with_suffix(".corrupt"))
+                continue
+            all_days.update(days.strftime("%Y-%m-%d"))
+            manifest["partitions"][f.name] = _partition_entry(days, pq.read_metadata(f).num_rows, _checksum(f))
+        if all_days:
+            expected = pd.date_range(min(all_days), max(all_days)).strftime("%Y-%m-%d")
+            manifest["first_day"] = min(all_days)
+            manifest["latest_day"] = max(all_days)
+            manifest["gaps"] = sorted(set(expected) - all_days)
+        self._save_manifest(manifest)
+        logging.info(f"Built manifest for {len(files)} partitions in {self.store_dir}")
+        return manifest
+
+    def _save_manifest(self, manifest: Dict) -> None:
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+        atomic_replace(tmp_path, self.manifest_path)
+
+    def latest_day(self) -> Optional[datetime]:
+        """
+        Return the latest day stored, or None if the store is empty.
+        """
+        latest_day = self.manifest()["latest_day"]
+        return datetime.strptime(latest_day, "%Y-%m-%d") if latest_day else None
+
+    def gaps(self) -> List[datetime]:
+        """
+        Return the days missing between the first and the latest stored day.
+        """
+        return [datetime.strptime(day, "%Y-%m-%d") for day in self.manifest()["gaps"]]
+
+    def new_days_mask(self, days: pd.Series) -> pd.Series:
+        """
+        Flag the days that are not stored yet.
+
+        A day is new if it is after the latest stored day, before the first
+        one, or one of the recorded gaps, so re-downloaded windows backfill
+        missing days instead of only appending. Days before the retention
+        cutoff are never new, as compaction would only drop them again.
+        """
+        manifest = self.manifest()
+        if manifest["latest_day"] is None:
+            new = pd.Series(True, index=days.index)
+        else:
+            new = (
+                (days > pd.Timestamp(manifest["latest_day"]))
+                | (days < pd.Timestamp(manifest["first_day"]))
+                | days.dt.strftime("%Y-%m-%d").isin(manifest["gaps"])
+            )
+        if manifest.get("retained_from"):
+            new &= days >= pd.Timestamp(manifest["retained_from"])
+        return new
+
+    def write_partition(self, df: pd.DataFrame) -> Optional[Path]:
+        """
+        Write a frame of daily metrics as a new partition and record it in the manifest.
+
+        The file is written to a temporary name, fsynced and renamed into
+        place before the manifest is updated the same way, so a crash never
+        leaves a truncated partition or a manifest pointing at one.
+
+        Args:
+            df (pd.DataFrame): Frame with a `day` column and the metric columns.
+
+        Returns:
+            Optional[Path]: The path of the written partition, or None if `df` is empty.
+        """
+        if df.empty:
+            return None
+        table = to_table(df, self.schema)
+        days = pd.DatetimeIndex(df["day"]).normalize().unique()
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        output_path = self.store_dir / f"data_{days.max().strftime('%Y-%m-%d')}.parquet"
+        tmp_path = output_path.with_suffix(".tmp")
+        pq.write_table(table, tmp_path, compression="zstd")
+        checksum = _checksum(tmp_path)
+        atomic_replace(tmp_path, output_path)
+
+        manifest = self.manifest()
+        day_names = set(days.strftime("%Y-%m-%d"))
+        gaps = set(manifest["gaps"]) - day_names
+        latest_day = manifest["latest_day"]
+        if latest_day:
+            # Days skipped between the previous latest day and the new ones
+            expected = pd.date_range(pd.Timestamp(latest_day) + pd.Timedelta(days=1), days.max())
+            gaps |= set(expected.strftime("%Y-%m-%d")) - day_names
+        manifest["partitions"][output_path.name] = _partition_entry(days, table.num_rows, checksum)
+        manifest["first_day"] = min(filter(None, [manifest["first_day"], min(day_names)]))
+        manifest["latest_day"] = max(filter(None, [latest_day, max(day_names)]))
+        manifest["gaps"] = sorted(gaps)
+        self._save_manifest(manifest)
+
+        logging.info(f"Saved {table.num_rows} metrics to {output_path.name}")
+        return output_path
+
+    def verify(self) -> List[Path]:
+        """
+        Check every partition against the checksum recorded in the manifest.
+
+        Corrupt or missing partitions are dropped from the manifest, corrupt
+        files are renamed to `*.corrupt` so readers skip them, and their days
+        are recorded as gaps so the next download backfills them if they are
+        still within the API window.
+
+        Returns:
+            List[Path]: The partitions that failed verification.
+        """
+        manifest = self.manifest()
+        bad = []
+        for name, entry in sorted(manifest["partitions"].items()):
+            path = self.store_dir / name
+            if not path.exists() or _checksum(path) != entry["sha256"]:
+                bad.append(path)
+        if bad:
+            gaps = set(manifest["gaps"])
+            for path in bad:
+                entry = manifest["partitions"].pop(path.name)
+                gaps |= set(pd.date_range(entry["min_day"], entry["max_day"]).strftime("%Y-%m-%d"))
+                if path.exists():
+                    path.replace(path.with_suffix(".corrupt"))
+                logging.error(f"Partition {path.name} is missing or corrupt")
+            manifest["gaps"] = sorted(gaps)
+            self._save_manifest(manifest)
+        return bad
+
+    def write_archive(self, df: pd.DataFrame, prefix: str) -> Tuple[Path, Dict]:
+        """
+        Write a frame as an archive file without recording it in the manifest.
+
+        The file is named `<prefix>_<checksum>.parquet`, so it never replaces
+        a partition the manifest still points at. Record it with `replace_partitions`.
+
+        Args:
+            df (pd.DataFrame): Frame with a `day` column and the table's columns.
+            prefix (str): Name prefix such as `month_2024-03` or `year_2023`.
+
+        Returns:
+            Tuple[Path, Dict]: The written file and its manifest entry.
+        """
+        table = to_table(df, self.schema)
+        days = pd.DatetimeIndex(df["day"]).normalize().unique()
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.store_dir / f"{prefix}.tmp"
+        pq.write_table(table, tmp_path, compression="zstd")
+        checksum = _checksum(tmp_path)
+        output_path = self.store_dir / f"{prefix}_{checksum[:8]}.parquet"
+        atomic_replace(tmp_path, output_path)
+        return output_path, _partition_entry(days, table.num_rows, checksum)
+
+    def replace_partitions(self, removed: List[str], added: Dict[str, Dict],
+                           retained_from: Optional[str] = None) -> None:
+        """
+        Swap partitions in the manifest, then delete the files that were removed.
+
+        The manifest is replaced atomically, so readers see either the old or
+        the new set of files; a crash before the deletes only leaves unlisted
+        files behind. Removing days without adding them back, as retention
+        does, moves the first stored day forward.
+
+        Args:
+            removed (List[str]): Names of listed partitions to drop.
+            added (Dict[str, Dict]): Manifest entries of files written with `write_archive`.
+            retained_from (Optional[str]): Retention cutoff as YYYY-MM-DD. It is
+                recorded so that `new_days_mask` and `migrate_json` never store
+                earlier days again.
+        """
+        manifest = self.manifest()
+        for name in removed:
+            manifest["partitions"].pop(name, None)
+        manifest["partitions"].update(added)
+        if retained_from:
+            manifest["retained_from"] = max(retained_from, manifest.get("retained_from") or "")
+            manifest["gaps"] = [day for day in manifest["gaps"] if day >= manifest["retained_from"]]
+        if manifest["partitions"]:
+            first_day = min(entry["min_day"] for entry in manifest["partitions"].values())
+            manifest["first_day"] = first_day
+            manifest["gaps"] = [day for day in manifest["gaps"] if day > first_day]
+        else:
+            manifest.update(_empty_manifest())
+        self._save_manifest(manifest)
+
+        for name in removed:
+            path = self.store_dir / name
+            if path.exists() and name not in added:
+                path.unlink()
+
+    def read(
+        self,
+        columns: Optional[List[str]] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+    ) -> Optional[pd.DataFrame]:
+        """
+        Read all partitions into a single DataFrame.
+
+        Files are memory-mapped and decoded column by column, so no per-row
+        Python objects are created.
+
+        Args:
+            columns (Optional[List[str]]): Columns to read. Defaults to all columns.
+            start_date (Optional[datetime]): First day to read.
+            end_date (Optional[datetime]): Last day to read.
+
+        Returns:
+            Optional[pd.DataFrame]: The stored metrics sorted by day, or None if the store is empty.
+        """
+        return self.range(start_date, end_date, columns)
+
+    def migrate_json(self) -> int:
+        """
+        Convert legacy `data_YYYY-MM-DD.json` files into Parquet partitions.
+
+        A file is skipped once its last day, which it is named after, is
+        stored or older than the retention cutoff, so the migration can safely
+        be run more than once and does not re-read files after compaction.
+
+        Returns:
+            int: The number of partitions written.
+        """
+        if self.table != "metrics" or self.scope:
+            return 0
+        json_files = sorted(self.data_dir.glob("data_*.json"))
+        if not json_files:
+            return 0
+        last_days = pd.Series(pd.to_datetime([f.stem[len("data_"):] for f in json_files], errors="coerce"))
+        # A file whose name is not a day is read to find out
+        pending = self.new_days_mask(last_days) | last_days.isna()
+        reader = MetricsReader(self.data_dir)
+        written = 0
+        for json_file in [f for f, new in zip(json_files, pending) if new]:
+            batch = reader.read_metrics_batch(json_file.name)
+            if not batch:
+                continue
+            # Days already merged into an archive have no daily partition left
+            frame = batch.to_frame()
+            frame = frame[self.new_days_mask(frame["day"])]
+            if frame.empty:
+                continue
+            self.write_partition(frame)
+            written += 1
+        if written:
+            logging.info(f"Migrated {written} JSON files to {self.store_dir}")
+        return written
+
+
+def _empty_manifest() -> Dict:
+    return {"first_day": None, "latest_day": None, "gaps": [], "partitions": {}}
+
+
+def _partition_entry(days: pd.DatetimeIndex, rows: int, checksum: str) -> Dict:
+    return {
+        "min_day": days.min().strftime("%Y-%m-%d"),
+        "max_day": days.max().strftime("%Y-%m-%d"),
+        "rows": int(rows),
+        "sha256": checksum,
+    }
+
+
+def _checksum(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def atomic_replace(tmp_path: Path, target: Path) -> None:
+    """
+    Durably move a fully written temporary file over `target`.
+
+    The file is fsynced before the rename and the directory after it, so
+    readers see either the old or the new content, even after a crash.
+    """
+    with open(tmp_path, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp_path, target)
+    if hasattr(os, "O_DIRECTORY"):
+        dir_fd = os.open(target.parent, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def to_table(df: pd.DataFrame, schema: pa.Schema = SCHEMA) -> pa.Table:
+    """
+    Convert a metrics frame to an Arrow table with the given store schema.
+    """
+    df = df.assign(day=pd.to_datetime(df["day"]))
+    return pa.Table.from_pandas(df[schema.names], schema=schema, preserve_index=False)
+
+
+def read_partitions(
+    files: List[Path],
+    columns: Optional[List[str]] = None,
+    schema: pa.Schema = SCHEMA,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+) -> pd.DataFrame:
+    """
+    Read the given partition files into a DataFrame sorted by day.
+
+    Day bounds are pushed down to the Parquet row group statistics, so row
+    groups entirely outside the range are not decoded.
+    """
+    day_filter = None
+    if start_date is not None:
+        day_filter = ds.field("day") >= pd.Timestamp(start_date)
+    if end_date is not None:
+        end_filter = ds.field("day") <= pd.Timestamp(end_date)
+        day_filter = end_filter if day_filter is None else day_filter & end_filter
+
+    dataset = ds.dataset(
+        [str(f) for f in files],
+        schema=schema,
+        format="parquet",
+        filesystem=fs.LocalFileSystem(use_mmap=True),
+    )
+    df = dataset.to_table(columns=columns, filter=day_filter).to_pandas()
+    if "day" in df.columns:
+        df = df.sort_values("day", kind="stable", ignore_index=True)
+    return df
+
+
+def list_scopes(data_dir: str = "data", table: str = "metrics") -> List[Optional[str]]:
+    """
+    Return the scopes that have stored partitions, with None for the default scope.
+    """
+    root = Path(data_dir) / table
+    if not root.exists():
+        return []
+    scopes: List[Optional[str]] = []
+    if _has_partitions(root):
+        scopes.append(None)
+    scopes.extend(d.name for d in sorted(root.iterdir()) if d.is_dir() and _has_partitions(d))
+    return scopes
+
+
+def _has_partitions(directory: Path) -> bool:
+    return any(PARTITION_PATTERN.fullmatch(f.name) for f in directory.glob("*.parquet"))
+
+
+def breakdown_file_for(metrics_file: Path) -> Path:
+    """
+    Return the path of the breakdown file written next to a downloaded metrics file.
+    """
+    metrics_file = Path(metrics_file)
+    return metrics_file.with_name(f"{metrics_file.stem}.breakdown.parquet")
+
+
+if __name__ == "__main__":
+    store = MetricsStore()
+    if sys.argv[1:] == ["--verify"]:
+        bad = store.verify()
+        if bad:
+            # The dropped days leave the summary stale; imported here as rollups builds on this module
+            from rollups import RollupStore
+            RollupStore(str(store.data_dir)).update_summary(store)
+        print(f"{len(bad)} corrupt or missing partitions in {store.store_dir}")
+    else:
+        count = store.migrate_json()
+        print(f"Migrated {count} JSON files to {store.store_dir}")
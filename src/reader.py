@@ -3,12 +3,17 @@ This module provides functionality to read and parse daily metrics from JSON fil
 """
 
 from pathlib import Path
-from typing import Dict, List, Optional
-from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Sequence, Union
+from dataclasses import dataclass, fields
 from datetime import datetime
 import json
 import logging
 
+import numpy as np
+import pandas as pd
+
+from telemetry import increment, setup_logging, span
+
 @dataclass
 class DailyMetrics:
     """
@@ -24,6 +29,72 @@ class DailyMetrics:
     total_chat_turns: int
     total_active_chat_users: int
 
+# Numeric fields of DailyMetrics, stored as one int64 array each in a MetricsBatch
+BATCH_COLUMNS = [f.name for f in fields(DailyMetrics) if f.name != "day"]
+
+class MetricsBatch(Sequence):
+    """
+    Stores many days of metrics as one NumPy array per field.
+
+    Indexing or iterating builds DailyMetrics objects on demand, so callers
+    that want objects can still have them without every row being boxed up
+    front.
+    """
+    __slots__ = ("day", "columns")
+
+    def __init__(self, day: np.ndarray, columns: Dict[str, np.ndarray]):
+        """
+        Initialize the batch from a datetime64[ns] `day` array and int64 arrays per field.
+        """
+        self.day = day
+        self.columns = columns
+
+    @classmethod
+    def from_records(cls, records: List[Dict]) -> "MetricsBatch":
+        """
+        Build a batch from decoded JSON records.
+
+        Dates are parsed in one vectorized call and each field is copied
+        straight into a typed array.
+
+        Args:
+            records (List[Dict]): Records with a `YYYY-MM-DD` day and the DailyMetrics fields.
+
+        Returns:
+            MetricsBatch: The columnar batch.
+        """
+        count = len(records)
+        day = np.array([r["day"] for r in records], dtype="datetime64[D]").astype("datetime64[ns]")
+        columns = {
+            name: np.fromiter((r[name] for r in records), dtype=np.int64, count=count)
+            for name in BATCH_COLUMNS
+        }
+        return cls(day, columns)
+
+    def __len__(self) -> int:
+        return len(self.day)
+
+    def __getitem__(self, index: Union[int, slice, np.ndarray]) -> Union[DailyMetrics, "MetricsBatch"]:
+        """
+        Return one day as DailyMetrics, or a sub-batch for a slice or boolean mask.
+        """
+        if isinstance(index, (int, np.integer)):
+            return DailyMetrics(
+                day=pd.Timestamp(self.day[index]).to_pydatetime(),
+                **{name: int(values[index]) for name, values in self.columns.items()}
+            )
+        return MetricsBatch(self.day[index], {name: values[index] for name, values in self.columns.items()})
+
+    def __iter__(self) -> Iterator[DailyMetrics]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Return the batch as a DataFrame with a datetime64 `day` column, without copying per row.
+        """
+        return pd.DataFrame({"day": self.day, **self.columns})
+
 class MetricsReader:
     """
     Reads and parses metrics from JSON files.
@@ -33,60 +104,59 @@ class MetricsReader:
         Initialize the MetricsReader with the directory containing data files.
         """
         self.data_dir = Path(data_dir)
-        self._setup_logging()
+        setup_logging()
 
-    def _setup_logging(self):
-        """
-        Setup logging configuration.
+    def read_metrics_batch(self, filename: str) -> Optional[MetricsBatch]:
         """
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s'
-        )
-
-    def read_metrics_file(self, filename: str) -> Optional[List[DailyMetrics]]:
-        """
-        Read and parse a metrics file.
+        Read and parse a metrics file into a columnar batch.
 
         Args:
             filename (str): The name of the file to read.
 
         Returns:
-            Optional[List[DailyMetrics]]: A list of DailyMetrics objects or None if an error occurs.
+            Optional[MetricsBatch]: The parsed batch or None if an error occurs.
         """
         try:
             file_path = self.data_dir / filename
-            with open(file_path) as f:
-                data = json.load(f)
-            
-            return [self._parse_daily_metrics(item) for item in data]
+            with span("read_metrics"):
+                with open(file_path, "rb") as f:
+                    raw = f.read()
+                data = json.loads(raw)
+                batch = MetricsBatch.from_records(data)
+            increment("bytes_read", len(raw))
+            increment("rows_parsed", len(batch))
+            return batch
         except Exception as e:
             logging.error(f"Error reading metrics file {filename}: {str(e)}")
             return None
 
-    def _parse_daily_metrics(self, data: Dict) -> DailyMetrics:
+    def read_metrics_file(self, filename: str) -> Optional[MetricsBatch]:
         """
-        Parse a dictionary into a DailyMetrics object.
+        Read and parse a metrics file.
 
         Args:
-            data (Dict): The dictionary containing daily metrics data.
+            filename (str): The name of the file to read.
 
         Returns:
-            DailyMetrics: The parsed DailyMetrics object.
-        """
-        return DailyMetrics(
-            day=datetime.strptime(data["day"], "%Y-%m-%d"),
-            total_suggestions_count=data["total_suggestions_count"],
-            total_acceptances_count=data["total_acceptances_count"],
-            total_lines_suggested=data["total_lines_suggested"],
-            total_lines_accepted=data["total_lines_accepted"],
-            total_active_users=data["total_active_users"],
-            total_chat_acceptances=data["total_chat_acceptances"],
-            total_chat_turns=data["total_chat_turns"],
-            total_active_chat_users=data["total_active_chat_users"]
-        )
-
-    def get_metrics_from_file(self, filename: str) -> Optional[List[DailyMetrics]]:
+            Optional[MetricsBatch]: A sequence of DailyMetrics objects, built lazily
+            from the columnar batch, or None if an error occurs.
+        """
+        return self.read_metrics_batch(filename)
+
+    def read_metrics_frame(self, filename: str) -> Optional[pd.DataFrame]:
+        """
+        Read a metrics file straight into a DataFrame.
+
+        Args:
+            filename (str): The name of the file to read.
+
+        Returns:
+            Optional[pd.DataFrame]: A frame with a datetime64 `day` column or None if an error occurs.
+        """
+        batch = self.read_metrics_batch(filename)
+        return batch.to_frame() if batch is not None else None
+
+    def get_metrics_from_file(self, filename: str) -> Optional[MetricsBatch]:
         """
         Get metrics from a specified file.
 
@@ -94,7 +164,7 @@ class MetricsReader:
             filename (str): The name of the file to read.
 
         Returns:
-            Optional[List[DailyMetrics]]: A list of DailyMetrics objects or None if an error occurs.
+            Optional[MetricsBatch]: A sequence of DailyMetrics objects or None if an error occurs.
         """
         try:
             return self.read_metrics_file(filename)
@@ -104,7 +174,7 @@ class MetricsReader:
 
 if __name__ == "__main__":
     reader = MetricsReader()
-    data_files = sorted(reader.data_dir.glob("*.json"))
+    data_files = sorted(reader.data_dir.glob("data_*.json"))
     if data_files:
         latest_file = data_files[0]
         metrics = reader.get_metrics_from_file(latest_file.name)
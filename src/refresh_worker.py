@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+This module keeps the data directory up to date outside of the Streamlit request path.
+
+Run it standalone with `python refresh_worker.py` (add `--once` for a single
+refresh, e.g. from cron), or start it as a daemon thread inside the app with
+`start_background_refresh`. A file lock guarantees that only one refresh runs
+at a time across all processes sharing the data directory.
+"""
+
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Optional
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from telemetry import export, setup_logging, span
+
+DATA_DIR = Path("data")
+LOCK_FILE = "refresh.lock"
+STATUS_FILE = "refresh_status.json"
+REFRESH_INTERVAL = int(os.getenv("REFRESH_INTERVAL_SECONDS", "43200"))
+RETRY_INTERVAL = 60
+# Wait after a refresh in which every scope failed, e.g. during a network outage
+FAILED_REFRESH_INTERVAL = int(os.getenv("REFRESH_FAILED_RETRY_SECONDS", "900"))
+
+
+class FileLock:
+    """
+    Advisory, non-blocking lock on a file, released when the holder exits.
+    """
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._file = None
+
+    def acquire(self) -> bool:
+        """
+        Try to take the lock.
+
+        Returns:
+            bool: True if the lock was taken, False if another process holds it.
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a+")
+        try:
+            if fcntl:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            self._file.close()
+            self._file = None
+            return False
+
+    def release(self) -> None:
+        """
+        Release the lock if it is held.
+        """
+        if self._file is None:
+            return
+        if fcntl:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        else:
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        self._file.close()
+        self._file = None
+
+
+def _read_status(data_dir: Path) -> Dict:
+    try:
+        with open(Path(data_dir) / STATUS_FILE) as f:
+            status = json.load(f)
+        return status if isinstance(status, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _status_time(status: Dict, key: str) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(status[key])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def last_refreshed_at(data_dir: Path = DATA_DIR) -> Optional[datetime]:
+    """
+    Return when the last refresh that downloaded any scope finished, or None if none has yet.
+    """
+    return _status_time(_read_status(data_dir), "last_refreshed_at")
+
+
+def _write_status(data_dir: Path, attempted_at: datetime, scopes: int, failed_scopes: int,
+                  compaction_error: Optional[str]) -> None:
+    """
+    Record the outcome of a refresh.
+
+    `last_refreshed_at` only moves when at least one scope was downloaded, so
+    the dashboard keeps showing the age of its data during an outage.
+    """
+    status = _read_status(data_dir)
+    status.update({
+        "last_attempt_at": attempted_at.isoformat(),
+        "scopes": scopes,
+        "failed_scopes": failed_scopes,
+        "compaction_error": compaction_error,
+    })
+    if not scopes or failed_scopes < scopes:
+        status["last_refreshed_at"] = attempted_at.isoformat()
+    status_file = Path(data_dir) / STATUS_FILE
+    tmp_file = status_file.with_suffix(".tmp")
+    with open(tmp_file, "w") as f:
+        json.dump(status, f, indent=2)
+    tmp_file.replace(status_file)
+
+
+def refresh(data_dir: Path = DATA_DIR) -> bool:
+    """
+    Download all configured scopes unless another refresh is already running.
+
+    Returns:
+        bool: True if this call performed the refresh.
+    """
+    logger = logging.getLogger('RefreshWorker')
+    lock = FileLock(Path(data_dir) / LOCK_FILE)
+    if not lock.acquire():
+        logger.info("Another refresh is already running, skipping")
+        return False
+    try:
+        # Imported here so that reading the refresh status does not load the download stack
+        from compaction import compact_all
+        from data_downloader import DOWNLOAD_FAILED, download_scopes
+        from github_metrics_downloader import configured_scopes
+
+        max_workers = int(os.getenv("GITHUB_MAX_WORKERS", "4"))
+        scopes = configured_scopes()
+        with span("refresh"):
+            results = download_scopes(scopes, max_workers)
+        # Merge aged daily partitions while still holding the lock. A failure is
+        # recorded with the download outcome instead of losing it.
+        compaction_error = None
+        try:
+            compact_all(str(data_dir))
+        except Exception as e:
+            compaction_error = str(e)
+            logger.error(f"Compaction failed: {compaction_error}")
+        failed_scopes = results.count(DOWNLOAD_FAILED)
+        _write_status(data_dir, datetime.now(timezone.utc), len(scopes), failed_scopes, compaction_error)
+        if scopes and failed_scopes == len(scopes):
+            logger.warning(f"Every scope failed, retrying in {FAILED_REFRESH_INTERVAL} seconds")
+        logger.info("Refresh finished")
+        return True
+    finally:
+        lock.release()
+        # Publish latencies for an external scraper when PERF_EXPORT_FILE is set
+        try:
+            export()
+        except OSError as e:
+            logger.error(f"Error exporting performance metrics: {str(e)}")
+
+
+def _seconds_until_due(data_dir: Path, interval: int) -> float:
+    status = _read_status(data_dir)
+    refreshed_at = _status_time(status, "last_refreshed_at")
+    attempted_at = _status_time(status, "last_attempt_at") or refreshed_at
+    if attempted_at is None:
+        return 0.0
+    if refreshed_at is None or attempted_at > refreshed_at:
+        # The last attempt failed for every scope; retry sooner than a full interval
+        interval = min(interval, FAILED_REFRESH_INTERVAL)
+    elapsed = (datetime.now(timezone.utc) - attempted_at).total_seconds()
+    return max(0.0, interval - elapsed)
+
+
+def run_forever(interval: int = REFRESH_INTERVAL, data_dir: Path = DATA_DIR,
+                stop_event: Optional[threading.Event] = None) -> None:
+    """
+    Refresh every `interval` seconds until `stop_event` is set.
+
+    Waits for the remainder of the interval when a recent refresh is recorded,
+    so restarting the app or the worker does not trigger an extra download.
+    After a refresh in which every scope failed, the next one is due after
+    `FAILED_REFRESH_INTERVAL` instead.
+    """
+    stop_event = stop_event or threading.Event()
+    logger = logging.getLogger('RefreshWorker')
+    while not stop_event.is_set():
+        wait = _seconds_until_due(data_dir, interval)
+        if wait > 0:
+            if stop_event.wait(wait):
+                break
+            continue
+        try:
+            refreshed = refresh(data_dir)
+        except Exception as e:
+            logger.error(f"Refresh failed: {str(e)}")
+            refreshed = False
+        if not refreshed:
+            # Another process holds the lock or the refresh failed; check again shortly
+            stop_event.wait(RETRY_INTERVAL)
+
+
+def start_background_refresh(interval: int = REFRESH_INTERVAL, data_dir: Path = DATA_DIR) -> threading.Thread:
+    """
+    Run `run_forever` in a daemon thread of the current process.
+    """
+    thread = threading.Thread(
+        target=run_forever, args=(interval, data_dir), name="RefreshWorker", daemon=True
+    )
+    thread.start()
+    return thread
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Keep Copilot metrics in data/ up to date.")
+    parser.add_argument("--once", action="store_true", help="refresh once and exit")
+    parser.add_argument("--interval", type=int, default=REFRESH_INTERVAL,
+                        help="seconds between refreshes (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    if args.once:
+        return 0 if refresh() else 1
+    run_forever(args.interval)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
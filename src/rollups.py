@@ -0,0 +1,217 @@
+"""
+This module maintains precomputed weekly, monthly and quarterly rollups of the daily metrics,
+and a summary of the whole history that the dashboard shows before loading anything else.
+"""
+
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+import hashlib
+import json
+import logging
+import os
+import threading
+
+import pandas as pd
+
+from metrics_store import METRIC_COLUMNS, MetricsStore, atomic_replace
+
+SUMMARY_FILE = "summary.json"
+
+# Resample rule and matching period frequency per granularity. Periods are
+# labelled by their last day, like `helper_functions.aggregate_weekly`.
+GRANULARITIES: Dict[str, tuple] = {
+    "weekly": ("W", "W"),
+    "monthly": ("ME", "M"),
+    "quarterly": ("QE", "Q"),
+}
+
+# User counts are averaged over the days of a period, everything else is summed
+MEAN_COLUMNS = ["total_active_users", "total_active_chat_users"]
+SUM_COLUMNS = [c for c in METRIC_COLUMNS if c not in MEAN_COLUMNS]
+
+
+def aggregate(daily: pd.DataFrame, granularity: str) -> pd.DataFrame:
+    """
+    Aggregate daily metrics into periods of the given granularity.
+
+    Args:
+        daily (pd.DataFrame): Frame with a `day` column and the stored metric columns.
+        granularity (str): One of `weekly`, `monthly` or `quarterly`.
+
+    Returns:
+        pd.DataFrame: One row per period labelled by its last day. Rates are
+        derived when the rollup is loaded, see `derived_metrics`.
+    """
+    rule, _ = GRANULARITIES[granularity]
+    agg = {c: "sum" for c in SUM_COLUMNS}
+    agg.update({c: "mean" for c in MEAN_COLUMNS})
+    return daily.resample(rule, on="day").agg(agg).reset_index()
+
+
+class RollupStore:
+    """
+    Stores one small Parquet file per granularity next to the daily partitions.
+    """
+    def __init__(self, data_dir: str = "data", scope: Optional[str] = None):
+        """
+        Initialize the rollups for `scope` rooted at `<data_dir>/rollups`.
+        """
+        self.rollup_dir = Path(data_dir) / "rollups"
+        if scope:
+            self.rollup_dir = self.rollup_dir / scope
+
+    def path(self, granularity: str) -> Path:
+        """
+        Return the file holding the rollup of `granularity`.
+        """
+        return self.rollup_dir / f"{granularity}.parquet"
+
+    def read(self, granularity: str) -> Optional[pd.DataFrame]:
+        """
+        Read a stored rollup, or None if it has not been built yet.
+        """
+        path = self.path(granularity)
+        if not path.exists():
+            return None
+        return pd.read_parquet(path)
+
+    def update(self, store: MetricsStore, since_day: Optional[pd.Timestamp] = None) -> None:
+        """
+        Recompute the periods touched by days appended from `since_day` on.
+
+        Only the trailing periods starting with the one containing `since_day`
+        are re-aggregated from the daily partitions; earlier periods are kept
+        as stored. Missing rollups, or a None `since_day`, rebuild everything.
+        """
+        missing = any(not self.path(g).exists() for g in GRANULARITIES)
+        if since_day is None or missing:
+            daily = store.read()
+            if daily is None:
+                return
+            for granularity in GRANULARITIES:
+                self._write(granularity, aggregate(daily, granularity))
+            logging.info(f"Rebuilt rollups in {self.rollup_dir}")
+            return
+
+        since_day = pd.Timestamp(since_day)
+        for granularity, (_, period_freq) in GRANULARITIES.items():
+            period = since_day.to_period(period_freq)
+            daily = store.read(start_date=period.start_time)
+            if daily is None or daily.empty:
+                continue
+            recomputed = aggregate(daily, granularity)
+            existing = self.read(granularity)
+            kept = existing[existing["day"] < recomputed["day"].min()]
+            rollup = pd.concat([kept, recomputed], ignore_index=True) if not kept.empty else recomputed
+            self._write(granularity, rollup)
+        logging.info(f"Updated rollups from {since_day.strftime('%Y-%m-%d')}")
+
+    def summary_path(self) -> Path:
+        """
+        Return the file holding the summary of the whole history.
+        """
+        return self.rollup_dir / SUMMARY_FILE
+
+    def read_summary(self, store: MetricsStore) -> Optional[Dict]:
+        """
+        Read the summary if it still describes the stored data.
+
+        Returns:
+            Optional[Dict]: The summary, or None if it is missing or days were
+            added to or dropped from the store since it was written.
+        """
+        try:
+            with open(self.summary_path()) as f:
+                summary = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if summary.get("stored_days") != _stored_days_key(store):
+            return None
+        return summary
+
+    def update_summary(
+        self,
+        store: MetricsStore,
+        previous: Optional[Dict] = None,
+        new_days: Optional[pd.DataFrame] = None,
+    ) -> None:
+        """
+        Record the totals of every metric over the whole history and count the stored days.
+
+        The summary records a key of the days stored when it was computed,
+        so `read_summary` ignores it once days were added or dropped.
+
+        Args:
+            store (MetricsStore): The daily metrics the summary describes.
+            previous (Optional[Dict]): Summary read before the store last changed.
+                The days added since, if any, are folded into it instead of
+                summing every stored day again.
+            new_days (Optional[pd.DataFrame]): Rows stored since `previous` was
+                written, none of them for a day it already counted.
+        """
+        signature = _stored_days_key(store)
+        if previous is None:
+            daily = store.read()
+            if daily is None or daily.empty:
+                return
+            summary = {
+                "first_day": daily["day"].min().strftime("%Y-%m-%d"),
+                "latest_day": daily["day"].max().strftime("%Y-%m-%d"),
+                "days": len(daily),
+                "totals": {c: int(daily[c].sum()) for c in METRIC_COLUMNS},
+            }
+        else:
+            summary = {key: previous[key] for key in ("first_day", "latest_day", "days", "totals")}
+            if new_days is not None and not new_days.empty:
+                summary["first_day"] = min(summary["first_day"], new_days["day"].min().strftime("%Y-%m-%d"))
+                summary["latest_day"] = max(summary["latest_day"], new_days["day"].max().strftime("%Y-%m-%d"))
+                summary["days"] += len(new_days)
+                summary["totals"] = {c: summary["totals"][c] + int(new_days[c].sum()) for c in METRIC_COLUMNS}
+        summary = {"stored_days": signature, **summary}
+
+        self.rollup_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.summary_path().with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(summary, f, indent=2)
+        atomic_replace(tmp_path, self.summary_path())
+
+    def _write(self, granularity: str, rollup: pd.DataFrame) -> None:
+        """Replace a rollup file atomically"""
+        self.rollup_dir.mkdir(parents=True, exist_ok=True)
+        path = self.path(granularity)
+        tmp_path = path.with_suffix(".tmp")
+        rollup.to_parquet(tmp_path, index=False)
+        atomic_replace(tmp_path, path)
+
+
+# Stored-days key per manifest, with the file signature it was computed from
+_day_keys: Dict[Path, Tuple[Tuple[int, int], Optional[str]]] = {}
+_day_keys_lock = threading.Lock()
+
+
+def _stored_days_key(store: MetricsStore) -> Optional[str]:
+    """
+    Return a digest of the days and rows recorded in the store's manifest.
+
+    It changes only when days are added or dropped, not when the manifest is
+    rewritten with the same content, e.g. by compaction merging partitions or
+    by a rebuild from the partition files.
+    """
+    try:
+        stat = os.stat(store.manifest_path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        # Read below, which rebuilds the manifest from the partitions
+        signature = None
+    with _day_keys_lock:
+        cached = _day_keys.get(store.manifest_path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    manifest = store.manifest()
+    rows = sum(entry["rows"] for entry in manifest["partitions"].values())
+    content = [manifest["first_day"], manifest["latest_day"], manifest["gaps"], rows]
+    key = hashlib.sha1(json.dumps(content).encode()).hexdigest() if manifest["latest_day"] else None
+    with _day_keys_lock:
+        _day_keys[store.manifest_path] = (signature, key)
+    return key
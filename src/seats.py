@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+This module downloads and stores Copilot seat assignments, to find seats that are not used.
+
+The seats endpoint is paginated. The first page's `Link` header names the last
+page, so the remaining pages are fetched concurrently over the shared client.
+When only a `next` link is given, pages are followed one after another.
+
+Each download is diffed against the previous snapshot by user id, and only
+the seats that were added, changed or removed are appended to the change
+log under `data/seats/[scope]/changes/`. The current snapshot is kept in
+`current.parquet`, sorted by last activity, which serves as the index for
+idle seat queries: seats idle since a date are a prefix of it, found by
+binary search. String columns are dictionary encoded, so repeated editor,
+team and plan values are stored once per file.
+
+Usage:
+    python seats.py [--idle-days 30]
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlencode, urlparse
+import argparse
+import logging
+import os
+import re
+import sys
+import threading
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import requests
+
+from github_client import GithubClient
+from github_metrics_downloader import Scope, create_client
+from metrics_store import atomic_replace
+from telemetry import increment, setup_logging, span
+
+SEATS_PER_PAGE = 100
+SEATS_MAX_WORKERS = int(os.getenv("SEATS_MAX_WORKERS", "4"))
+IDLE_DAYS = int(os.getenv("SEATS_IDLE_DAYS", "30"))
+
+_STRING = pa.dictionary(pa.int32(), pa.string())
+_TIMESTAMP = pa.timestamp("ns", tz="UTC")
+
+SEATS_SCHEMA = pa.schema([
+    pa.field("user_id", pa.int64()),
+    pa.field("login", _STRING),
+    pa.field("assigning_team", _STRING),
+    pa.field("plan_type", _STRING),
+    pa.field("created_at", _TIMESTAMP),
+    pa.field("updated_at", _TIMESTAMP),
+    pa.field("pending_cancellation_date", _TIMESTAMP),
+    pa.field("last_activity_at", _TIMESTAMP),
+    pa.field("last_activity_editor", _STRING),
+])
+
+# Change log rows carry the seat as it is after the change, or was before a removal
+CHANGES_SCHEMA = pa.schema(
+    [pa.field("snapshot_at", _TIMESTAMP), pa.field("change", _STRING)] + list(SEATS_SCHEMA)
+)
+
+_LINK_PATTERN = re.compile(r'<([^>]+)>;\s*rel="([^"]+)"')
+
+
+def parse_link_header(value: Optional[str]) -> Dict[str, str]:
+    """
+    Map the relations of an HTTP `Link` header, e.g. `next` and `last`, to their URLs.
+    """
+    return {rel: url for url, rel in _LINK_PATTERN.findall(value or "")}
+
+
+def seats_path(scope: Scope) -> Optional[str]:
+    """Seats API path for a scope; seats are assigned per organization or enterprise"""
+    if scope.kind == "enterprise":
+        return f"/enterprises/{scope.owner}/copilot/billing/seats"
+    if scope.kind == "org":
+        return f"/orgs/{scope.owner}/copilot/billing/seats"
+    return None
+
+
+def seats_frame(seats: List[Dict]) -> pd.DataFrame:
+    """
+    Flatten seat objects from the API into one row per user.
+    """
+    rows = [{
+        "user_id": (seat.get("assignee") or {}).get("id"),
+        "login": (seat.get("assignee") or {}).get("login", ""),
+        "assigning_team": (seat.get("assigning_team") or {}).get("slug", ""),
+        "plan_type": seat.get("plan_type") or "",
+        "created_at": seat.get("created_at"),
+        "updated_at": seat.get("updated_at"),
+        "pending_cancellation_date": seat.get("pending_cancellation_date"),
+        "last_activity_at": seat.get("last_activity_at"),
+        "last_activity_editor": seat.get("last_activity_editor") or "",
+    } for seat in seats]
+    df = pd.DataFrame(rows, columns=SEATS_SCHEMA.names)
+    df = df[df["user_id"].notna()].astype({"user_id": "int64"})
+    for field in SEATS_SCHEMA:
+        if field.type == _TIMESTAMP:
+            df[field.name] = pd.to_datetime(df[field.name], utc=True, format="ISO8601")
+    # Pages fetched while seats change may overlap
+    return df.drop_duplicates("user_id", keep="last").reset_index(drop=True)
+
+
+def diff_seats(previous: Optional[pd.DataFrame], current: pd.DataFrame) -> pd.DataFrame:
+    """
+    Compare two snapshots by user id.
+
+    Returns:
+        pd.DataFrame: The added and changed seats as they are now and the
+        removed seats as they were, with a `change` column of `added`,
+        `updated` or `removed`.
+    """
+    if previous is None or previous.empty:
+        return current.assign(change="added")
+
+    before = previous.set_index("user_id")
+    after = current.set_index("user_id")
+    columns = [c for c in SEATS_SCHEMA.names if c != "user_id"]
+
+    added = after.index.difference(before.index)
+    removed = before.index.difference(after.index)
+    common = after.index.intersection(before.index)
+    old = before.loc[common, columns].astype(object)
+    new = after.loc[common, columns].astype(object)
+    # Missing values on both sides are equal
+    differs = (old.ne(new) & ~(old.isna() & new.isna())).any(axis=1)
+    updated = common[differs.to_numpy()]
+
+    parts = [
+        after.loc[added].assign(change="added"),
+        after.loc[updated].assign(change="updated"),
+        before.loc[removed].assign(change="removed"),
+    ]
+    return pd.concat([p for p in parts if not p.empty] or parts[:1]).reset_index()
+
+
+class SeatStore:
+    """
+    Stores the current seat snapshot and the log of seat changes of one scope.
+    """
+    def __init__(self, data_dir: str = "data", scope: Optional[str] = None):
+        """
+        Initialize the seats of `scope` rooted at `<data_dir>/seats`.
+        """
+        self.seats_dir = Path(data_dir) / "seats"
+        if scope:
+            self.seats_dir = self.seats_dir / scope
+        self.current_path = self.seats_dir / "current.parquet"
+        self.changes_dir = self.seats_dir / "changes"
+
+    def read_current(self) -> Optional[pd.DataFrame]:
+        """
+        Read the current snapshot sorted by last activity, or None if no seats are stored.
+        """
+        if not self.current_path.exists():
+            return None
+        return pq.read_table(self.current_path).to_pandas()
+
+    def read_changes(self) -> Optional[pd.DataFrame]:
+        """
+        Read the whole change log in the order the changes were seen.
+        """
+        files = sorted(self.changes_dir.glob("changes_*.parquet")) if self.changes_dir.exists() else []
+        if not files:
+            return None
+        return pa.concat_tables([pq.read_table(f) for f in files]).to_pandas()
+
+    def update(self, current: pd.DataFrame, snapshot_at: Optional[datetime] = None) -> int:
+        """
+        Record a new snapshot, appending only the seats that changed.
+
+        Args:
+            current (pd.DataFrame): Seats as returned by `seats_frame`.
+            snapshot_at (Optional[datetime]): When the snapshot was taken. Defaults to now.
+
+        Returns:
+            int: The number of changed seats.
+        """
+        snapshot_at = pd.Timestamp(snapshot_at or datetime.now(timezone.utc))
+        changes = diff_seats(self.read_current(), current)
+        if changes.empty:
+            return 0
+
+        self.changes_dir.mkdir(parents=True, exist_ok=True)
+        changes.insert(0, "snapshot_at", snapshot_at)
+        path = self.changes_dir / f"changes_{snapshot_at:%Y%m%dT%H%M%S}.parquet"
+        self._write(pa.Table.from_pandas(changes[CHANGES_SCHEMA.names], schema=CHANGES_SCHEMA,
+                                         preserve_index=False), path)
+
+        # Never active seats sort last, so seats idle since a date are a prefix
+        current = current.sort_values(["last_activity_at", "user_id"], na_position="last", kind="stable")
+        self._write(pa.Table.from_pandas(current[SEATS_SCHEMA.names], schema=SEATS_SCHEMA,
+                                         preserve_index=False), self.current_path)
+        return len(changes)
+
+    def _write(self, table: pa.Table, path: Path) -> None:
+        tmp_path = path.with_suffix(".tmp")
+        pq.write_table(table, tmp_path, compression="zstd")
+        atomic_replace(tmp_path, path)
+
+
+def idle_seats(df: pd.DataFrame, since: pd.Timestamp) -> pd.DataFrame:
+    """
+    Select the seats without activity since `since`, never active ones last.
+
+    Args:
+        df (pd.DataFrame): Snapshot sorted by `last_activity_at` with missing values last.
+        since (pd.Timestamp): Seats last active before this time are idle.
+
+    Returns:
+        pd.DataFrame: A positional slice of `df` plus its never active tail, found by binary search.
+    """
+    active = df["last_activity_at"]
+    known = len(df) - int(active.isna().sum())
+    since = pd.Timestamp(since)
+    since = since.tz_localize("UTC") if since.tzinfo is None else since.tz_convert("UTC")
+    idle = active.iloc[:known].searchsorted(since, side="left")
+    return pd.concat([df.iloc[:idle], df.iloc[known:]])
+
+
+class SeatsDownloader:
+    """
+    Downloads the Copilot seats of an organization or enterprise.
+    """
+    def __init__(self, scope: Optional[Scope] = None, client: Optional[GithubClient] = None,
+                 max_workers: int = SEATS_MAX_WORKERS):
+        self.scope = scope or Scope("org", str(os.getenv("GITHUB_ORG_NAME")))
+        self.client = client or create_client()
+        self.max_workers = max_workers
+        path = seats_path(self.scope)
+        self.endpoint = self.client.url(path) if path else None
+        setup_logging()
+
+    def download(self) -> Optional[pd.DataFrame]:
+        """
+        Fetch every page of seats.
+
+        Returns:
+            Optional[pd.DataFrame]: One row per seat, or None if the download failed
+            or the scope has no seats endpoint.
+        """
+        if self.endpoint is None:
+            logging.info(f"Seats are not available per team, skipping {self.scope.name}")
+            return None
+        try:
+            with span("download_seats"):
+                first, links = self._fetch_page(self._page_url(self.endpoint, 1))
+                seats = first
+                last = links.get("last")
+                if last:
+                    # All page URLs are known, so fetch them concurrently in page order
+                    pages = int(parse_qs(urlparse(last).query).get("page", ["1"])[0])
+                    urls = [self._page_url(self.endpoint, page) for page in range(2, pages + 1)]
+                    with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(urls) or 1))) as executor:
+                        for page_seats, _ in executor.map(self._fetch_page, urls):
+                            seats.extend(page_seats)
+                else:
+                    next_url = links.get("next")
+                    while next_url:
+                        page_seats, links = self._fetch_page(next_url)
+                        seats.extend(page_seats)
+                        next_url = links.get("next")
+            increment("seats_downloaded", len(seats))
+            return seats_frame(seats)
+
+        except (requests.RequestException, ValueError) as e:
+            logging.error(f"Error fetching seats for {self.scope.name}: {e}")
+            return None
+
+    def _fetch_page(self, url: str) -> Tuple[List[Dict], Dict[str, str]]:
+        """Fetch one page and return its seats and `Link` relations"""
+        with self.client.get(url) as response:
+            if response.status_code != 200:
+                raise ValueError(f"Failed to fetch seats: {response.status_code} - {response.text}")
+            increment("seat_pages")
+            return response.json().get("seats", []), parse_link_header(response.headers.get("Link"))
+
+    @staticmethod
+    def _page_url(url: str, page: int) -> str:
+        parsed = urlparse(url)
+        query = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        query.update({"per_page": str(SEATS_PER_PAGE), "page": str(page)})
+        return parsed._replace(query=urlencode(query)).geturl()
+
+
+def download_seats(scope: Optional[Scope] = None, client: Optional[GithubClient] = None,
+                   data_dir: str = "data") -> Optional[int]:
+    """
+    Download the seats of a scope and store the changes since the last download.
+
+    Returns:
+        Optional[int]: The number of changed seats, or None if the download failed.
+    """
+    seats = SeatsDownloader(scope, client).download()
+    if seats is None:
+        return None
+    store = SeatStore(data_dir, scope.name if scope else None)
+    changed = store.update(seats)
+    increment("seats_changed", changed)
+    logging.info(f"{changed} of {len(seats)} seats changed for {scope.name if scope else 'default scope'}")
+    return changed
+
+
+_seat_cache: Dict[Path, Tuple[Tuple[int, int], pd.DataFrame]] = {}
+_seat_cache_lock = threading.Lock()
+
+
+def load_current_seats(data_dir: str = "data", scope: Optional[str] = None) -> Optional[pd.DataFrame]:
+    """
+    Return the current seat snapshot, read again only after it was rewritten.
+    """
+    try:
+        path = SeatStore(data_dir, scope).current_path.resolve()
+        if not path.exists():
+            return None
+        stat = path.stat()
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with _seat_cache_lock:
+            cached = _seat_cache.get(path)
+            if cached is None or cached[0] != signature:
+                increment("cache_misses")
+                cached = _seat_cache[path] = (signature, pq.read_table(path).to_pandas())
+            else:
+                increment("cache_hits")
+        return cached[1].copy(deep=False)
+
+    except Exception as e:
+        logging.error(f"Error loading seats: {str(e)}")
+        return None
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Download Copilot seats and list idle ones.")
+    parser.add_argument("--idle-days", type=int, default=IDLE_DAYS,
+                        help="days without activity after which a seat is idle (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    if download_seats() is None:
+        return 1
+    seats = load_current_seats()
+    idle = idle_seats(seats, pd.Timestamp.now(tz="UTC") - pd.Timedelta(days=args.idle_days))
+    print(f"{len(idle)} of {len(seats)} seats idle for {args.idle_days} days")
+    print(idle[["login", "last_activity_at", "last_activity_editor"]].to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
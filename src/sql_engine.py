@@ -0,0 +1,261 @@
+"""
+This module answers SQL queries over the metrics store with an embedded DuckDB.
+
+Queries run directly against the Parquet partitions listed in each store's
+manifest, instead of against a frame built from all of them, so DuckDB only
+reads the columns a query selects and skips row groups outside its `WHERE`
+on `date`. Scopes that a query filters out are never opened.
+
+Two views are available, each with a `scope` column that is NULL for the
+default scope:
+    metrics    one row per scope and day, with the dashboard's column names and derived metrics
+    breakdown  one row per scope, day, editor, model and language
+
+Only single read-only SELECT statements are accepted, and DuckDB may only
+open files under the data directory. Results are cached by SQL text and
+dataset version, so a repeated query is answered without touching the files
+until new data is stored. When the data changes, the views are rebuilt on a
+new connection that is swapped in, so queries already running keep the views
+they started with.
+
+DuckDB is an optional dependency; without it `SQL_AVAILABLE` is False and
+`SQLEngine` raises `RuntimeError`.
+
+Usage:
+    python sql_engine.py "SELECT language, sum(code_suggestions) FROM breakdown GROUP BY 1"
+"""
+
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import importlib.util
+import logging
+import sys
+import threading
+
+import pandas as pd
+import pyarrow as pa
+
+from data_loader import COLUMN_NAMES
+from derived_metrics import DAILY_METRICS, DerivedMetric
+from metrics_store import TABLE_SCHEMAS, MetricsStore, list_scopes
+from telemetry import increment, setup_logging, span
+
+# DuckDB is optional and slow to import, so it is only imported once an engine is created
+SQL_AVAILABLE = importlib.util.find_spec("duckdb") is not None
+
+# Results kept per (SQL text, dataset version)
+SQL_CACHE_SIZE = 64
+# Rows returned at most by a query; larger results are truncated
+SQL_MAX_ROWS = 10_000
+
+VIEWS = tuple(TABLE_SCHEMAS)
+
+
+def _quote(value: Optional[str]) -> str:
+    return "NULL" if value is None else "'" + str(value).replace("'", "''") + "'"
+
+
+def _sql_type(arrow_type: pa.DataType) -> str:
+    if pa.types.is_timestamp(arrow_type):
+        return "TIMESTAMP"
+    if pa.types.is_dictionary(arrow_type) or pa.types.is_string(arrow_type):
+        return "VARCHAR"
+    return "BIGINT"
+
+
+def _metric_sql(metric: DerivedMetric) -> str:
+    """Translate a derived metric into the same expression in SQL, rounded the way numpy rounds"""
+    factor = float(10 ** metric.decimals)
+    return (
+        f"round_even(CASE WHEN {metric.denominator} > 0 THEN "
+        f"{metric.numerator} / {metric.denominator} * {float(metric.scale)} END * {factor}, 0) / {factor} "
+        f"AS {metric.name}"
+    )
+
+
+class SQLEngine:
+    """
+    Runs read-only SQL over the stored metrics of every scope.
+    """
+    def __init__(self, data_dir: str = "data", cache_size: int = SQL_CACHE_SIZE):
+        """
+        Initialize a DuckDB connection that may only read files under `data_dir`.
+
+        Raises:
+            RuntimeError: If DuckDB is not installed.
+        """
+        if not SQL_AVAILABLE:
+            raise RuntimeError("SQL queries need DuckDB, install it with `pip install duckdb`")
+        self.data_dir = Path(data_dir).resolve()
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple, Tuple[pd.DataFrame, bool]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self.connection = self._connect()
+
+    def _connect(self):
+        """Open a DuckDB connection that may only read files under `data_dir`"""
+        import duckdb
+        connection = duckdb.connect()
+        connection.execute(f"SET allowed_directories = [{_quote(str(self.data_dir) + '/')}]")
+        connection.execute("SET enable_external_access = false")
+        connection.execute("SET lock_configuration = true")
+        return connection
+
+    def version(self) -> Tuple:
+        """
+        Return the manifest signatures of every stored scope and table.
+        """
+        signatures = []
+        for table in VIEWS:
+            for scope in list_scopes(str(self.data_dir), table):
+                path = MetricsStore(str(self.data_dir), table=table, scope=scope).manifest_path
+                stat = path.stat() if path.exists() else None
+                signatures.append((table, scope, stat and (stat.st_mtime_ns, stat.st_size)))
+        return tuple(signatures)
+
+    def query(self, sql: str, max_rows: int = SQL_MAX_ROWS) -> Tuple[pd.DataFrame, bool]:
+        """
+        Run one SELECT statement against the `metrics` and `breakdown` views.
+
+        Args:
+            sql (str): A single SELECT (or WITH ... SELECT) statement.
+            max_rows (int): Rows returned at most.
+
+        Returns:
+            Tuple[pd.DataFrame, bool]: The result, and whether it was truncated to `max_rows`.
+
+        Raises:
+            ValueError: If `sql` is not a single SELECT statement.
+            duckdb.Error: If the query fails, e.g. on a syntax error or unknown column.
+        """
+        import duckdb
+        connection, version = self._refresh_views()
+        cursor = connection.cursor()
+        try:
+            statements = cursor.extract_statements(sql)
+        finally:
+            cursor.close()
+        if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+            raise ValueError("Only a single SELECT statement can be run")
+
+        query = statements[0].query.strip()
+        key = (query, max_rows, version)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+        if cached is not None:
+            increment("sql_cache_hits")
+            return cached[0].copy(deep=False), cached[1]
+
+        increment("sql_cache_misses")
+        with span("sql_query"):
+            try:
+                df = self._execute(connection, query, max_rows)
+            except duckdb.IOException:
+                # Compaction deleted partitions after the views were built; retry once on the new manifests
+                if self.version() == version:
+                    raise
+                connection, version = self._refresh_views()
+                key = (query, max_rows, version)
+                df = self._execute(connection, query, max_rows)
+        result = (df.iloc[:max_rows], len(df) > max_rows)
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result[0].copy(deep=False), result[1]
+
+    def describe(self) -> Dict[str, List[str]]:
+        """
+        Return the columns of each view, for showing next to a query editor.
+        """
+        connection, _ = self._refresh_views()
+        cursor = connection.cursor()
+        try:
+            return {view: [row[0] for row in cursor.execute(f"DESCRIBE {view}").fetchall()] for view in VIEWS}
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def _execute(connection, query: str, max_rows: int) -> pd.DataFrame:
+        # A cursor per query lets Streamlit sessions query concurrently
+        cursor = connection.cursor()
+        try:
+            return cursor.sql(query).limit(max_rows + 1).df()
+        finally:
+            cursor.close()
+
+    def _refresh_views(self) -> Tuple:
+        """
+        Return a connection whose views list the partitions currently in the manifests, and its dataset version.
+
+        Views are never replaced on a connection that queries may be using:
+        a changed dataset gets a new connection, and the previous one is
+        released once its last query finishes.
+        """
+        version = self.version()
+        with self._lock:
+            if version != self._version:
+                connection = self._connect()
+                for view in VIEWS:
+                    connection.execute(f"CREATE VIEW {view} AS {self._view_sql(view)}")
+                self.connection = connection
+                self._version = version
+                self._cache.clear()
+            return self.connection, version
+
+    def _view_sql(self, table: str) -> str:
+        """Union the manifest-listed partitions of every scope of a table"""
+        schema = TABLE_SCHEMAS[table]
+        rename = COLUMN_NAMES if table == "metrics" else {}
+        columns = ", ".join(f"{f.name} AS {rename.get(f.name, f.name)}" for f in schema)
+
+        selects = []
+        for scope in list_scopes(str(self.data_dir), table):
+            files = MetricsStore(str(self.data_dir), table=table, scope=scope).partition_files()
+            if files:
+                paths = ", ".join(_quote(str(f.resolve())) for f in files)
+                selects.append(f"SELECT {_quote(scope)}::VARCHAR AS scope, {columns} FROM read_parquet([{paths}])")
+        if not selects:
+            # Nothing stored yet; keep the columns so queries still bind
+            empty = ", ".join(f"NULL::{_sql_type(f.type)} AS {rename.get(f.name, f.name)}" for f in schema)
+            selects.append(f"SELECT NULL::VARCHAR AS scope, {empty} LIMIT 0")
+
+        sql = " UNION ALL ".join(selects)
+        if table == "metrics":
+            metrics = ", ".join(_metric_sql(m) for m in DAILY_METRICS.values())
+            sql = f"SELECT *, {metrics} FROM ({sql})"
+        return sql
+
+
+_engines: Dict[Path, SQLEngine] = {}
+_engines_lock = threading.Lock()
+
+
+def get_engine(data_dir: str = "data") -> SQLEngine:
+    """
+    Return the engine shared by all callers for `data_dir`, so its result cache is too.
+    """
+    path = Path(data_dir).resolve()
+    with _engines_lock:
+        if path not in _engines:
+            _engines[path] = SQLEngine(data_dir)
+        return _engines[path]
+
+
+if __name__ == "__main__":
+    setup_logging()
+    if len(sys.argv) != 2:
+        print(__doc__)
+        sys.exit(1)
+    try:
+        result, truncated = get_engine().query(sys.argv[1])
+    except Exception as e:
+        logging.error(f"Query failed: {str(e)}")
+        sys.exit(1)
+    print(result.to_string(index=False))
+    if truncated:
+        print(f"(first {SQL_MAX_ROWS} rows)")
@@ -0,0 +1,142 @@
+"""
+This module pages, sorts, filters and exports tables on the server.
+
+The dashboard's Raw Data view asks for one page at a time, so the browser only
+ever receives the rows it shows, and exports are streamed in record batches
+instead of being built from one serialized copy of the whole table.
+"""
+
+from io import BytesIO
+from typing import Dict, Iterator, Optional, Sequence, Tuple, Union
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+# Rows per record batch written by `iter_export`
+EXPORT_BATCH_ROWS = 50_000
+EXPORT_FORMATS = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
+# Allowed values for a column, or an inclusive (low, high) range
+ColumnFilter = Union[Sequence, Tuple[object, object]]
+
+
+def filter_mask(df: pd.DataFrame, filters: Optional[Dict[str, ColumnFilter]] = None) -> pd.Series:
+    """
+    Build a row mask from per-column filters.
+
+    Args:
+        df (pd.DataFrame): Table to filter.
+        filters (Optional[Dict[str, ColumnFilter]]): A list of allowed values,
+            or a `(low, high)` tuple for an inclusive range where either end
+            may be None. Empty lists and unknown columns are ignored.
+
+    Returns:
+        pd.Series: True for the rows that pass every filter.
+    """
+    mask = pd.Series(True, index=df.index)
+    for column, allowed in (filters or {}).items():
+        if column not in df.columns:
+            continue
+        if isinstance(allowed, tuple) and len(allowed) == 2:
+            low, high = allowed
+            if low is not None:
+                mask &= df[column] >= low
+            if high is not None:
+                mask &= df[column] <= high
+        elif len(allowed):
+            mask &= df[column].isin(allowed)
+    return mask
+
+
+def query(
+    df: pd.DataFrame,
+    filters: Optional[Dict[str, ColumnFilter]] = None,
+    sort_by: Optional[str] = None,
+    ascending: bool = True,
+) -> pd.DataFrame:
+    """
+    Filter and sort a table without copying more than the matching rows.
+
+    Sorting is stable, so pages of equal sort keys keep the stored order and
+    do not shuffle between requests.
+    """
+    if filters:
+        df = df[filter_mask(df, filters)]
+    if sort_by:
+        df = df.sort_values(sort_by, ascending=ascending, kind="stable")
+    return df
+
+
+def page(
+    df: pd.DataFrame,
+    page_number: int = 1,
+    page_size: int = 100,
+    filters: Optional[Dict[str, ColumnFilter]] = None,
+    sort_by: Optional[str] = None,
+    ascending: bool = True,
+) -> Tuple[pd.DataFrame, int]:
+    """
+    Return one page of a filtered and sorted table.
+
+    Args:
+        df (pd.DataFrame): Table to page through.
+        page_number (int): 1-based page; out-of-range pages are clamped.
+        page_size (int): Rows per page.
+        filters (Optional[Dict[str, ColumnFilter]]): See `filter_mask`.
+        sort_by (Optional[str]): Column to sort by; None keeps the stored order.
+        ascending (bool): Sort direction.
+
+    Returns:
+        Tuple[pd.DataFrame, int]: The page, re-indexed from zero, and the
+        number of rows matching the filters.
+    """
+    df = query(df, filters, sort_by, ascending)
+    total = len(df)
+    pages = max(1, -(-total // page_size))
+    start = (min(max(page_number, 1), pages) - 1) * page_size
+    return df.iloc[start:start + page_size].reset_index(drop=True), total
+
+
+def iter_export(df: pd.DataFrame, fmt: str = "csv", batch_rows: int = EXPORT_BATCH_ROWS) -> Iterator[bytes]:
+    """
+    Stream a table as CSV or Parquet bytes, one record batch at a time.
+
+    Args:
+        df (pd.DataFrame): Table to export.
+        fmt (str): `csv` or `parquet`.
+        batch_rows (int): Rows converted and written per chunk.
+
+    Yields:
+        bytes: Consecutive pieces of the file.
+
+    Raises:
+        ValueError: If `fmt` is not a supported format.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+
+    # Infer types from the first batch; an empty frame would type object columns as null
+    schema = pa.Schema.from_pandas(df.iloc[:batch_rows], preserve_index=False)
+    buffer = BytesIO()
+    writer = pq.ParquetWriter(buffer, schema) if fmt == "parquet" else None
+    try:
+        for offset in range(0, max(len(df), 1), batch_rows):
+            batch = pa.Table.from_pandas(df.iloc[offset:offset + batch_rows], schema=schema, preserve_index=False)
+            if writer:
+                writer.write_table(batch)
+            else:
+                pa_csv.write_csv(batch, buffer, pa_csv.WriteOptions(include_header=offset == 0))
+            yield _drain(buffer)
+    finally:
+        if writer:
+            writer.close()
+    yield _drain(buffer)
+
+
+def _drain(buffer: BytesIO) -> bytes:
+    """Return what was written to `buffer` and empty it"""
+    data = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return data
@@ -0,0 +1,187 @@
+"""
+This module collects lightweight timings and counters for the metrics pipeline.
+
+Stages are timed with the `span` context manager and volumes are counted with
+`increment`; both go into one process-wide registry that the dashboard's
+Performance panel reads and that can be exported as JSON or in the Prometheus
+text format. The module also configures logging, once per process.
+"""
+
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Deque, Dict, Iterator, Optional
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+# Latencies kept per span for the percentiles shown in the Performance panel
+SAMPLES_PER_SPAN = 512
+PROMETHEUS_PREFIX = "copilot_dashboard"
+
+_logging_configured = False
+_lock = threading.Lock()
+
+
+def setup_logging() -> None:
+    """
+    Log INFO and above to stdout, configuring the root logger only on the first call.
+    """
+    global _logging_configured
+    with _lock:
+        if _logging_configured:
+            return
+        logging.basicConfig(
+            level=logging.INFO,
+            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+            handlers=[logging.StreamHandler(sys.stdout)]
+        )
+        _logging_configured = True
+
+
+class _SpanStats:
+    """Running totals and recent samples of one span"""
+    __slots__ = ("count", "total", "max", "last", "samples")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+        self.samples: Deque[float] = deque(maxlen=SAMPLES_PER_SPAN)
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.last = seconds
+        self.samples.append(seconds)
+
+    def percentile(self, q: float) -> float:
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+_spans: Dict[str, _SpanStats] = {}
+_counters: Dict[str, float] = {}
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """
+    Time the enclosed block and record it under `name`, also when it raises.
+
+    Example:
+        with span("load_data"):
+            df = load_data()
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _lock:
+            stats = _spans.get(name)
+            if stats is None:
+                stats = _spans[name] = _SpanStats()
+            stats.add(elapsed)
+
+
+def increment(name: str, value: float = 1) -> None:
+    """
+    Add `value` to the counter `name`, e.g. rows parsed or bytes read.
+    """
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def snapshot() -> Dict[str, Dict]:
+    """
+    Return a copy of all spans and counters.
+
+    Returns:
+        Dict[str, Dict]: `spans` maps each name to its count, total, mean, max,
+        last, p50 and p95 in seconds; `counters` maps each name to its value.
+    """
+    with _lock:
+        spans = {
+            name: {
+                "count": s.count,
+                "total": s.total,
+                "mean": s.total / s.count,
+                "max": s.max,
+                "last": s.last,
+                "p50": s.percentile(0.5),
+                "p95": s.percentile(0.95),
+            }
+            for name, s in sorted(_spans.items())
+        }
+        return {"spans": spans, "counters": dict(sorted(_counters.items()))}
+
+
+def reset() -> None:
+    """
+    Clear all recorded spans and counters.
+    """
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+
+
+def to_json() -> str:
+    """
+    Render the current snapshot as JSON.
+    """
+    return json.dumps(snapshot(), indent=2)
+
+
+def _metric_name(name: str) -> str:
+    return "".join(c if c.isalnum() else "_" for c in name)
+
+
+def to_prometheus() -> str:
+    """
+    Render the current snapshot in the Prometheus text exposition format.
+
+    Spans become one summary with a `stage` label, counters become `_total` counters.
+    """
+    data = snapshot()
+    lines = [
+        f"# HELP {PROMETHEUS_PREFIX}_stage_seconds Latency of pipeline stages.",
+        f"# TYPE {PROMETHEUS_PREFIX}_stage_seconds summary",
+    ]
+    for name, s in data["spans"].items():
+        label = f'stage="{name}"'
+        lines.append(f'{PROMETHEUS_PREFIX}_stage_seconds{{{label},quantile="0.5"}} {s["p50"]:.6f}')
+        lines.append(f'{PROMETHEUS_PREFIX}_stage_seconds{{{label},quantile="0.95"}} {s["p95"]:.6f}')
+        lines.append(f'{PROMETHEUS_PREFIX}_stage_seconds_sum{{{label}}} {s["total"]:.6f}')
+        lines.append(f'{PROMETHEUS_PREFIX}_stage_seconds_count{{{label}}} {s["count"]}')
+    for name, value in data["counters"].items():
+        metric = f"{PROMETHEUS_PREFIX}_{_metric_name(name)}_total"
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {value:g}")
+    return "\n".join(lines) + "\n"
+
+
+def export(path: Optional[Path] = None) -> Optional[Path]:
+    """
+    Write the current snapshot to `path`, or to `PERF_EXPORT_FILE` if unset.
+
+    Files ending in `.prom` are written in the Prometheus text format, e.g. for
+    the node exporter's textfile collector; anything else is written as JSON.
+
+    Returns:
+        Optional[Path]: The file written, or None if no path is configured.
+    """
+    path = path or os.getenv("PERF_EXPORT_FILE")
+    if not path:
+        return None
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    tmp_path.write_text(to_prometheus() if path.suffix == ".prom" else to_json())
+    tmp_path.replace(path)
+    return path
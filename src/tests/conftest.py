@@ -0,0 +1,100 @@
+"""
+Shared fixtures of the test suite.
+
+Tests import the application modules from `src/`, as `app.py` does, and build
+their stores from the synthetic payloads of the benchmarks, so no API key is needed.
+
+Usage:
+    cd src && python -m pytest tests
+"""
+
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import sys
+import threading
+
+import pytest
+
+SRC_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SRC_DIR))
+sys.path.insert(0, str(SRC_DIR / "benchmarks"))
+
+from data_manager import DataManager  # noqa: E402
+from github_client import GithubClient  # noqa: E402
+from github_metrics_downloader import GithubMetricsDownloader, Scope  # noqa: E402
+from synthetic import generate_payload  # noqa: E402
+
+END_DAY = date(2024, 12, 31)
+
+
+@pytest.fixture
+def workdir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Run the test from an empty directory, as the app resolves `data/` against it"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def ingest(data_dir: Path, payload: List[dict], window: int = 10,
+           order: Optional[Iterable[int]] = None) -> DataManager:
+    """
+    Store a payload the way daily refreshes would, `window` days per download.
+
+    Args:
+        order (Optional[Iterable[int]]): Start offsets of the windows to
+            ingest, in order. Defaults to every window, oldest first.
+    """
+    data_dir.mkdir(parents=True, exist_ok=True)
+    downloader = GithubMetricsDownloader(Scope("org", "test"), GithubClient("test"))
+    manager = DataManager(str(data_dir))
+    for start in order if order is not None else range(0, len(payload), window):
+        window_file = (data_dir / f"window_{start}.json").resolve()
+        downloader.save_entries(iter(payload[start:start + window]), window_file)
+        manager.process_new_data(window_file)
+    return manager
+
+
+@pytest.fixture
+def payload() -> Callable[..., List[dict]]:
+    """Return a factory of small synthetic payloads ending on `END_DAY`"""
+    def make(days: int = 60, **kwargs) -> List[dict]:
+        kwargs = {"end": END_DAY, "editors": 2, "models": 2, "languages": 3, **kwargs}
+        return generate_payload(days=days, **kwargs)
+    return make
+
+
+# Answers one request with its status, headers and body
+StubHandler = Callable[[BaseHTTPRequestHandler], Tuple[int, Dict[str, str], bytes]]
+
+
+@pytest.fixture
+def stub() -> Iterator[Callable[[StubHandler], str]]:
+    """Return a function that starts a local HTTP server answering GETs with a handler, and returns its URL"""
+    servers = []
+
+    def start(handler: StubHandler) -> str:
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                status, headers, body = handler(self)
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,68 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from anomalies import DIMENSIONS, AnomalyStore
+from conftest import END_DAY, ingest
+from metrics_store import MetricsStore
+from synthetic import generate_payload
+
+DAYS = 150
+# Ten-day downloads, with one window left out and backfilled last
+BACKFILLED = 70
+ORDER = [start for start in range(0, DAYS, 10) if start != BACKFILLED] + [BACKFILLED]
+
+
+@pytest.fixture(scope="module")
+def data_dir(tmp_path_factory):
+    workdir = tmp_path_factory.mktemp("anomalies")
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.chdir(workdir)
+        ingest(workdir / "data", generate_payload(days=DAYS, end=END_DAY, editors=2, models=2, languages=3),
+               order=ORDER)
+    return workdir / "data"
+
+
+@pytest.fixture(scope="module")
+def stores(data_dir):
+    """The store updated incrementally at each ingest, and one rebuilt from all days at once"""
+    full = AnomalyStore(str(data_dir.parent / "full"))
+    full.update(MetricsStore(str(data_dir)), MetricsStore(str(data_dir), table="breakdown"))
+    return AnomalyStore(str(data_dir)), full
+
+
+def assert_same(incremental: AnomalyStore, full: AnomalyStore, dimension: str) -> None:
+    pd.testing.assert_frame_equal(
+        incremental.read(dimension).reset_index(drop=True),
+        full.read(dimension).reset_index(drop=True),
+        check_categorical=False,
+    )
+
+
+@pytest.mark.parametrize("dimension", DIMENSIONS)
+def test_incremental_updates_match_a_full_rebuild(stores, dimension):
+    incremental, full = stores
+    assert len(incremental.read(dimension)) > 0
+    assert_same(incremental, full, dimension)
+
+
+def test_each_month_is_stored_separately(stores):
+    incremental, _ = stores
+    months = {path.stem for path in incremental.month_files("daily")}
+    assert months == {"2024-08", "2024-09", "2024-10", "2024-11", "2024-12"}
+
+
+def test_state_with_a_renamed_metric_is_rebuilt(stores, data_dir):
+    incremental, full = stores
+    # Write the language anomalies under an old metric name, as an earlier version did
+    for path in incremental.month_files("language") + [incremental.state_path("language")]:
+        df = pq.read_table(path).to_pandas()
+        df["metric"] = df["metric"].replace("suggestion_acceptance_rate", "acceptance_rate")
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), path)
+
+    latest_day = incremental.read("language")["day"].max()
+    incremental.update(MetricsStore(str(data_dir)), MetricsStore(str(data_dir), table="breakdown"), latest_day)
+
+    assert "acceptance_rate" not in set(incremental.read("language")["metric"])
+    assert_same(incremental, full, "language")
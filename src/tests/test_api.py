@@ -0,0 +1,110 @@
+from typing import Dict, Optional, Tuple
+from urllib.error import HTTPError
+from urllib.parse import urlparse
+from urllib.request import Request, urlopen
+import json
+import socket
+import threading
+
+import pytest
+
+import api
+from conftest import END_DAY, ingest
+from synthetic import generate_payload
+
+
+@pytest.fixture(scope="module")
+def server(tmp_path_factory):
+    """An API server answering from a small store, on a free port"""
+    workdir = tmp_path_factory.mktemp("api")
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        # Endpoints read `data/` relative to the working directory
+        monkeypatch.chdir(workdir)
+        ingest(workdir / "data", generate_payload(days=30, end=END_DAY, editors=2, models=2, languages=3))
+        server = api.serve("127.0.0.1", 0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        yield f"http://127.0.0.1:{server.server_port}"
+        server.shutdown()
+        server.server_close()
+
+
+def get(server: str, path: str, headers: Optional[Dict[str, str]] = None) -> Tuple[int, bytes, Dict[str, str]]:
+    try:
+        with urlopen(Request(server + path, headers=headers or {})) as response:
+            return response.status, response.read(), dict(response.headers)
+    except HTTPError as e:
+        return e.code, e.read(), dict(e.headers)
+
+
+@pytest.mark.parametrize("path, status", [
+    ("/table?sort=nope", 400),
+    ("/export?sort=nope", 400),
+    ("/table?table=nope", 404),
+    ("/export?table=nope", 404),
+    ("/export?format=xlsx", 400),
+    ("/totals?start=yesterday", 400),
+    ("/table?page=first", 400),
+    ("/timeseries?granularity=hourly", 400),
+    ("/breakdown?by=user", 400),
+    ("/alerts?dimension=user", 400),
+    ("/totals?scope=nope", 404),
+    ("/nope", 404),
+])
+def test_invalid_requests_are_rejected(server, path, status):
+    code, body, _ = get(server, path)
+    assert code == status
+    assert "error" in json.loads(body)
+
+
+def test_table_pages_are_sorted(server):
+    code, body, _ = get(server, "/table?sort=date&desc=1&page=2&page_size=7")
+    result = json.loads(body)
+
+    assert code == 200
+    assert (result["total"], result["page"], result["page_size"]) == (30, 2, 7)
+    days = [row["date"] for row in result["data"]]
+    assert days == sorted(days, reverse=True)
+    assert days[0] == "2024-12-24"
+
+
+def test_export_is_sorted(server):
+    code, body, _ = get(server, "/export?sort=date&desc=1")
+    lines = body.decode().splitlines()
+
+    assert code == 200
+    assert len(lines) == 31
+    assert lines[1].startswith("2024-12-31") and lines[-1].startswith("2024-12-02")
+
+
+def test_unchanged_response_is_not_sent_again(server):
+    _, _, headers = get(server, "/totals")
+    code, body, _ = get(server, "/totals", {"If-None-Match": headers["ETag"]})
+    assert (code, body) == (304, b"")
+
+
+def test_export_failing_before_the_first_chunk_is_an_error_response(server, monkeypatch):
+    def export_table(*args):
+        raise OSError("partition unreadable")
+        yield b""
+
+    monkeypatch.setattr(api, "export_table", export_table)
+    code, body, _ = get(server, "/export")
+    assert code == 500
+    assert json.loads(body) == {"error": "Internal server error"}
+
+
+def test_export_failing_midway_truncates_the_response(server, monkeypatch):
+    def export_table(*args):
+        yield b"date,suggestions\n"
+        raise OSError("partition unreadable")
+
+    monkeypatch.setattr(api, "export_table", export_table)
+    host, port = urlparse(server).netloc.split(":")
+    with socket.create_connection((host, int(port)), timeout=5) as sock:
+        sock.sendall(b"GET /export HTTP/1.1\r\nHost: test\r\n\r\n")
+        received = b"".join(iter(lambda: sock.recv(65536), b""))
+
+    # The connection is closed after the rows sent so far, without a final chunk or a second status line
+    head, body = received.split(b"\r\n\r\n", 1)
+    assert head.startswith(b"HTTP/1.1 200")
+    assert body == b"11\r\ndate,suggestions\n\r\n"
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+
+from charts import downsample, lttb
+
+
+def test_lttb_keeps_threshold_sorted_points_with_both_ends():
+    rng = np.random.default_rng(0)
+    x = np.arange(1000)
+    kept = lttb(x, rng.normal(size=1000), 50)
+
+    assert len(kept) == 50
+    assert kept[0] == 0 and kept[-1] == 999
+    assert (np.diff(kept) > 0).all()
+
+
+def test_lttb_keeps_every_point_below_the_threshold():
+    x = np.arange(10)
+    assert lttb(x, x, 10).tolist() == list(range(10))
+    assert lttb(x, x, 20).tolist() == list(range(10))
+
+
+def test_lttb_keeps_an_isolated_spike():
+    y = np.zeros(500)
+    y[123] = 100.0
+    assert 123 in lttb(np.arange(500), y, 20)
+
+
+def test_lttb_accepts_datetimes():
+    days = pd.date_range("2024-01-01", periods=100).to_numpy()
+    kept = lttb(days, np.sin(np.arange(100) / 5), 10)
+    assert len(kept) == 10 and kept[-1] == 99
+
+
+def test_downsample_keeps_whole_rows():
+    df = pd.DataFrame({
+        "date": pd.date_range("2020-01-01", periods=400),
+        "suggestions": np.arange(400) % 7,
+        "active_users": np.arange(400),
+    })
+    sampled = downsample(df, "suggestions", max_points=40)
+
+    assert len(sampled) == 40
+    pd.testing.assert_frame_equal(sampled, df.loc[sampled.index])
+    assert downsample(df, "suggestions", max_points=400) is df
@@ -0,0 +1,118 @@
+import json
+
+import pandas as pd
+
+from anomalies import DIMENSIONS, AnomalyStore
+from compaction import _archive_prefix, compact, compact_all, plan
+from conftest import ingest
+from metrics_store import METRIC_COLUMNS, MetricsStore
+from reader import BATCH_COLUMNS, MetricsReader
+from rollups import GRANULARITIES, RollupStore
+
+def write_windows(store: MetricsStore, start: str, days: int, window: int = 10) -> None:
+    """Write one partition per `window` days of metrics"""
+    for first in pd.date_range(start, periods=days // window, freq=f"{window}D"):
+        days_in_window = pd.date_range(first, periods=window)
+        df = pd.DataFrame({"day": days_in_window})
+        for i, column in enumerate(METRIC_COLUMNS):
+            df[column] = range(i, i + window)
+        store.write_partition(df)
+
+
+# Shorter than the 28 days each refresh downloads again
+RETENTION = {"keep_daily_days": 7, "keep_monthly_days": 30, "retention_days": 10}
+
+
+def test_aged_partitions_are_merged_into_archives(tmp_path):
+    store = MetricsStore(str(tmp_path))
+    write_windows(store, "2023-01-01", 730)
+    before = store.read()
+
+    stats = compact(store, keep_daily_days=30, keep_monthly_days=200, retention_days=None)
+    names = store.manifest()["partitions"]
+    archives = sorted({_archive_prefix(name) for name in names} - {None})
+    assert archives == [f"month_2024-{m:02d}" for m in range(1, 11)] + ["year_2023"]
+    assert stats.files_after == len(names) == len(store.partition_files()) < stats.files_before
+    assert store.verify() == []
+    pd.testing.assert_frame_equal(store.read(), before)
+
+    # Compacting again changes nothing
+    assert not plan(store, keep_daily_days=30, keep_monthly_days=200, retention_days=None).changed
+
+
+def test_dry_run_only_plans(tmp_path):
+    store = MetricsStore(str(tmp_path))
+    write_windows(store, "2024-01-01", 120)
+    files, manifest = store.partition_files(), store.manifest()
+
+    stats = compact(store, keep_daily_days=30, keep_monthly_days=365, retention_days=60, dry_run=True)
+    assert stats.merged and stats.dropped and stats.files_after < stats.files_before
+    assert (store.partition_files(), store.manifest()) == (files, manifest)
+
+
+def test_late_days_are_merged_into_their_archive(tmp_path):
+    store = MetricsStore(str(tmp_path))
+    write_windows(store, "2024-01-01", 10)
+    write_windows(store, "2024-01-21", 100)
+    compact(store, keep_daily_days=30, keep_monthly_days=365, retention_days=None)
+    assert "2024-01-11" in store.manifest()["gaps"]
+
+    # The gap is backfilled after its month was archived
+    write_windows(store, "2024-01-11", 10)
+    stats = compact(store, keep_daily_days=30, keep_monthly_days=365, retention_days=None)
+    assert list(stats.merged) == ["month_2024-01"]
+    assert stats.merged["month_2024-01"][0] == "data_2024-01-20.parquet"
+    assert store.manifest()["gaps"] == []
+    assert len(store.read(end_date=pd.Timestamp("2024-01-31"))) == 31
+
+
+def test_days_dropped_by_retention_are_not_ingested_again(workdir, payload):
+    data_dir = workdir / "data"
+    days = payload(90)
+    ingest(data_dir, days, window=28)
+    compact_all(str(data_dir), **RETENTION)
+    store = MetricsStore(str(data_dir))
+    files, manifest = store.partition_files(), store.manifest()
+    # Partitions are kept until their last day is before the cutoff
+    assert (manifest["first_day"], manifest["retained_from"]) == ("2024-11-28", "2024-12-21")
+
+    # The next refresh downloads the same window, which starts before the cutoff
+    assert ingest(data_dir, days, window=28, order=[62]).no_new_data
+    assert store.partition_files() == files
+
+    compact_all(str(data_dir), **RETENTION)
+    assert store.manifest() == manifest
+
+
+def test_legacy_files_are_not_read_again_after_compaction(workdir, monkeypatch):
+    data_dir = workdir / "data"
+    data_dir.mkdir()
+    for start in pd.date_range("2024-11-02", periods=6, freq="10D"):
+        days = pd.date_range(start, periods=10)
+        records = [{"day": day.strftime("%Y-%m-%d"), **{name: 1 for name in BATCH_COLUMNS}} for day in days]
+        (data_dir / f"data_{days[-1].strftime('%Y-%m-%d')}.json").write_text(json.dumps(records))
+    store = MetricsStore(str(data_dir))
+    assert store.migrate_json() == 6
+
+    compact_all(str(data_dir), **RETENTION)
+    assert store.manifest()["retained_from"] == "2024-12-21"
+    read = []
+    monkeypatch.setattr(MetricsReader, "read_metrics_batch", lambda self, name: read.append(name))
+    assert store.migrate_json() == 0
+    assert read == []
+
+
+def test_rollups_and_anomalies_are_rebuilt_from_the_days_kept(workdir, payload):
+    data_dir = workdir / "data"
+    ingest(data_dir, payload(90), window=28)
+    rollups, anomalies = RollupStore(str(data_dir)), AnomalyStore(str(data_dir))
+    assert anomalies.month_files("daily")[0].stem == "2024-10"
+
+    compact_all(str(data_dir), **RETENTION)
+    first_day = pd.Timestamp(MetricsStore(str(data_dir)).manifest()["first_day"])
+    for granularity in GRANULARITIES:
+        periods = rollups.read(granularity)["day"]
+        assert periods.min() >= first_day.to_period(GRANULARITIES[granularity][1]).start_time
+    for dimension in DIMENSIONS:
+        assert [path.stem for path in anomalies.month_files(dimension)] == ["2024-11", "2024-12"]
+        assert anomalies.read(dimension)["day"].min() == first_day
@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+import data_downloader
+from data_downloader import DOWNLOAD_FAILED, DOWNLOAD_OK, DOWNLOAD_UNCHANGED, download_scope, download_scopes
+from data_manager import DataManager
+from github_metrics_downloader import Scope
+
+ETAG = '"v1"'
+
+
+@pytest.fixture
+def api(workdir, payload, stub, monkeypatch):
+    """A metrics endpoint that answers 304 to its ETag, recording each request's If-None-Match"""
+    body = json.dumps(payload(5)).encode()
+    seen = []
+
+    def handler(request):
+        seen.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == ETAG:
+            return 304, {}, b""
+        return 200, {"Content-Type": "application/json", "ETag": ETAG}, body
+
+    monkeypatch.setenv("GITHUB_API_URL", stub(handler))
+    monkeypatch.setenv("GITHUB_ORG_NAME", "test")
+    return seen
+
+
+def test_etag_is_saved_only_once_the_download_is_stored(api, workdir, monkeypatch):
+    etag_file = workdir / "data" / "etags.json"
+    with monkeypatch.context() as failing:
+        failing.setattr(DataManager, "process_new_data", lambda self, input_file: None)
+        assert download_scope() == DOWNLOAD_FAILED
+    assert not etag_file.exists()
+
+    assert download_scope() == DOWNLOAD_OK
+    assert ETAG in json.loads(etag_file.read_text()).values()
+
+    assert download_scope() == DOWNLOAD_UNCHANGED
+    assert api == [None, None, ETAG]
+
+
+def test_download_without_new_days_is_unchanged(api, workdir):
+    assert download_scope() == DOWNLOAD_OK
+    (workdir / "data" / "etags.json").unlink()
+
+    assert download_scope() == DOWNLOAD_UNCHANGED
+    assert (workdir / "data" / "etags.json").exists()
+    assert not list((workdir / "data").glob("metrics_*"))
+
+
+def test_failed_seat_download_fails_only_its_scope(workdir, monkeypatch):
+    def download_seats(scope, client):
+        if scope.owner == "broken":
+            raise RuntimeError("seats unavailable")
+        return 0
+
+    monkeypatch.setattr(data_downloader, "DOWNLOAD_SEATS", True)
+    monkeypatch.setattr(data_downloader, "download_seats", download_seats)
+    monkeypatch.setattr(data_downloader, "_download_scope", lambda scope, client: DOWNLOAD_OK)
+
+    scopes = [Scope("org", "broken"), Scope("org", "fine")]
+    assert download_scopes(scopes, max_workers=2) == [DOWNLOAD_FAILED, DOWNLOAD_OK]
+
+
+def test_team_scopes_are_not_failed_for_lacking_seats(workdir, monkeypatch):
+    downloaded = []
+    monkeypatch.setattr(data_downloader, "DOWNLOAD_SEATS", True)
+    monkeypatch.setattr(data_downloader, "download_seats", lambda scope, client: downloaded.append(scope) or 0)
+    monkeypatch.setattr(data_downloader, "_download_scope", lambda scope, client: DOWNLOAD_OK)
+
+    scopes = [Scope("team", "acme", "platform"), Scope("org", "acme")]
+    assert download_scopes(scopes, max_workers=1) == [DOWNLOAD_OK, DOWNLOAD_OK]
+    assert downloaded == [Scope("org", "acme")]
@@ -0,0 +1,129 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import data_loader
+import telemetry
+from compaction import compact_all
+from conftest import ingest
+from data_loader import MetricsDataLoader, invalidate_cache
+from metrics_store import METRIC_COLUMNS, MetricsStore
+
+
+def write_days(data_dir, start: str, days: int, seed: int = 0) -> None:
+    """Write one partition per day of random metrics"""
+    store = MetricsStore(str(data_dir))
+    rng = np.random.default_rng(seed)
+    for day in pd.date_range(start, periods=days):
+        df = pd.DataFrame({c: rng.integers(0, 1000, 1) for c in METRIC_COLUMNS})
+        df.insert(0, "day", [day])
+        store.write_partition(df)
+
+
+def counters() -> dict:
+    return telemetry.snapshot()["counters"]
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    invalidate_cache()
+    telemetry.reset()
+    yield
+    invalidate_cache()
+
+
+def test_pooled_load_matches_a_serial_load(tmp_path, monkeypatch):
+    write_days(tmp_path, "2024-01-01", 12)
+    serial = MetricsDataLoader(str(tmp_path), max_workers=1).load_metrics_to_dataframe()
+    invalidate_cache()
+
+    monkeypatch.setattr(data_loader, "LOADER_POOL_MIN_FILES", 0)
+    pooled = MetricsDataLoader(str(tmp_path), max_workers=2).load_metrics_to_dataframe()
+    pd.testing.assert_frame_equal(pooled, serial)
+
+
+def test_concurrent_loads_with_different_pool_sizes(tmp_path, monkeypatch):
+    # Each load resizes the shared pool, while the other may be using it
+    monkeypatch.setattr(data_loader, "LOADER_POOL_MIN_FILES", 0)
+    for i in range(4):
+        write_days(tmp_path / str(i), "2024-01-01", 6, seed=i)
+
+    def load(i):
+        return MetricsDataLoader(str(tmp_path / str(i)), max_workers=1 + i % 2 * 2).load_metrics_to_dataframe()
+
+    with ThreadPoolExecutor(4) as executor:
+        frames = list(executor.map(load, range(4)))
+    invalidate_cache()
+    for i, frame in enumerate(frames):
+        expected = MetricsDataLoader(str(tmp_path / str(i)), max_workers=1).load_metrics_to_dataframe()
+        pd.testing.assert_frame_equal(frame, expected)
+
+
+def test_small_stores_are_read_without_the_pool(tmp_path, monkeypatch):
+    write_days(tmp_path, "2024-01-01", 5)
+    monkeypatch.setattr(data_loader, "_get_pool", lambda workers: pytest.fail("used the pool"))
+    assert len(MetricsDataLoader(str(tmp_path), max_workers=4).load_metrics_to_dataframe()) == 5
+
+
+def test_unchanged_store_is_not_read_again(tmp_path):
+    write_days(tmp_path, "2024-01-01", 5)
+    loader = MetricsDataLoader(str(tmp_path))
+    first = loader.load_metrics_to_dataframe()
+    assert counters()["partitions_read"] == 5
+
+    second = MetricsDataLoader(str(tmp_path)).load_metrics_to_dataframe()
+    assert counters()["partitions_read"] == 5
+    assert counters()["cache_hits"] == 1
+    pd.testing.assert_frame_equal(second, first)
+
+
+def test_only_new_partitions_are_read(tmp_path):
+    write_days(tmp_path, "2024-01-01", 5)
+    loader = MetricsDataLoader(str(tmp_path))
+    loader.load_metrics_to_dataframe()
+
+    write_days(tmp_path, "2024-01-06", 1, seed=1)
+    df = loader.load_metrics_to_dataframe()
+    assert counters()["partitions_read"] == 6
+    assert df["date"].tolist() == list(pd.date_range("2024-01-01", periods=6))
+    assert "acceptance_rate" in df
+
+
+def test_compacted_partitions_leave_the_frame_unchanged(tmp_path):
+    write_days(tmp_path, "2024-01-01", 90)
+    loader = MetricsDataLoader(str(tmp_path))
+    before = loader.load_metrics_to_dataframe()
+
+    compact_all(str(tmp_path), keep_daily_days=7, keep_monthly_days=30)
+    after = loader.load_metrics_to_dataframe()
+    assert len(data_loader._caches[(tmp_path / "metrics").resolve()].chunks) < 90
+    pd.testing.assert_frame_equal(after, before)
+
+
+def test_sessions_read_the_previous_frame_while_it_is_rebuilt(tmp_path):
+    write_days(tmp_path, "2024-01-01", 3)
+    loader = MetricsDataLoader(str(tmp_path))
+    loader.load_metrics_to_dataframe()
+    write_days(tmp_path, "2024-01-04", 1)
+
+    cache = data_loader._caches[(tmp_path / "metrics").resolve()]
+    with cache.build_lock:
+        assert len(loader.load_metrics_to_dataframe()) == 3
+    assert counters()["stale_reads"] == 1
+    assert len(loader.load_metrics_to_dataframe()) == 4
+
+
+def test_range_and_breakdown_loads(workdir, payload):
+    ingest(workdir / "data", payload(20))
+    loader = MetricsDataLoader(str(workdir / "data"))
+
+    df = loader.load_range(pd.Timestamp("2024-12-20"), pd.Timestamp("2024-12-24"), ["suggestions"])
+    assert list(df.columns) == ["date", "suggestions"] and len(df) == 5
+
+    by_editor = loader.load_breakdown(["editor"])
+    breakdown = loader.load_breakdown_to_dataframe()
+    assert by_editor["code_suggestions"].sum() == breakdown["code_suggestions"].sum()
+    assert "suggestion_acceptance_rate" in by_editor
+    assert (loader.load_breakdown(["language"])["language"] != "").all()
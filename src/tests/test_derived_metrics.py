@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+
+from derived_metrics import BREAKDOWN_METRICS, DAILY_METRICS, DerivedMetric, derive, ratio
+
+
+def test_ratio_is_undefined_without_a_positive_denominator():
+    result = ratio([1, 2, 3, 4], [2, 0, -1, 8], scale=100)
+    np.testing.assert_array_equal(result[[0, 3]], [50.0, 50.0])
+    assert np.isnan(result[1]) and np.isnan(result[2])
+
+
+def test_derive_adds_the_metrics_whose_inputs_are_present():
+    df = pd.DataFrame({"suggestions": [200, 0], "acceptances": [61, 0], "lines_accepted": [7, 3]})
+    result = derive(df)
+
+    assert "acceptance_rate" in result and "suggestion_acceptance_rate" in result
+    assert "chat_acceptance_rate" not in result
+    assert result["suggestion_acceptance_rate"].iloc[0] == 30  # 30.5, rounded half to even
+    assert result["acceptance_rate"].isna().iloc[1]
+    assert list(df.columns) == ["suggestions", "acceptances", "lines_accepted"]
+
+
+def test_derive_named_metrics():
+    df = pd.DataFrame({"code_acceptances": [1], "code_suggestions": [3]})
+    result = derive(df, BREAKDOWN_METRICS, ["suggestion_acceptance_rate"])
+    assert result["suggestion_acceptance_rate"].tolist() == [33]
+
+
+def test_values_are_formatted_per_metric():
+    rate = DAILY_METRICS["line_acceptance_rate"]
+    per_user = DerivedMetric("per_user", "Per User", "a", "b", decimals=2)
+
+    assert rate.format(np.float64(41.0)) == "41%"
+    assert rate.value(np.float64(41.0)) == 41 and isinstance(rate.value(np.float64(41.0)), int)
+    assert per_user.format(1.5) == "1.50"
+    assert rate.format(np.nan) == per_user.format(None) == "n/a"
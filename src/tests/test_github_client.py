@@ -0,0 +1,165 @@
+import socket
+import time
+
+import pytest
+import requests
+
+from github_client import GithubClient, RateBudget, RateBudgetExceeded
+
+
+def scripted(*responses):
+    """Handler answering with `responses` in turn, then repeating the last one; records each request"""
+    requests = []
+
+    def handler(request):
+        requests.append((request.path, request.headers.get("If-None-Match")))
+        return responses[min(len(requests), len(responses)) - 1]
+
+    handler.requests = requests
+    return handler
+
+
+def client(base_url: str, **kwargs) -> GithubClient:
+    """A client that records its waits instead of sleeping"""
+    result = GithubClient("token", base_url=base_url, **kwargs)
+    result.sleeps = []
+    result._sleep = result.sleeps.append
+    return result
+
+
+def test_transient_errors_are_retried_with_backoff(stub):
+    handler = scripted((503, {}, b""), (502, {}, b""), (200, {}, b"ok"))
+    api = client(stub(handler), backoff_factor=1.0)
+
+    response = api.get("/metrics")
+    assert (response.status_code, response.content) == (200, b"ok")
+    assert len(handler.requests) == 3
+    assert 0.5 <= api.sleeps[0] <= 1.0 and 1.0 <= api.sleeps[1] <= 2.0
+
+
+def test_retries_stop_after_max_retries(stub):
+    handler = scripted((500, {}, b""))
+    api = client(stub(handler), max_retries=2)
+
+    assert api.get("/metrics").status_code == 500
+    assert len(handler.requests) == 3
+
+
+def test_retry_after_is_honored(stub):
+    handler = scripted((429, {"Retry-After": "7"}, b""), (200, {}, b""))
+    api = client(stub(handler))
+
+    assert api.get("/metrics").status_code == 200
+    assert api.sleeps == [7.0]
+
+
+def test_secondary_rate_limit_is_retried(stub):
+    handler = scripted((403, {"Retry-After": "3"}, b""), (200, {}, b""))
+    api = client(stub(handler))
+
+    assert api.get("/metrics").status_code == 200
+    assert api.sleeps == [3.0]
+
+
+def test_forbidden_without_rate_limit_is_not_retried(stub):
+    handler = scripted((403, {}, b"no access"))
+    api = client(stub(handler))
+
+    assert api.get("/metrics").status_code == 403
+    assert len(handler.requests) == 1
+
+
+def test_primary_rate_limit_waits_for_the_reset(stub):
+    reset = str(int(time.time()) + 30)
+    handler = scripted((403, {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": reset}, b""), (200, {}, b""))
+    api = client(stub(handler))
+
+    assert api.get("/metrics").status_code == 200
+    assert 29 <= api.sleeps[0] <= 32
+
+
+def test_waits_longer_than_max_backoff_fail_fast(stub):
+    handler = scripted((429, {"Retry-After": "3600"}, b""))
+    api = client(stub(handler), max_backoff=60)
+
+    assert api.get("/metrics").status_code == 429
+    assert api.sleeps == []
+
+
+def test_connection_errors_are_retried_then_raised():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    api = client(f"http://127.0.0.1:{port}", max_retries=2)
+
+    with pytest.raises(requests.ConnectionError):
+        api.get("/metrics")
+    assert len(api.sleeps) == 2
+
+
+def test_conditional_request_sends_the_saved_etag(stub, tmp_path):
+    handler = scripted((200, {"ETag": '"v1"'}, b"[]"), (304, {}, b""))
+    url = stub(handler)
+    api = client(url, etag_file=tmp_path / "etags.json")
+
+    response = api.get("/metrics", conditional=True)
+    # Not saved until the caller stored the body
+    assert api.get("/metrics", conditional=True).status_code == 304
+    assert handler.requests[1] == ("/metrics", None)
+
+    api.save_etag("/metrics", response)
+    assert api.get("/metrics", conditional=True).status_code == 304
+    assert handler.requests[2] == ("/metrics", '"v1"')
+
+    # ETags persist for the next run
+    assert client(url, etag_file=tmp_path / "etags.json").etag("/metrics") == '"v1"'
+
+
+def test_etag_is_kept_under_the_requested_url_after_a_redirect(stub):
+    def handler(request):
+        handler.requests.append(request.headers.get("If-None-Match"))
+        if request.path == "/old":
+            return 301, {"Location": "/new"}, b""
+        return 200, {"ETag": '"v2"'}, b"[]"
+
+    handler.requests = []
+    api = client(stub(handler))
+
+    response = api.get("/old", conditional=True)
+    assert response.url.endswith("/new")
+    api.save_etag("/old", response)
+    api.get("/old", conditional=True)
+    assert handler.requests[-2] == '"v2"'
+
+
+def test_error_responses_do_not_save_an_etag(stub):
+    handler = scripted((404, {"ETag": '"v1"'}, b""))
+    api = client(stub(handler))
+
+    api.save_etag("/metrics", api.get("/metrics"))
+    assert api.etag("/metrics") is None
+
+
+def test_rate_budget_spreads_requests_after_the_burst():
+    budget = RateBudget(requests_per_hour=3600, burst=2)
+    assert budget.acquire() == 0.0
+    assert budget.acquire() == 0.0
+    assert 0.9 <= budget.acquire() <= 1.0
+
+    budget.release()
+    assert budget.acquire() <= 1.0
+
+
+def test_rate_budget_pauses_until_the_reset_when_nearly_used_up(stub):
+    reset = int(time.time()) + 120
+    handler = scripted((200, {"X-RateLimit-Remaining": "10", "X-RateLimit-Reset": str(reset)}, b""))
+    budget = RateBudget(reserve=50)
+    api = client(stub(handler), rate_budget=budget, max_backoff=60)
+
+    api.get("/metrics")
+    assert 115 <= budget.acquire() <= 122
+    budget.release()
+    # Longer than the client may wait, so it gives up without sending anything
+    with pytest.raises(RateBudgetExceeded):
+        api.get("/metrics")
+    assert len(handler.requests) == 1
@@ -0,0 +1,44 @@
+import json
+
+import pytest
+
+from github_client import GithubClient
+from github_metrics_downloader import GithubMetricsDownloader, Scope
+
+
+@pytest.fixture
+def downloader(workdir, payload, stub):
+    body = json.dumps(payload(3)).encode()
+    url = stub(lambda request: (200, {"Content-Type": "application/json"}, body))
+    return GithubMetricsDownloader(Scope("org", "test"), GithubClient("token", base_url=url))
+
+
+def test_download_writes_the_daily_totals_and_breakdown(downloader):
+    output_file = downloader.download()
+
+    assert [day["day"] for day in json.loads(output_file.read_text())] == ["2024-12-29", "2024-12-30", "2024-12-31"]
+    assert output_file.with_name(f"{output_file.stem}.breakdown.parquet").exists()
+
+
+def fail_after_one_day(downloader, monkeypatch, error):
+    """Make writing the download fail once the first day was written"""
+    save_entries = downloader.save_entries
+
+    def save_one_day(entries, output_file):
+        save_entries(iter([next(entries)]), output_file)
+        raise error
+
+    monkeypatch.setattr(downloader, "save_entries", save_one_day)
+
+
+def test_malformed_download_leaves_no_partial_files(downloader, workdir, monkeypatch):
+    fail_after_one_day(downloader, monkeypatch, ValueError("Unterminated JSON array"))
+    assert downloader.download() is None
+    assert not list((workdir / "data").glob("metrics_*"))
+
+
+def test_unexpected_error_leaves_no_partial_files(downloader, workdir, monkeypatch):
+    fail_after_one_day(downloader, monkeypatch, OSError("No space left on device"))
+    with pytest.raises(OSError):
+        downloader.download()
+    assert not list((workdir / "data").glob("metrics_*"))
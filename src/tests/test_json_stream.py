@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from json_stream import iter_json_array
+
+DOCUMENT = [{"date": "2024-01-01", "name": "naïve ✓"}, [1, 2.5, None], "a,b]", True, {}]
+
+
+def test_decodes_every_split_of_the_document():
+    data = json.dumps(DOCUMENT, ensure_ascii=False, indent=1).encode()
+    # Splits include the middle of multi-byte characters and of string escapes
+    for cut in range(len(data) + 1):
+        assert list(iter_json_array([data[:cut], data[cut:]])) == DOCUMENT
+
+
+def test_decodes_one_byte_at_a_time():
+    data = json.dumps(DOCUMENT).encode()
+    assert list(iter_json_array(data[i:i + 1] for i in range(len(data)))) == DOCUMENT
+
+
+def test_yields_elements_before_the_document_ends():
+    def chunks():
+        yield b'[{"a": 1}, '
+        raise AssertionError("read past the first element")
+
+    elements = iter_json_array(chunks())
+    assert next(elements) == {"a": 1}
+
+
+@pytest.mark.parametrize("data", [b"[]", b"  [ ]  ", b"[\n]"])
+def test_empty_array(data):
+    assert list(iter_json_array([data])) == []
+
+
+@pytest.mark.parametrize("data", [
+    b'{"a": 1}', b"", b'[1, 2', b'[1, {"a": ]',
+    # Missing, doubled, leading and trailing commas, rejected as `json.loads` does
+    b"[1 2]", b'[{"a": 1} {"b": 2}]', b"[1,,2]", b"[,1]", b"[1,]",
+])
+def test_rejects_malformed_documents(data):
+    with pytest.raises(ValueError):
+        list(iter_json_array([data]))
+
+
+@pytest.mark.parametrize("data", [b"[1 2]", b"[1,,2]", b"[1,]"])
+def test_rejects_malformed_separators_split_anywhere(data):
+    for cut in range(len(data) + 1):
+        with pytest.raises(ValueError):
+            list(iter_json_array([data[:cut], data[cut:]]))
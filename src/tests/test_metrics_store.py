@@ -0,0 +1,83 @@
+import hashlib
+
+import pandas as pd
+import pytest
+
+from metrics_store import METRIC_COLUMNS, MetricsStore
+
+
+def frame(start: str, days: int) -> pd.DataFrame:
+    df = pd.DataFrame({"day": pd.date_range(start, periods=days)})
+    for i, column in enumerate(METRIC_COLUMNS):
+        df[column] = range(i, i + days)
+    return df
+
+
+@pytest.fixture
+def store(tmp_path) -> MetricsStore:
+    return MetricsStore(str(tmp_path))
+
+
+def test_manifest_records_each_partition(store):
+    path = store.write_partition(frame("2024-01-01", 3))
+
+    entry = store.manifest()["partitions"][path.name]
+    assert path.name == "data_2024-01-03.parquet"
+    assert (entry["min_day"], entry["max_day"], entry["rows"]) == ("2024-01-01", "2024-01-03", 3)
+    assert entry["sha256"] == hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def test_skipped_days_are_gaps_until_backfilled(store):
+    store.write_partition(frame("2024-01-01", 2))
+    store.write_partition(frame("2024-01-05", 2))
+    assert store.manifest()["gaps"] == ["2024-01-03", "2024-01-04"]
+
+    days = pd.Series(pd.date_range("2023-12-31", "2024-01-07"))
+    assert days[store.new_days_mask(days)].dt.strftime("%Y-%m-%d").tolist() == [
+        "2023-12-31", "2024-01-03", "2024-01-04", "2024-01-07",
+    ]
+
+    store.write_partition(frame("2024-01-03", 2))
+    manifest = store.manifest()
+    assert manifest["gaps"] == []
+    assert (manifest["first_day"], manifest["latest_day"]) == ("2024-01-01", "2024-01-06")
+
+
+def test_verify_passes_an_intact_store(store):
+    store.write_partition(frame("2024-01-01", 2))
+    assert store.verify() == []
+
+
+def test_verify_drops_a_corrupt_partition_and_records_its_days_as_gaps(store):
+    store.write_partition(frame("2024-01-01", 2))
+    corrupt = store.write_partition(frame("2024-01-03", 2))
+    store.write_partition(frame("2024-01-05", 2))
+    corrupt.write_bytes(corrupt.read_bytes()[:-1] + b"\0")
+
+    assert store.verify() == [corrupt]
+    assert not corrupt.exists()
+    assert corrupt.with_suffix(".corrupt").exists()
+    assert corrupt not in store.partition_files()
+    assert store.manifest()["gaps"] == ["2024-01-03", "2024-01-04"]
+    assert store.read()["day"].dt.strftime("%Y-%m-%d").tolist() == [
+        "2024-01-01", "2024-01-02", "2024-01-05", "2024-01-06",
+    ]
+
+
+def test_verify_drops_a_missing_partition(store):
+    store.write_partition(frame("2024-01-01", 2))
+    missing = store.write_partition(frame("2024-01-03", 2))
+    missing.unlink()
+
+    assert store.verify() == [missing]
+    assert store.manifest()["gaps"] == ["2024-01-03", "2024-01-04"]
+
+
+def test_missing_manifest_is_rebuilt_from_the_partitions(store):
+    store.write_partition(frame("2024-01-01", 2))
+    store.write_partition(frame("2024-01-05", 2))
+    expected = store.manifest()
+    store.manifest_path.unlink()
+
+    assert store.manifest() == expected
+    assert store.manifest_path.exists()
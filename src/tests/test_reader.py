@@ -0,0 +1,57 @@
+import json
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from reader import BATCH_COLUMNS, DailyMetrics, MetricsBatch, MetricsReader
+
+
+def records(days: int):
+    return [
+        {"day": f"2024-01-{i + 1:02d}", **{name: i * 10 + j for j, name in enumerate(BATCH_COLUMNS)}}
+        for i in range(days)
+    ]
+
+
+@pytest.fixture
+def batch() -> MetricsBatch:
+    return MetricsBatch.from_records(records(4))
+
+
+def test_batch_holds_one_typed_array_per_field(batch):
+    assert len(batch) == 4
+    assert batch.day.dtype == np.dtype("datetime64[ns]")
+    assert all(values.dtype == np.int64 for values in batch.columns.values())
+
+
+def test_indexing_builds_daily_metrics(batch):
+    day = batch[1]
+    assert isinstance(day, DailyMetrics)
+    assert day.day == datetime(2024, 1, 2)
+    assert day.total_suggestions_count == 10 and isinstance(day.total_suggestions_count, int)
+    assert [d.day.day for d in batch] == [1, 2, 3, 4]
+
+
+def test_slices_and_masks_are_sub_batches(batch):
+    assert [d.day.day for d in batch[1:3]] == [2, 3]
+    mask = batch.columns["total_active_users"] > 15
+    assert isinstance(batch[mask], MetricsBatch)
+    assert [d.day.day for d in batch[mask]] == [3, 4]
+
+
+def test_frame_has_the_same_values(batch):
+    df = batch.to_frame()
+    assert list(df.columns) == ["day"] + BATCH_COLUMNS
+    assert df.iloc[2].to_dict() == {**records(4)[2], "day": df["day"].iloc[2]}
+    assert str(df["day"].iloc[2].date()) == "2024-01-03"
+
+
+def test_reader_returns_none_for_unreadable_files(tmp_path):
+    (tmp_path / "good.json").write_text(json.dumps(records(2)))
+    (tmp_path / "bad.json").write_text('[{"day": "2024-01-01"}]')
+    reader = MetricsReader(str(tmp_path))
+
+    assert len(reader.read_metrics_frame("good.json")) == 2
+    assert reader.read_metrics_batch("bad.json") is None
+    assert reader.get_metrics_from_file("missing.json") is None
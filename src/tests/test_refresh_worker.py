@@ -0,0 +1,77 @@
+import json
+
+import pytest
+
+import compaction
+import data_downloader
+import github_metrics_downloader
+import refresh_worker
+from data_downloader import DOWNLOAD_FAILED, DOWNLOAD_OK
+from refresh_worker import (
+    FAILED_REFRESH_INTERVAL, LOCK_FILE, REFRESH_INTERVAL, STATUS_FILE,
+    FileLock, _seconds_until_due, last_refreshed_at, refresh,
+)
+
+
+@pytest.fixture
+def scopes(workdir, monkeypatch):
+    """Stub the downloads of two scopes; set `results` to choose their outcomes"""
+    results = [DOWNLOAD_OK, DOWNLOAD_OK]
+    monkeypatch.setattr(github_metrics_downloader, "configured_scopes", lambda: ["a", "b"])
+    monkeypatch.setattr(data_downloader, "download_scopes", lambda scopes, max_workers: list(results))
+    monkeypatch.setattr(compaction, "compact_all", lambda data_dir: [])
+    return results
+
+
+def status(data_dir) -> dict:
+    return json.loads((data_dir / STATUS_FILE).read_text())
+
+
+def test_refresh_records_its_outcome(scopes, workdir):
+    scopes[1] = DOWNLOAD_FAILED
+    assert refresh(workdir)
+
+    assert (status(workdir)["scopes"], status(workdir)["failed_scopes"]) == (2, 1)
+    assert last_refreshed_at(workdir) is not None
+    assert _seconds_until_due(workdir, REFRESH_INTERVAL) > REFRESH_INTERVAL - 60
+
+
+def test_failed_compaction_keeps_the_download_outcome(scopes, workdir, monkeypatch):
+    def compact_all(data_dir):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(compaction, "compact_all", compact_all)
+    assert refresh(workdir)
+    assert status(workdir)["compaction_error"] == "disk full"
+    assert last_refreshed_at(workdir) is not None
+
+
+def test_refresh_is_retried_sooner_when_every_scope_failed(scopes, workdir):
+    assert refresh(workdir)
+    refreshed_at = last_refreshed_at(workdir)
+
+    scopes[:] = [DOWNLOAD_FAILED, DOWNLOAD_FAILED]
+    assert refresh(workdir)
+    assert last_refreshed_at(workdir) == refreshed_at
+    assert status(workdir)["last_attempt_at"] > refreshed_at.isoformat()
+    assert FAILED_REFRESH_INTERVAL - 60 < _seconds_until_due(workdir, REFRESH_INTERVAL) <= FAILED_REFRESH_INTERVAL
+
+    # A shorter interval than the retry wait is kept
+    assert _seconds_until_due(workdir, 30) <= 30
+
+
+def test_refresh_is_skipped_while_another_holds_the_lock(scopes, workdir):
+    lock = FileLock(workdir / LOCK_FILE)
+    assert lock.acquire()
+    try:
+        assert not refresh(workdir)
+    finally:
+        lock.release()
+    assert not (workdir / STATUS_FILE).exists()
+
+
+def test_status_of_older_versions_is_read(workdir):
+    (workdir / STATUS_FILE).write_text(json.dumps({"last_refreshed_at": "2024-12-31T00:00:00+00:00", "failed_scopes": 0}))
+    assert last_refreshed_at(workdir).year == 2024
+    assert _seconds_until_due(workdir, REFRESH_INTERVAL) == 0
+    assert refresh_worker._read_status(workdir / "missing") == {}
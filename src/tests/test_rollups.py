@@ -0,0 +1,70 @@
+import pandas as pd
+
+from compaction import compact_all
+from conftest import ingest
+from helper_functions import key_statistics, load_data, load_summary
+from metrics_store import MetricsStore
+from rollups import RollupStore
+
+
+def test_summary_folded_at_each_ingest_matches_a_full_scan(workdir, payload):
+    data_dir = workdir / "data"
+    # Overlapping downloads, and a window backfilled after later ones
+    ingest(data_dir, payload(60), window=14, order=[0, 7, 35, 42, 49, 14, 21, 28])
+    store = MetricsStore(str(data_dir))
+    folded = RollupStore(str(data_dir)).read_summary(store)
+
+    scanned = RollupStore(str(workdir / "scan"))
+    scanned.update_summary(store)
+    assert folded is not None
+    assert folded == scanned.read_summary(store)
+    assert folded["days"] == 60
+
+
+def test_summary_statistics_match_the_loaded_frame(workdir, payload):
+    ingest(workdir / "data", payload(45), window=7)
+    assert load_summary()["statistics"] == key_statistics(load_data())
+
+
+def test_summary_is_ignored_once_the_store_changes(workdir, payload):
+    data_dir = workdir / "data"
+    ingest(data_dir, payload(20))
+    store = MetricsStore(str(data_dir))
+    rollups = RollupStore(str(data_dir))
+    assert rollups.read_summary(store) is not None
+
+    late_day = store.read().tail(1).assign(day=pd.Timestamp("2025-02-01"))
+    store.write_partition(late_day)
+    assert rollups.read_summary(store) is None
+
+
+def test_summary_survives_rewrites_of_the_same_days(workdir, payload):
+    data_dir = workdir / "data"
+    ingest(data_dir, payload(90))
+    store = MetricsStore(str(data_dir))
+    rollups = RollupStore(str(data_dir))
+    summary = rollups.read_summary(store)
+
+    # Merging daily partitions into archives keeps every day
+    compact_all(str(data_dir), keep_daily_days=7, keep_monthly_days=30)
+    assert len(store.partition_files()) < 9
+    assert rollups.read_summary(store) == summary
+
+    # As does rebuilding a lost manifest from the partition files
+    store.manifest_path.unlink()
+    assert rollups.read_summary(store) == summary
+
+
+def test_summary_is_recomputed_when_days_are_dropped(workdir, payload):
+    data_dir = workdir / "data"
+    ingest(data_dir, payload(30))
+    store = MetricsStore(str(data_dir))
+    rollups = RollupStore(str(data_dir))
+
+    compact_all(str(data_dir), keep_daily_days=7, keep_monthly_days=30, retention_days=10)
+    summary = rollups.read_summary(store)
+    assert summary["days"] == len(store.read())
+
+    store.partition_files()[0].write_bytes(b"corrupt")
+    store.verify()
+    assert rollups.read_summary(store) is None
@@ -0,0 +1,113 @@
+import json
+from datetime import datetime, timezone
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+import pytest
+
+from github_client import GithubClient
+from github_metrics_downloader import Scope
+from seats import SeatStore, SeatsDownloader, diff_seats, idle_seats, parse_link_header, seats_frame, seats_path
+
+
+def seat(user_id: int, last_activity_at=None, **kwargs) -> dict:
+    return {
+        "assignee": {"id": user_id, "login": f"user{user_id}"},
+        "plan_type": "business",
+        "created_at": "2024-01-01T00:00:00Z",
+        "last_activity_at": last_activity_at,
+        "last_activity_editor": "vscode" if last_activity_at else None,
+        **kwargs,
+    }
+
+
+def test_seats_are_flattened_one_row_per_user():
+    df = seats_frame([
+        seat(1, "2024-12-01T10:00:00Z", assigning_team={"slug": "platform"}),
+        {"assignee": None, "plan_type": "business"},
+        seat(2),
+        seat(1, "2024-12-02T10:00:00Z"),
+    ])
+
+    assert df["user_id"].tolist() == [2, 1]
+    assert df.loc[df["user_id"] == 1, "last_activity_at"].iloc[0] == pd.Timestamp("2024-12-02T10:00:00Z")
+    assert df.loc[df["user_id"] == 2, "last_activity_editor"].iloc[0] == ""
+    assert str(df["created_at"].dt.tz) == "UTC"
+
+
+def test_snapshots_are_diffed_by_user():
+    before = seats_frame([seat(1, "2024-12-01T00:00:00Z"), seat(2), seat(3)])
+    after = seats_frame([seat(1, "2024-12-05T00:00:00Z"), seat(2), seat(4)])
+
+    changes = diff_seats(before, after).set_index("user_id")["change"].to_dict()
+    assert changes == {4: "added", 1: "updated", 3: "removed"}
+    assert diff_seats(None, after)["change"].unique().tolist() == ["added"]
+    assert diff_seats(after, after).empty
+
+
+def test_store_appends_only_changed_seats(tmp_path):
+    store = SeatStore(str(tmp_path), "acme")
+    first = seats_frame([seat(1, "2024-12-01T00:00:00Z"), seat(2)])
+    assert store.update(first, datetime(2024, 12, 1, tzinfo=timezone.utc)) == 2
+    assert store.update(first, datetime(2024, 12, 2, tzinfo=timezone.utc)) == 0
+
+    second = seats_frame([seat(1, "2024-12-03T00:00:00Z"), seat(2)])
+    assert store.update(second, datetime(2024, 12, 3, tzinfo=timezone.utc)) == 1
+
+    changes = store.read_changes()
+    assert changes["change"].tolist() == ["added", "added", "updated"]
+    assert len(list(store.changes_dir.glob("*.parquet"))) == 2
+    # Never active seats sort last
+    assert store.read_current()["user_id"].tolist() == [1, 2]
+
+
+def test_idle_seats_match_a_scan():
+    activity = [None, "2024-11-01T00:00:00Z", "2024-12-01T00:00:00Z", "2024-12-15T00:00:00Z", None]
+    snapshot = seats_frame([seat(i, a) for i, a in enumerate(activity)])
+    snapshot = snapshot.sort_values(["last_activity_at", "user_id"], na_position="last")
+
+    for since in ["2024-10-01", "2024-12-01", "2024-12-10", "2025-01-01"]:
+        active = snapshot["last_activity_at"]
+        expected = snapshot[active.isna() | (active < pd.Timestamp(since, tz="UTC"))]
+        assert idle_seats(snapshot, pd.Timestamp(since))["user_id"].tolist() == expected["user_id"].tolist()
+
+
+def test_link_header_relations():
+    links = parse_link_header('<https://x/seats?page=2>; rel="next", <https://x/seats?page=5>; rel="last"')
+    assert links == {"next": "https://x/seats?page=2", "last": "https://x/seats?page=5"}
+    assert parse_link_header(None) == {}
+
+
+def test_seat_paths_per_scope():
+    assert seats_path(Scope("org", "acme")) == "/orgs/acme/copilot/billing/seats"
+    assert seats_path(Scope("enterprise", "acme")) == "/enterprises/acme/copilot/billing/seats"
+    assert seats_path(Scope("team", "acme", "platform")) is None
+
+
+@pytest.mark.parametrize("relation", ["last", "next"])
+def test_every_page_is_downloaded(stub, relation):
+    pages = {1: [seat(1), seat(2)], 2: [seat(3)], 3: [seat(4)]}
+    requested = []
+
+    def handler(request):
+        page = int(parse_qs(urlparse(request.path).query)["page"][0])
+        requested.append(page)
+        base = f"http://{request.headers['Host']}/orgs/acme/copilot/billing/seats?per_page=100"
+        headers = {"Content-Type": "application/json"}
+        if relation == "last" and page == 1:
+            headers["Link"] = f'<{base}&page=3>; rel="last"'
+        if relation == "next" and page < 3:
+            headers["Link"] = f'<{base}&page={page + 1}>; rel="next"'
+        return 200, headers, json.dumps({"seats": pages[page]}).encode()
+
+    client = GithubClient("token", base_url=stub(handler))
+    df = SeatsDownloader(Scope("org", "acme"), client, max_workers=2).download()
+
+    assert sorted(requested) == [1, 2, 3]
+    assert df["user_id"].tolist() == [1, 2, 3, 4]
+
+
+def test_failed_page_fails_the_download(stub):
+    client = GithubClient("token", base_url=stub(lambda request: (404, {}, b"not found")), max_retries=0)
+    assert SeatsDownloader(Scope("org", "acme"), client).download() is None
+    assert SeatsDownloader(Scope("team", "acme", "platform"), client).download() is None
@@ -0,0 +1,75 @@
+import duckdb
+import pytest
+
+from compaction import compact_all
+from conftest import END_DAY, ingest
+from sql_engine import SQLEngine
+from synthetic import generate_payload
+
+TOTALS = "SELECT count(*) AS days, sum(suggestions) AS suggestions FROM metrics"
+
+
+@pytest.fixture(scope="module")
+def shared(tmp_path_factory) -> SQLEngine:
+    """An engine over a store the tests only read"""
+    data_dir = tmp_path_factory.mktemp("sql") / "data"
+    ingest(data_dir, generate_payload(days=40, end=END_DAY, editors=2, models=2, languages=3))
+    return SQLEngine(str(data_dir))
+
+
+@pytest.fixture
+def engine(workdir, payload) -> SQLEngine:
+    ingest(workdir / "data", payload(60))
+    return SQLEngine(str(workdir / "data"))
+
+
+@pytest.mark.parametrize("sql", [
+    "DELETE FROM metrics",
+    "CREATE TABLE copy AS SELECT * FROM metrics",
+    "SELECT 1; SELECT 2",
+    "SET enable_external_access = true",
+    "ATTACH 'other.duckdb'",
+    "COPY (SELECT * FROM metrics) TO 'out.csv'",
+])
+def test_only_a_single_select_is_run(shared, sql):
+    with pytest.raises(ValueError):
+        shared.query(sql)
+
+
+def test_files_outside_the_data_directory_are_not_readable(shared, tmp_path):
+    (tmp_path / "secret.csv").write_text("token\nabc\n")
+    with pytest.raises(duckdb.Error):
+        shared.query(f"SELECT * FROM read_csv('{tmp_path / 'secret.csv'}')")
+
+
+def test_results_are_capped(shared):
+    result, truncated = shared.query("SELECT * FROM breakdown", max_rows=5)
+    assert len(result) == 5 and truncated
+
+    result, truncated = shared.query("SELECT * FROM metrics", max_rows=40)
+    assert len(result) == 40 and not truncated
+
+
+def test_views_follow_compaction(engine, workdir):
+    before, _ = engine.query(TOTALS)
+    compact_all(str(workdir / "data"), keep_daily_days=7, keep_monthly_days=30)
+    after, _ = engine.query(TOTALS)
+    assert after.to_dict() == before.to_dict()
+
+
+def test_query_is_retried_when_compaction_removes_its_files(engine, workdir, monkeypatch):
+    before, _ = SQLEngine(str(workdir / "data")).query(TOTALS)
+    refresh_views = engine._refresh_views
+    compacted = []
+
+    def refresh_then_compact():
+        # Compaction lands between building the views and running the query
+        views = refresh_views()
+        if not compacted:
+            compacted.append(compact_all(str(workdir / "data"), keep_daily_days=7, keep_monthly_days=30))
+        return views
+
+    monkeypatch.setattr(engine, "_refresh_views", refresh_then_compact)
+    after, _ = engine.query(TOTALS)
+    assert compacted[0][0].merged
+    assert after.to_dict() == before.to_dict()
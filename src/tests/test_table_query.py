@@ -0,0 +1,54 @@
+import pandas as pd
+import pytest
+
+from table_query import page, query
+
+
+@pytest.fixture
+def table() -> pd.DataFrame:
+    return pd.DataFrame({
+        "day": pd.date_range("2024-01-01", periods=25),
+        "editor": ["vscode", "vim"] * 12 + ["vscode"],
+        "value": [i % 5 for i in range(25)],
+    })
+
+
+def test_pages_cover_the_table_once(table):
+    pages = [page(table, n, 10)[0] for n in (1, 2, 3)]
+
+    assert [len(p) for p in pages] == [10, 10, 5]
+    assert pd.concat(pages, ignore_index=True).equals(table)
+    assert all(p.index[0] == 0 for p in pages)
+
+
+@pytest.mark.parametrize("page_number, first_day", [(0, "2024-01-01"), (-3, "2024-01-01"), (99, "2024-01-21")])
+def test_out_of_range_pages_are_clamped(table, page_number, first_day):
+    rows, total = page(table, page_number, 10)
+    assert total == 25
+    assert rows["day"].iloc[0] == pd.Timestamp(first_day)
+
+
+def test_empty_result_has_one_empty_page(table):
+    rows, total = page(table, 2, 10, filters={"editor": ["emacs"]})
+    assert (len(rows), total) == (0, 0)
+
+
+def test_total_counts_the_filtered_rows(table):
+    rows, total = page(table, 1, 5, filters={"editor": ["vim"], "day": (pd.Timestamp("2024-01-10"), None)})
+
+    assert total == 8
+    assert rows["editor"].eq("vim").all()
+    assert rows["day"].min() >= pd.Timestamp("2024-01-10")
+
+
+def test_sorting_is_stable(table):
+    rows, _ = page(table, 1, 25, sort_by="value", ascending=False)
+
+    assert rows["value"].is_monotonic_decreasing
+    # Rows with equal values keep the stored order
+    for _, group in rows.groupby("value"):
+        assert group["day"].is_monotonic_increasing
+
+
+def test_query_without_filters_or_sort_returns_the_table(table):
+    assert query(table) is table
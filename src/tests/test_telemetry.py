@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+import telemetry
+from telemetry import export, increment, snapshot, span, to_prometheus
+
+
+@pytest.fixture(autouse=True)
+def registry():
+    telemetry.reset()
+    yield
+    telemetry.reset()
+
+
+def test_spans_are_recorded_also_when_they_raise():
+    with span("load"):
+        pass
+    with pytest.raises(ValueError):
+        with span("load"):
+            raise ValueError("boom")
+
+    stats = snapshot()["spans"]["load"]
+    assert stats["count"] == 2
+    assert stats["max"] >= stats["p50"] >= 0
+    assert stats["mean"] == pytest.approx(stats["total"] / 2)
+
+
+def test_samples_are_bounded(monkeypatch):
+    monkeypatch.setattr(telemetry, "SAMPLES_PER_SPAN", 4)
+    for _ in range(10):
+        with span("stage"):
+            pass
+    assert snapshot()["spans"]["stage"]["count"] == 10
+    assert len(telemetry._spans["stage"].samples) == 4
+
+
+def test_counters_add_up():
+    increment("rows_parsed", 5)
+    increment("rows_parsed", 2)
+    increment("cache_hits")
+    assert snapshot()["counters"] == {"cache_hits": 1, "rows_parsed": 7}
+
+
+def test_prometheus_text():
+    with span("read_partitions:metrics"):
+        pass
+    increment("bytes_read", 2048)
+    lines = to_prometheus().splitlines()
+
+    assert 'copilot_dashboard_stage_seconds_count{stage="read_partitions:metrics"} 1' in lines
+    assert "# TYPE copilot_dashboard_bytes_read_total counter" in lines
+    assert "copilot_dashboard_bytes_read_total 2048" in lines
+
+
+def test_export_format_follows_the_file_suffix(tmp_path, monkeypatch):
+    increment("rows_parsed", 3)
+    assert export() is None
+
+    assert json.loads(export(tmp_path / "perf.json").read_text())["counters"] == {"rows_parsed": 3}
+    monkeypatch.setenv("PERF_EXPORT_FILE", str(tmp_path / "out" / "perf.prom"))
+    assert "copilot_dashboard_rows_parsed_total 3" in export().read_text()
+    assert not list(tmp_path.glob("**/*.tmp"))